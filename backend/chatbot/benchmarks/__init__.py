@@ -0,0 +1,18 @@
+# Micro-benchmarks for the chatbot pipeline, run with `python manage.py run_benchmarks`.
+# Each benchmark is a function taking the `repeat` count and returning a dict of measurements.
+# Heavy imports live inside the benchmark modules so listing them stays cheap.
+
+from importlib import import_module
+
+BENCHMARKS = {
+    'model_registry': 'chatbot.benchmarks.model_registry.run',
+    'chain_build': 'chatbot.benchmarks.chain_build.run',
+    'keyword_index': 'chatbot.benchmarks.keyword_index.run',
+    'vector_index': 'chatbot.benchmarks.vector_index.run',
+    'pipeline': 'chatbot.benchmarks.pipeline.run',
+}
+
+
+def get_benchmark(name: str):
+    module_path, func_name = BENCHMARKS[name].rsplit('.', 1)
+    return getattr(import_module(module_path), func_name)
@@ -0,0 +1,91 @@
+# Per-request construction overhead of the RAG pipeline objects.
+# "before" rebuilds every prompt, the MultiQueryRetriever, the router chain and the
+# history-aware retrieval chain like ChatBot.ask used to on each message, "after" is what
+# ask() does now: bind the prebuilt chains to the user's retriever. Runs fully offline.
+
+import statistics
+import time
+
+from django.conf import settings
+from django.test.utils import override_settings
+from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain.retrievers.multi_query import MultiQueryRetriever
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from chatbot.services.model_registry import set_embedding_model
+from chatbot.services.rag_pipeline import ChatBot
+from chatbot.services.vector_store_pool import VectorStorePool
+
+ITERATIONS_PER_REPEAT = 200
+
+
+def _build_per_request(llm, vector_db):
+    # Mirror of the construction work the old ask() did for every message
+    base_retriever = vector_db.as_retriever(search_kwargs={'k': 5})
+
+    multi_query_prompt = ChatPromptTemplate.from_messages([
+        ("system", "Generate five different versions of the given user question."),
+        ("human", "{question}")
+    ])
+    generate_queries_chain = multi_query_prompt | llm | StrOutputParser() | (lambda x: x.split("\n"))
+    retriever = MultiQueryRetriever(retriever=base_retriever, llm_chain=generate_queries_chain, include_original=True)
+
+    router_prompt = ChatPromptTemplate.from_template("Classify as RAG or General.\n{context}\n\nQuestion: {question}")
+    router_prompt | llm | StrOutputParser()
+
+    condense_question_prompt = ChatPromptTemplate.from_messages([
+        ("system", "Rephrase the follow up question to be a standalone question."),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("human", "{input}")
+    ])
+    history_aware_retriever = create_history_aware_retriever(llm, retriever, condense_question_prompt)
+
+    qa_prompt = ChatPromptTemplate.from_messages([
+        ("system", "Answer based ONLY on the provided context.\nContext:\n{context}"),
+        ("human", "{input}")
+    ])
+    question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+    create_retrieval_chain(history_aware_retriever, question_answer_chain)
+
+    general_prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are a helpful assistant. Answer the following question."),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("human", "{input}")
+    ])
+    general_prompt | llm | StrOutputParser()
+
+
+def _per_call_us(func, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(ITERATIONS_PER_REPEAT):
+            func()
+        timings.append((time.perf_counter() - started) / ITERATIONS_PER_REPEAT * 1e6)
+    return timings
+
+
+def run(repeat: int = 5) -> dict:
+    embeddings = DeterministicFakeEmbedding(size=384)
+    set_embedding_model(embeddings, settings.EMBEDDING_MODEL_NAME)
+
+    llm = FakeListChatModel(responses=["RAG"])
+    vector_db = InMemoryVectorStore(embeddings)
+
+    # The pool reads the user's corpus version from the cache, kept in memory instead of Redis
+    with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'chain-build-benchmark'}}):
+        bot = ChatBot(vector_store_pool=VectorStorePool(lambda user_id: vector_db, max_size=8, idle_timeout=600), llm=llm)
+
+        before = _per_call_us(lambda: _build_per_request(llm, vector_db), repeat)
+        after = _per_call_us(lambda: bot.get_retriever(1), repeat)
+
+    return {
+        'before_per_request_us': statistics.mean(before),
+        'after_per_request_us': statistics.mean(after),
+        'saved_per_request_us': statistics.mean(before) - statistics.mean(after),
+    }
@@ -0,0 +1,97 @@
+# Cost of the per-user BM25 keyword index at 100k chunks: build time (written in ingestion
+# sized batches, like process_document_ingestion does), query latency for plain-word and
+# identifier queries, and the on-disk / resident memory it takes. Runs fully offline on a
+# synthetic corpus.
+
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+
+from langchain_core.documents import Document
+
+from chatbot.services.keyword_index import KeywordIndex
+
+CHUNKS = 100_000
+BATCH_SIZE = 64
+WORDS_PER_CHUNK = 80
+VOCABULARY_SIZE = 20_000
+QUERIES_PER_REPEAT = 100
+
+
+def _corpus(rng: random.Random):
+    vocabulary = [f"w{index}" for index in range(VOCABULARY_SIZE)]
+    for index in range(CHUNKS):
+        words = rng.choices(vocabulary, k=WORDS_PER_CHUNK)
+        # Every chunk carries one part number, the kind of identifier dense search misses
+        words.insert(rng.randrange(WORDS_PER_CHUNK), f"AX-{index:06d}")
+        yield Document(
+            page_content=" ".join(words),
+            metadata={'user_document_id': index // 1000, 'page': index % 1000 // 10},
+            id=f"doc{index // 1000}:p{index % 1000 // 10}:{index}"
+        )
+
+
+def _batches(docs):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _latencies_ms(index: KeywordIndex, queries, repeat: int, **search_kwargs):
+    timings = []
+    for _ in range(repeat):
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query, k=5, **search_kwargs)
+            timings.append((time.perf_counter() - started) * 1e3)
+    return timings
+
+
+def _rss_mb() -> float:
+    # Peak resident set size of this process, in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(repeat: int = 5) -> dict:
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = KeywordIndex(os.path.join(tmp_dir, 'user_1.sqlite3'))
+
+        rss_before = _rss_mb()
+        started = time.perf_counter()
+        for batch in _batches(_corpus(rng)):
+            index.upsert(batch)
+        build_seconds = time.perf_counter() - started
+
+        word_queries = [" ".join(f"w{rng.randrange(VOCABULARY_SIZE)}" for _ in range(6)) for _ in range(QUERIES_PER_REPEAT)]
+        identifier_queries = [f"what does part AX-{rng.randrange(CHUNKS):06d} do" for _ in range(QUERIES_PER_REPEAT)]
+
+        word_ms = _latencies_ms(index, word_queries, repeat)
+        identifier_ms = _latencies_ms(index, identifier_queries, repeat)
+        filtered_ms = _latencies_ms(index, identifier_queries, repeat, document_ids=[1, 2, 3])
+
+        index_bytes = sum(
+            os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir)
+        )
+
+        return {
+            'chunks': CHUNKS,
+            'build_seconds': build_seconds,
+            'build_chunks_per_second': CHUNKS / build_seconds,
+            'word_query_mean_ms': statistics.mean(word_ms),
+            'word_query_p95_ms': statistics.quantiles(word_ms, n=20)[-1],
+            'identifier_query_mean_ms': statistics.mean(identifier_ms),
+            'identifier_query_p95_ms': statistics.quantiles(identifier_ms, n=20)[-1],
+            'filtered_query_mean_ms': statistics.mean(filtered_ms),
+            'disk_mb_per_100k_chunks': index_bytes / 1024 / 1024 * 100_000 / CHUNKS,
+            'peak_rss_growth_mb': _rss_mb() - rss_before,
+        }
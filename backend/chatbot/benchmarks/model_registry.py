@@ -0,0 +1,45 @@
+# Per-task latency of ingestion-style embedding work, with and without the model registry.
+# "before" builds a fresh HuggingFaceEmbeddings for every task like process_document_ingestion
+# used to, "after" goes through get_embedding_model() like it does now.
+
+import statistics
+import time
+
+from django.conf import settings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from chatbot.services.model_registry import get_embedding_model
+
+SAMPLE_CHUNKS = [
+    f"Clause {i}. The supplier shall deliver the goods described in schedule {i} within thirty days of the order."
+    for i in range(32)
+]
+
+
+def _time_tasks(get_model, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        model = get_model()
+        model.embed_documents(SAMPLE_CHUNKS)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def run(repeat: int = 5) -> dict:
+    model_name = settings.EMBEDDING_MODEL_NAME
+
+    before = _time_tasks(lambda: HuggingFaceEmbeddings(model_name=model_name), repeat)
+
+    # Warm the registry first, a worker does this at process init
+    get_embedding_model()
+    after = _time_tasks(get_embedding_model, repeat)
+
+    return {
+        'chunks_per_task': len(SAMPLE_CHUNKS),
+        'before_mean_s': statistics.mean(before),
+        'before_min_s': min(before),
+        'after_mean_s': statistics.mean(after),
+        'after_min_s': min(after),
+        'saved_per_task_s': statistics.mean(before) - statistics.mean(after),
+    }
@@ -0,0 +1,92 @@
+# Offline stand-ins for the pipeline benchmarks: a deterministic chat model that answers each of
+# the ChatBot prompts in the format it expects, and a tiny PDF writer so ingestion can be timed
+# without shipping sample documents.
+
+import json
+import time
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Replies like a cooperative LLM would: five query variants, "RAG" for routing, the question
+    itself when condensing, and a fixed answer otherwise. `latency` simulates network time per call.
+    """
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+
+        prompt = "\n".join(str(message.content) for message in messages)
+        question = str(messages[-1].content)
+
+        if "different versions of the given user question" in prompt:
+            text = "\n".join(f"{question} (variant {index})" for index in range(1, 6))
+        elif "Classification:" in prompt:
+            text = "RAG"
+        elif '"standalone_question"' in prompt:
+            text = json.dumps({"route": "RAG", "standalone_question": question})
+        elif "rephrase the follow up question" in prompt:
+            text = question
+        else:
+            text = f"Offline answer to: {question}"
+
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+def write_text_pdf(path: str, pages: List[List[str]]) -> None:
+    """
+    Writes a minimal PDF with one page per entry of `pages`, each line shown in Helvetica.
+    Lines must not contain parentheses or backslashes (they are not escaped).
+    """
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+
+    kids = []
+    for index, lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * index, 5 + 2 * index
+        kids.append(f"{page_id} 0 R")
+
+        # 12pt leading, each ' operator moves to the next line and shows the string
+        stream = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"({line}) '" for line in lines) + " ET"
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode()
+        objects[content_id] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode()
+
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += f"{number} 0 obj\n".encode() + objects[number] + b"\nendobj\n"
+
+    xref_offset = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for number in sorted(objects):
+        out += f"{offsets[number]:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+
+    with open(path, 'wb') as f:
+        f.write(out)
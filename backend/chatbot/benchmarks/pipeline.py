@@ -0,0 +1,209 @@
+# End-to-end cost of ingestion and ChatBot.ask, fully offline. ScriptedChatModel stands in for
+# Groq and a deterministic fake model for the sentence-transformer, so the numbers are the
+# pipeline's own work (PDF parsing, splitting, index writes, retrieval, packing, prompts, database
+# queries), not model time. Everything runs on throwaway stores in a temporary directory and
+# inside a transaction that is rolled back, the configured database and indexes are never touched.
+
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import ExitStack, redirect_stdout
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.tracers.context import collect_runs
+
+from chatbot.benchmarks.offline import ScriptedChatModel, write_text_pdf
+from chatbot.models import ChatMessage, ChatSession
+from chatbot.services import embedding_cache, vector_stores
+from chatbot.services.model_registry import set_embedding_model
+from chatbot.services.rag_pipeline import ChatBot
+from chatbot.services.vector_store_pool import VectorStorePool
+from chatbot.services.vector_stores import open_user_vector_store
+from chatbot.tasks import process_document_ingestion
+from users.models import UserDocument
+
+PAGES = 40
+LINES_PER_PAGE = 45
+WORDS_PER_LINE = 12
+ASKS_PER_REPEAT = 20
+
+# Named LangChain runs of the pipeline (see ChatBot._build_chains), timed from the run tree
+CHAIN_STAGES = (
+    'generate_queries', 'route_question', 'condense_question', 'route_and_condense',
+    'stuff_documents_chain', 'general_answer',
+)
+
+# ChatBot steps outside LangChain, timed by wrapping them on the instance
+METHOD_STAGES = {
+    '_lookup_cached_answer': 'answer_cache_lookup',
+    '_load_chat_history': 'chat_history',
+    '_cache_answer': 'answer_cache_store',
+}
+
+
+def _pages(rng: random.Random):
+    vocabulary = ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(3, 10))) for _ in range(3000)]
+    return [
+        [" ".join(rng.choices(vocabulary, k=WORDS_PER_LINE)) + "." for _ in range(LINES_PER_PAGE)]
+        for _ in range(PAGES)
+    ]
+
+
+def _ingest(user_document_id: int):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        message = process_document_ingestion(user_document_id)
+        seconds = time.perf_counter() - started
+
+    doc = UserDocument.objects.get(id=user_document_id)
+    if doc.ingestion_status != 'SUCCESS':
+        raise RuntimeError(message)
+
+    return seconds, len(queries), doc
+
+
+def _time_method(obj, name: str, stage: str, totals) -> None:
+    func = getattr(obj, name)
+
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            totals[stage] += (time.perf_counter() - started) * 1e3
+
+    setattr(obj, name, timed)
+
+
+def _add_chain_stages(runs, totals) -> None:
+    def walk(run, inside_retriever: bool):
+        ms = (run.end_time - run.start_time).total_seconds() * 1e3
+        if run.name in CHAIN_STAGES:
+            totals[run.name] += ms
+        # Outermost retriever only, it includes the query expansion and both searches
+        if run.run_type == 'retriever' and not inside_retriever:
+            totals['retrieval'] += ms
+        if run.run_type == 'llm':
+            totals['llm_calls'] += 1
+
+        for child in run.child_runs:
+            walk(child, inside_retriever or run.run_type == 'retriever')
+
+    for run in runs:
+        walk(run, False)
+
+
+def _new_session(user: User, earlier_exchange: bool = True) -> ChatSession:
+    # One earlier exchange, so follow-up handling (condensing) is part of the measurement
+    session = ChatSession.objects.create(user=user)
+    if earlier_exchange:
+        ChatMessage.objects.create(session=session, message="What is this document about?", is_from_ai=False)
+        ChatMessage.objects.create(session=session, message="It is a technical manual.", is_from_ai=True)
+    return session
+
+
+def _ask(bot: ChatBot, question: str, session: ChatSession, totals):
+    with CaptureQueriesContext(connection) as queries, collect_runs() as runs, redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        result = bot.ask(question, session)
+        ms = (time.perf_counter() - started) * 1e3
+
+    # ask() turns errors into an apology instead of raising
+    if not result['answer'].startswith("Offline answer"):
+        raise RuntimeError(f"ask() failed: {result['answer']}")
+
+    _add_chain_stages(runs.traced_runs, totals)
+    totals['db_queries'] += len(queries)
+    return ms
+
+
+def run(repeat: int = 5) -> dict:
+    rng = random.Random(0)
+    set_embedding_model(DeterministicFakeEmbedding(size=384))
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir, ExitStack() as stack:
+        stack.enter_context(override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pipeline-benchmark'}},
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+            MEDIA_ROOT=os.path.join(tmp_dir, 'media'),
+            KEYWORD_INDEX_DIR=os.path.join(tmp_dir, 'keyword_index'),
+            NUMPY_VECTOR_DIR=os.path.join(tmp_dir, 'numpy_vectors'),
+            QUANTIZED_VECTOR_DIR=os.path.join(tmp_dir, 'quantized_vectors'),
+        ))
+        stack.enter_context(mock.patch.object(vector_stores, 'CHROMA_PATH', os.path.join(tmp_dir, 'chroma_db')))
+        stack.enter_context(mock.patch.object(
+            embedding_cache, '_cache', embedding_cache.EmbeddingCache(os.path.join(tmp_dir, 'embeddings.sqlite3'), 512 * 1024 * 1024)
+        ))
+        stack.enter_context(transaction.atomic())
+
+        try:
+            user = User.objects.create(username=f"pipeline-benchmark-{time.time_ns()}")
+            os.makedirs(os.path.join(tmp_dir, 'media', 'user_documents'))
+
+            # --- Ingestion: a new document (nothing cached), then the same document again ---
+
+            ingestion = defaultdict(list)
+            for index in range(repeat):
+                name = f"user_documents/manual_{index}.pdf"
+                write_text_pdf(os.path.join(tmp_dir, 'media', name), _pages(rng))
+                doc = UserDocument.objects.create(user=user, file=name, original_filename=os.path.basename(name))
+
+                for run_name in ('ingestion', 'reingestion'):
+                    seconds, queries, doc = _ingest(doc.id)
+                    ingestion[f"{run_name}_pages_per_second"].append(doc.total_pages / seconds)
+                    ingestion[f"{run_name}_chunks_per_second"].append(doc.chunks_ingested / seconds)
+                    ingestion[f"{run_name}_db_queries"].append(queries)
+
+            results['pages_per_document'] = doc.total_pages
+            results['chunks_per_document'] = doc.chunks_ingested
+            results.update({key: statistics.mean(values) for key, values in ingestion.items()})
+
+            # --- Questions, each a follow-up in its own session, in both pipeline modes ---
+
+            # Words of the first document's first page (same seed), so questions match its chunks
+            words = " ".join(_pages(random.Random(0))[0]).replace(".", "").split()
+            bot = ChatBot(VectorStorePool(open_user_vector_store, max_size=8, idle_timeout=600), llm=ScriptedChatModel())
+
+            totals = defaultdict(float)
+            for name, stage in METHOD_STAGES.items():
+                _time_method(bot, name, stage, totals)
+            _time_method(bot.context_packer, 'pack', 'context_packing', totals)
+
+            for mode in ('standard', 'fast'):
+                with override_settings(CHAT_PIPELINE_MODE=mode):
+                    totals.clear()
+                    timings = [
+                        _ask(bot, f"what does the manual say about {' '.join(rng.sample(words, 3))}", _new_session(user), totals)
+                        for _ in range(repeat * ASKS_PER_REPEAT)
+                    ]
+
+                results[f"{mode}_ask_mean_ms"] = statistics.mean(timings)
+                results[f"{mode}_ask_p95_ms"] = statistics.quantiles(timings, n=20)[-1]
+                for stage, total in sorted(totals.items()):
+                    unit = '_per_ask' if stage in ('llm_calls', 'db_queries') else '_ms'
+                    results[f"{mode}_{stage}{unit}"] = total / len(timings)
+
+            # --- The same opening question again, answered from the answer cache (follow-ups never are) ---
+
+            totals.clear()
+            question = f"what does the manual say about {' '.join(words[:3])}"
+            _ask(bot, question, _new_session(user, earlier_exchange=False), totals)
+            totals.clear()
+            timings = [_ask(bot, question, _new_session(user, earlier_exchange=False), totals) for _ in range(repeat * ASKS_PER_REPEAT)]
+
+            results['cached_ask_mean_ms'] = statistics.mean(timings)
+            results['cached_db_queries_per_ask'] = totals['db_queries'] / len(timings)
+
+        finally:
+            transaction.set_rollback(True)
+
+    return results
@@ -0,0 +1,74 @@
+# Vector index backends side by side (see services/vector_stores.py): build throughput when
+# written in ingestion-sized batches, and single-query, filtered and 6-vector (multi-query)
+# search latency, at a few per-user collection sizes. Runs offline on clustered random vectors.
+
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from chatbot.services.vector_stores import BACKENDS
+
+COLLECTION_SIZES = (1_000, 10_000, 50_000)
+DIMENSION = 384
+BATCH_SIZE = 64
+QUERIES_PER_REPEAT = 50
+K = 5
+
+
+def _vectors(size: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.normal(size=(max(size // 200, 1), DIMENSION))
+    vectors = centers[rng.integers(len(centers), size=size)] + rng.normal(scale=0.6, size=(size, DIMENSION))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _mean_ms(search, queries, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for query in queries:
+            search(query)
+        timings.append((time.perf_counter() - started) / len(queries) * 1e3)
+    return statistics.mean(timings)
+
+
+def run(repeat: int = 5) -> dict:
+    rng = np.random.default_rng(0)
+    embeddings = DeterministicFakeEmbedding(size=DIMENSION)
+    results = {}
+
+    for size in COLLECTION_SIZES:
+        vectors = _vectors(size, rng)
+        ids = [f"chunk{index}" for index in range(size)]
+        texts = [f"chunk {index}" for index in range(size)]
+        # 20 documents per collection, like a user with a library of uploads
+        metadatas = [{'user_document_id': index % 20, 'page': index // 20} for index in range(size)]
+
+        queries = vectors[rng.choice(size, size=QUERIES_PER_REPEAT)].tolist()
+        multi_queries = [vectors[rng.choice(size, size=6)].tolist() for _ in range(QUERIES_PER_REPEAT)]
+        document_filter = {'user_document_id': {'$in': [1, 2]}}
+
+        for backend, open_index in BACKENDS.items():
+            with tempfile.TemporaryDirectory() as root:
+                index = open_index(root, 'benchmark', embeddings)
+
+                started = time.perf_counter()
+                for start in range(0, size, BATCH_SIZE):
+                    end = start + BATCH_SIZE
+                    index.upsert_vectors(ids[start:end], vectors[start:end], texts[start:end], metadatas[start:end])
+                build_seconds = time.perf_counter() - started
+
+                prefix = f"{backend}_{size}"
+                results[f"{prefix}_build_vectors_per_second"] = size / build_seconds
+                results[f"{prefix}_query_ms"] = _mean_ms(lambda query: index.search_by_vectors([query], K), queries, repeat)
+                results[f"{prefix}_filtered_query_ms"] = _mean_ms(
+                    lambda query: index.search_by_vectors([query], K, filter=document_filter), queries, repeat
+                )
+                results[f"{prefix}_6_vector_query_ms"] = _mean_ms(lambda batch: index.search_by_vectors(batch, K), multi_queries, repeat)
+
+                # Chroma keeps its client cached per directory, release it before the directory goes
+                del index
+
+    return results
@@ -0,0 +1,115 @@
+from asgiref.sync import sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+
+from .models import ChatSession
+from .services.answer_jobs import enqueue_answer, public_job
+from .services.chatbot_service import get_bot_instance
+from .services.notifications import session_group, user_group
+from .services.tracing import make_request_id
+from .tasks import generate_chat_title
+from .views import resolve_document_ids
+
+# Close codes sent instead of accepting the connection
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+
+
+class UserEventsConsumer(AsyncJsonWebsocketConsumer):
+    """
+    ws/documents/: ingestion progress of the user's documents, pushed by process_document_ingestion
+    as {'type': 'document_status', 'document_id', 'status', 'total_pages', 'pages_processed', 'chunks_ingested'}.
+    """
+
+    async def connect(self):
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close(code=CLOSE_UNAUTHORIZED)
+            return
+
+        self.groups_joined = [user_group(self.user.id)]
+        for group in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        for group in getattr(self, 'groups_joined', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    # --- Events from the channel layer (services/notifications.py) ---
+
+    async def document_status(self, event):
+        await self.send_json({**event, 'type': 'document_status'})
+
+
+class ChatConsumer(UserEventsConsumer):
+    """
+    ws/sessions/<session_id>/: one connection per open chat, authenticated once at the handshake.
+
+    Client -> server: {'type': 'message', 'message': '...', 'document_ids': [...]}
+    Server -> client: {'type': 'token', 'data'} for every answer token, then {'type': 'sources', 'data'}
+    (or {'type': 'error', 'data'}), {'type': 'title', 'session_id', 'title'} once the title task is
+    done, and document_status events.
+    With CHAT_ANSWER_MODE = 'celery' the answer is generated by a celery worker instead of this
+    process: the message gets an {'type': 'answer_job', 'status': 'PENDING', ...} reply right away
+    and the finished job (with 'result') is pushed as another 'answer_job' event.
+    """
+
+    async def connect(self):
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close(code=CLOSE_UNAUTHORIZED)
+            return
+
+        try:
+            # Ensure session belongs to the current user
+            self.session = await ChatSession.objects.aget(id=self.scope['url_route']['kwargs']['session_id'], user=self.user)
+        except ChatSession.DoesNotExist:
+            await self.close(code=CLOSE_NOT_FOUND)
+            return
+
+        self.groups_joined = [session_group(self.session.id), user_group(self.user.id)]
+        for group in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+
+    async def receive_json(self, content, **kwargs):
+
+        if not isinstance(content, dict) or content.get('type') != 'message' or not content.get('message'):
+            await self.send_json({'type': 'error', 'data': "Expected {'type': 'message', 'message': ...}."})
+            return
+
+        try:
+            document_ids = await sync_to_async(resolve_document_ids)(self.user, content.get('document_ids'))
+        except ValueError as e:
+            await self.send_json({'type': 'error', 'data': str(e)})
+            return
+
+        # Check if this is the first message from the user in this session
+        is_first_message = not await self.session.messages.filter(is_from_ai=False).aexists()
+        request_id = make_request_id(content.get('request_id'))
+
+        if settings.CHAT_ANSWER_MODE == 'celery':
+            # Don't hold this process for the LLM, the result comes back through the channel layer
+            job = await sync_to_async(enqueue_answer)(self.user.id, self.session, content['message'], document_ids, request_id)
+            await self.send_json({'type': 'answer_job', **public_job(job)})
+
+        else:
+            # First call loads the models, don't do that on the event loop
+            bot = await sync_to_async(get_bot_instance)()
+
+            # Messages on this connection are answered one at a time, in order
+            async for event in bot.astream(content['message'], self.session, document_ids, request_id):
+                await self.send_json({'type': event['event'], 'data': event['data']})
+
+        # --- TRIGGERING BACKGROUND TASK --- (the title comes back as a 'title' event)
+        if is_first_message:
+            await sync_to_async(generate_chat_title.delay)(self.session.id)
+
+    # --- Events from the channel layer (services/notifications.py) ---
+
+    async def session_title(self, event):
+        await self.send_json({'type': 'title', 'session_id': event['session_id'], 'title': event['title']})
+
+    async def answer_job(self, event):
+        await self.send_json({'type': 'answer_job', **event['job']})
@@ -1,77 +1,171 @@
-# these are used to interact with os and to do file operations (like del)
+# these are used to interact with os and to do file operations
+import hashlib
+import json
 import os
-import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # import django project settings, give access to BASE_DIR and other's
 from django.conf import settings
 from django.core.management.base import BaseCommand  # Need for to inherit this
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_huggingface import HuggingFaceEmbeddings
+from chatbot.services.embedding_cache import CachedEmbeddings
+from chatbot.services.ingestion import iter_chunks, iter_pages, make_text_splitter
+from chatbot.services.model_registry import embedding_namespace, get_embedding_model
+from chatbot.services.vector_stores import open_vector_store, vector_store_root
 
 PROJECT_ROOT = os.path.dirname(settings.BASE_DIR)
 PDFS_PATH = os.path.join(PROJECT_ROOT,'pdfs')
-CHROMA_PATH = os.path.join(settings.BASE_DIR,'chroma_db')
+VECTOR_STORE_PATH = vector_store_root()
+COLLECTION_NAME = "document_collection"
+
+# Kept next to the vectors, so wiping the store also wipes the manifest
+MANIFEST_PATH = os.path.join(VECTOR_STORE_PATH, f"{COLLECTION_NAME}_manifest.json")
+
+# Vectors written or deleted per call
+WRITE_BATCH_SIZE = 1000
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def embed_pdf(pdf_path: str, relative_path: str, content_hash: str) -> dict:
+    """
+    Parses, splits and embeds one PDF. Runs inside a pool worker, each worker loads the
+    embedding model once and shares the on-disk embedding cache with the others.
+    `relative_path` is the file's path under pdfs/, as recorded in the manifest.
+    """
+    embedding_model = CachedEmbeddings(get_embedding_model(), namespace=embedding_namespace())
+
+    chunks = list(iter_chunks(iter_pages(pdf_path), make_text_splitter()))
+    texts = [chunk.page_content for chunk in chunks]
+
+    return {
+        # Stable per file version, so a changed file's old vectors can be deleted by id. The path keeps
+        # two copies of the same PDF apart, removing one must not delete the other's vectors
+        'ids': [f"{relative_path}:{content_hash}:{index}" for index in range(len(chunks))],
+        'texts': texts,
+        'metadatas': [chunk.metadata for chunk in chunks],
+        'embeddings': embedding_model.embed_documents(texts) if texts else [],
+        'pages': len({chunk.metadata.get('page') for chunk in chunks}),
+    }
+
 
 class Command(BaseCommand):
 
-    help = 'Ingests PDF documents into the Chroma vector store.'
+    help = 'Incrementally ingests the PDF documents in pdfs/ into the shared vector collection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Worker processes used to parse and embed PDFs.')
+        parser.add_argument('--full', action='store_true', help='Ignore the manifest and re-ingest every PDF (the default when there is none).')
 
     def handle(self,*args,**options) -> None:
 
         self.stdout.write(self.style.SUCCESS("--- Starting Data Ingestion ---"))   # Same as print
 
-        # 1. Loading Documents
-
-        documents = []
         if not os.path.exists(PDFS_PATH):
             self.stdout.write(self.style.ERROR(f"PDFs directory not found at: {PDFS_PATH}"))
             return
-        
-        for file in os.listdir(PDFS_PATH):
-            if file.endswith('.pdf'):
-                pdf_path = os.path.join(PDFS_PATH,file)
-                loader = PyPDFLoader(pdf_path)
-                documents.extend(loader.load())
-                self.stdout.write(f"Sucessfully loaded : {file}")
-
-        if not documents:
-            self.stdout.write(self.style.ERROR("No PDF document found to ingest"))
-            return
-        
-        self.stdout.write(f"Loaded a total of {len(documents)} pages from all PDFs.")
 
-        # 2. Splitting Documents
+        # 1. Work out what changed since the last run
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size = 500,
-            chunk_overlap = 120,
-            length_function = len,  # Function to compute the length of the text
-            separators=["\n\n", "\n", ".", " "]
-        )
+        # Without a manifest nothing says which vectors the collection holds (the first run after
+        # the old rebuild-from-scratch command left random ids), so it is rebuilt like --full
+        rebuild = options['full'] or not os.path.exists(MANIFEST_PATH)
+        manifest = {} if rebuild else self.load_manifest()
 
-        chunks = text_splitter.split_documents(documents)
-        self.stdout.write(self.style.SUCCESS(f"Split documents into {len(chunks)} chunks."))
+        current = {
+            file: file_hash(os.path.join(PDFS_PATH, file))
+            for file in sorted(os.listdir(PDFS_PATH)) if file.endswith('.pdf')
+        }
 
-        # 3. Deleting Vector DB if it exist
+        removed = [file for file in manifest if file not in current]
+        changed = [file for file, content_hash in current.items() if manifest.get(file, {}).get('hash') != content_hash]
 
-        if os.path.exists(CHROMA_PATH):
-            self.stdout.write(self.style.WARNING("Existing ChromaDB found. Removing it..."))
-            shutil.rmtree(CHROMA_PATH)
+        self.stdout.write(
+            f"{len(current)} PDFs found: {len(changed)} new or changed, "
+            f"{len(current) - len(changed)} unchanged, {len(removed)} removed."
+        )
 
-        self.stdout.write("Creating new ChromaDB and embedding documents...")
+        # The collection stays online while it is updated, nothing is rebuilt from scratch
+        vector_db = open_vector_store(COLLECTION_NAME)
 
-        # 4. Initializing an Embedding Model
+        if rebuild:
+            vector_db.clear()
 
-        embedding_model = HuggingFaceEmbeddings(model_name='all-MiniLM-L6-v2')
+        # 2. Drop vectors of deleted PDFs
 
-        Chroma.from_documents(
-            documents = chunks,
-            embedding =  embedding_model,
-            persist_directory = CHROMA_PATH,
-            collection_name = "document_collection"
-        )
+        for file in removed:
+            self.delete_ids(vector_db, manifest.pop(file)['ids'])
+            self.save_manifest(manifest)
+            self.stdout.write(self.style.WARNING(f"Removed vectors of deleted file: {file}"))
+
+        if not changed:
+            self.stdout.write(self.style.SUCCESS("--- Data Ingestion Complete. Nothing to update. ---"))
+            return
+
+        # 3. Parse and embed new / changed PDFs in parallel, write from this process only
+
+        total_chunks = 0
+        for file, result in self.embed_files(changed, current, options['workers']):
+            if file in manifest:
+                self.delete_ids(vector_db, manifest[file]['ids'])
+
+            for start in range(0, len(result['ids']), WRITE_BATCH_SIZE):
+                end = start + WRITE_BATCH_SIZE
+                vector_db.upsert_vectors(
+                    result['ids'][start:end],
+                    result['embeddings'][start:end],
+                    result['texts'][start:end],
+                    result['metadatas'][start:end]
+                )
+
+            manifest[file] = {'hash': current[file], 'ids': result['ids']}
+            self.save_manifest(manifest)
+
+            total_chunks += len(result['ids'])
+            self.stdout.write(f"Sucessfully ingested : {file} ({result['pages']} pages, {len(result['ids'])} chunks)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"--- Data Ingestion Complete. {total_chunks} chunks written to {VECTOR_STORE_PATH} ---"
+        ))
+
+    def embed_files(self, files, hashes, workers):
+        """Yields (file, embed_pdf result) as each file finishes."""
+        if workers <= 1:
+            for file in files:
+                yield file, embed_pdf(os.path.join(PDFS_PATH, file), file, hashes[file])
+            return
 
-        self.stdout.write(self.style.SUCCESS(f"--- Data Ingestion Complete. Vector store created at {CHROMA_PATH} ---"))
\ No newline at end of file
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(embed_pdf, os.path.join(PDFS_PATH, file), file, hashes[file]): file
+                for file in files
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    @staticmethod
+    def delete_ids(vector_db, ids):
+        for start in range(0, len(ids), WRITE_BATCH_SIZE):
+            vector_db.delete(ids[start:start + WRITE_BATCH_SIZE])
+
+    @staticmethod
+    def load_manifest() -> dict:
+        if not os.path.exists(MANIFEST_PATH):
+            return {}
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+
+    @staticmethod
+    def save_manifest(manifest: dict) -> None:
+        os.makedirs(VECTOR_STORE_PATH, exist_ok=True)
+        # Write then rename, so an interrupted run never leaves a half-written manifest
+        tmp_path = f"{MANIFEST_PATH}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, MANIFEST_PATH)
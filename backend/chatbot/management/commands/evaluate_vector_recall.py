@@ -0,0 +1,153 @@
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from chatbot.services.quantized_store import DTYPES, QuantizedVectorStore
+from chatbot.services.vector_stores import CHROMA_PATH
+
+
+def directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names
+    )
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Measures recall@k of the quantized vector store against Chroma (and both against exact '
+        'float32 search), plus query latency and storage size. Uses a user\'s Chroma collection, '
+        'or a synthetic corpus.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, help='Evaluate on the vectors of this user\'s Chroma collection.')
+        parser.add_argument('--synthetic', type=int, default=20000, help='Synthetic corpus size, when no --user-id is given.')
+        parser.add_argument('--dtype', nargs='+', default=['int8', 'float16'], help=f"Quantized dtypes to evaluate, any of: {', '.join(DTYPES)}.")
+        parser.add_argument('--k', type=int, default=5)
+        parser.add_argument('--queries', type=int, default=200, help='Number of evaluation queries.')
+        parser.add_argument('--rescore-factor', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options) -> None:
+
+        unknown = [dtype for dtype in options['dtype'] if dtype not in DTYPES]
+        if unknown:
+            raise CommandError(f"Unknown dtype(s): {', '.join(unknown)}")
+
+        rng = np.random.default_rng(options['seed'])
+        k = options['k']
+        work_dir = tempfile.mkdtemp(prefix='vector_recall_')
+
+        try:
+            # 1. Corpus: an existing collection, or clustered random vectors in a temporary one
+
+            if options['user_id'] is not None:
+                chroma = Chroma(persist_directory=CHROMA_PATH, collection_name=f"user_{options['user_id']}")
+                chroma_size = directory_size(CHROMA_PATH)
+                chroma_size_label = 'chroma_dir_bytes (all users)'
+            else:
+                chroma = Chroma(persist_directory=os.path.join(work_dir, 'chroma'), collection_name='recall')
+                self.add_synthetic(chroma, options['synthetic'], rng)
+                chroma_size = directory_size(os.path.join(work_dir, 'chroma'))
+                chroma_size_label = 'chroma_dir_bytes'
+
+            data = chroma._collection.get(include=['embeddings', 'documents', 'metadatas'])
+            ids = data['ids']
+            if len(ids) < k:
+                raise CommandError(f"Need at least {k} vectors, the collection has {len(ids)}.")
+
+            vectors = np.asarray(data['embeddings'], dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            self.stdout.write(f"{len(ids)} vectors of dimension {vectors.shape[1]}")
+
+            # Queries close to stored chunks, like questions about a passage
+            picks = rng.choice(len(ids), size=options['queries'])
+            queries = vectors[picks] + rng.normal(scale=0.5 / np.sqrt(vectors.shape[1]), size=(len(picks), vectors.shape[1]))
+            queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+            # 2. Ground truth: exact cosine search in float32
+
+            exact = [set(np.asarray(ids)[np.argsort(-(vectors @ query))[:k]]) for query in queries]
+
+            # 3. Chroma
+
+            chroma_results, chroma_ms = self.timed(
+                lambda query: chroma._collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])['ids'][0],
+                queries
+            )
+            self.report('chroma', [set(result) for result in chroma_results], exact, None, chroma_ms)
+            self.stdout.write(f"{chroma_size_label}: {chroma_size}")
+
+            # 4. Quantized store, one per dtype, built from the very same vectors
+
+            for dtype in options['dtype']:
+                store = QuantizedVectorStore(
+                    os.path.join(work_dir, dtype), DeterministicFakeEmbedding(size=vectors.shape[1]),
+                    dtype=dtype, rescore_factor=options['rescore_factor']
+                )
+                for start in range(0, len(ids), 5000):
+                    end = start + 5000
+                    store.upsert_vectors(
+                        ids[start:end], vectors[start:end], data['documents'][start:end],
+                        [metadata or {} for metadata in data['metadatas'][start:end]]
+                    )
+
+                results, ms = self.timed(
+                    lambda query: [doc.id for doc in store.similarity_search_by_vector(query.tolist(), k=k)], queries
+                )
+                self.report(f"quantized_{dtype}", [set(result) for result in results], exact, [set(result) for result in chroma_results], ms)
+
+                # A fresh store, never compacted: its files are generation 0
+                codes_bytes = sum(
+                    os.path.getsize(os.path.join(work_dir, dtype, name))
+                    for name in ('codes.0.bin', 'scales.0.bin') if os.path.exists(os.path.join(work_dir, dtype, name))
+                )
+                self.stdout.write(f"quantized_{dtype}_scan_bytes: {codes_bytes}")
+                self.stdout.write(f"quantized_{dtype}_dir_bytes: {directory_size(os.path.join(work_dir, dtype))}")
+
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    @staticmethod
+    def add_synthetic(chroma: Chroma, size: int, rng: np.random.Generator) -> None:
+        # Clustered vectors, closer to real embeddings (documents about a few topics) than uniform noise
+        dim = 384
+        centers = rng.normal(size=(max(size // 200, 1), dim))
+        vectors = centers[rng.integers(len(centers), size=size)] + rng.normal(scale=0.6, size=(size, dim))
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        for start in range(0, size, 5000):
+            end = min(start + 5000, size)
+            chroma._collection.add(
+                ids=[f"chunk{index}" for index in range(start, end)],
+                embeddings=vectors[start:end].tolist(),
+                documents=[f"chunk {index}" for index in range(start, end)],
+                metadatas=[{'user_document_id': index % 10} for index in range(start, end)]
+            )
+
+    @staticmethod
+    def timed(search, queries):
+        results, timings = [], []
+        for query in queries:
+            started = time.perf_counter()
+            results.append(search(query))
+            timings.append((time.perf_counter() - started) * 1e3)
+        return results, timings
+
+    def report(self, name, results, exact, chroma_results, timings) -> None:
+        k = len(next(iter(exact)))
+        self.stdout.write(self.style.SUCCESS(f"--- {name} ---"))
+        self.stdout.write(f"recall@{k}_vs_exact: {statistics.mean(len(r & e) / k for r, e in zip(results, exact)):.4f}")
+        if chroma_results is not None:
+            self.stdout.write(f"recall@{k}_vs_chroma: {statistics.mean(len(r & c) / k for r, c in zip(results, chroma_results)):.4f}")
+        self.stdout.write(f"query_mean_ms: {statistics.mean(timings):.4f}")
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from chatbot.services.model_registry import embedding_namespace, stale_documents
+from chatbot.tasks import process_document_ingestion
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Queues the re-ingestion of every document whose vectors were built with another embedding model '
+        'or EMBEDDING_RUNTIME than the configured one, e.g. after switching runtimes. Re-ingesting '
+        'overwrites the document\'s vectors in place, and chunks already embedded with the new runtime '
+        'come from the embedding cache. Vectors written before chunks were tagged with their document '
+        'are deleted first, the re-ingestion would not overwrite them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only list the documents that would be re-ingested.')
+
+    def handle(self, *args, **options) -> None:
+
+        documents = list(stale_documents().order_by('id'))
+        self.stdout.write(f"{len(documents)} document(s) not embedded with '{embedding_namespace()}'.")
+
+        for doc in documents:
+            self.stdout.write(f"{doc.id}: {doc.original_filename} ({doc.embedding_namespace or 'unknown'})")
+            if not options['dry_run']:
+                process_document_ingestion.delay(doc.id)
+
+        if documents and not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Queued {len(documents)} re-ingestion(s)."))
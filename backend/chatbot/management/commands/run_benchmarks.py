@@ -0,0 +1,73 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.benchmarks import BENCHMARKS, get_benchmark
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class Command(BaseCommand):
+
+    help = 'Runs the chatbot pipeline micro-benchmarks and prints their measurements.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help=f"Benchmarks to run, any of: {', '.join(BENCHMARKS)} (default: all).")
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timed iterations per benchmark.')
+        parser.add_argument('--output', help='Also write the results, with the commit and settings they ran on, to this JSON file.')
+        parser.add_argument('--compare', help='A JSON file written by --output, printed next to each result with the relative change.')
+
+    def handle(self, *args, **options) -> None:
+
+        names = options['names'] or list(BENCHMARKS)
+        unknown = [name for name in names if name not in BENCHMARKS]
+        if unknown:
+            raise CommandError(f"Unknown benchmark(s): {', '.join(unknown)}")
+
+        baseline = {}
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)['results']
+
+        report = {
+            'commit': git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'repeat': options['repeat'],
+            'settings': {
+                name: getattr(settings, name)
+                for name in ('VECTOR_STORE_BACKEND', 'EMBEDDING_RUNTIME', 'CHAT_PIPELINE_MODE', 'HYBRID_SEARCH_ENABLED')
+            },
+            'results': {},
+        }
+
+        for name in names:
+            self.stdout.write(self.style.SUCCESS(f"--- {name} ---"))
+            results = get_benchmark(name)(repeat=options['repeat'])
+            report['results'][name] = results
+
+            for key, value in results.items():
+                line = f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}"
+
+                previous = baseline.get(name, {}).get(key)
+                if isinstance(value, (int, float)) and isinstance(previous, (int, float)) and previous:
+                    line += f"  (was {previous:.4f}, {(value - previous) / abs(previous):+.1%})"
+
+                self.stdout.write(line)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,136 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.services.embedding_runtime import (
+    RUNTIMES,
+    autotune_batch_size,
+    cosine_parity,
+    load_embedding_model,
+    query_latency_ms,
+    save_tuning,
+    tuning_key,
+)
+from chatbot.services.ingestion import iter_chunks, iter_pages, make_text_splitter
+
+SAMPLE_SENTENCES = [
+    "The supplier shall deliver the goods described in the schedule within thirty days of the order.",
+    "Continuous glucose monitors estimate blood sugar from interstitial fluid every five minutes.",
+    "Press and hold the reset button for ten seconds until the status light blinks amber.",
+    "Revenue grew 12% year over year, driven mostly by subscriptions in the enterprise segment.",
+    "Either party may terminate this agreement with ninety days written notice.",
+    "The gradient of the loss is back-propagated through every layer of the network.",
+    "Store the device between 5 and 35 degrees Celsius and away from direct sunlight.",
+    "Section 4.2 lists the exceptions to the warranty, including water damage and misuse.",
+]
+
+SAMPLE_QUERIES = [
+    "how long does delivery take",
+    "what voids the warranty",
+    "how do I reset the device",
+    "how often does the monitor measure glucose",
+]
+
+
+def sample_texts(count: int, pdf_path: str = None) -> list:
+    # Chunks the size ingestion produces, from a real PDF when given
+    if pdf_path:
+        texts = [chunk.page_content for chunk in iter_chunks(iter_pages(pdf_path), make_text_splitter())]
+        if not texts:
+            raise CommandError(f"No text could be extracted from {pdf_path}")
+    else:
+        texts = [" ".join(SAMPLE_SENTENCES[i:] + SAMPLE_SENTENCES[:i])[:500] for i in range(len(SAMPLE_SENTENCES))]
+
+    # Numbered, so repeats are distinct texts (nothing downstream dedupes them)
+    return [f"{texts[index % len(texts)]} ({index})" for index in range(count)]
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Compares embedding runtimes on this machine: output parity against torch, single-query latency '
+        'and ingestion throughput per batch size. With --save, the best batch size of every runtime that '
+        'passes the parity check is stored and used by the model registry.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runtime', nargs='+', default=list(RUNTIMES), help=f"Runtimes to evaluate, any of: {', '.join(RUNTIMES)}.")
+        parser.add_argument('--threads', nargs='+', type=int, default=[settings.EMBEDDING_THREADS], help='Thread counts to evaluate (0 = library default).')
+        parser.add_argument('--batch-sizes', nargs='+', type=int, default=[8, 16, 32, 64, 128])
+        parser.add_argument('--texts', type=int, default=256, help='Number of chunks embedded per throughput measurement.')
+        parser.add_argument('--pdf', help='Take the sample chunks from this PDF instead of built-in text.')
+        parser.add_argument('--save', action='store_true', help=f"Store the tuned batch sizes in {settings.EMBEDDING_TUNING_PATH}.")
+
+    def handle(self, *args, **options) -> None:
+
+        unknown = [runtime for runtime in options['runtime'] if runtime not in RUNTIMES]
+        if unknown:
+            raise CommandError(f"Unknown runtime(s): {', '.join(unknown)}")
+
+        model_name = settings.EMBEDDING_MODEL_NAME
+        texts = sample_texts(options['texts'], options['pdf'])
+        min_cosine = settings.EMBEDDING_PARITY_MIN_COSINE
+
+        # Runtimes that passed the parity check: (runtime, threads) -> measurements
+        passed = {}
+
+        for threads in options['threads']:
+
+            # 1. Reference vectors from the plain torch model
+            reference = load_embedding_model(model_name, 'torch', threads)
+            reference_vectors = reference.embed_documents(texts)
+
+            for runtime in options['runtime']:
+                self.stdout.write(self.style.SUCCESS(f"--- {runtime}, threads={threads or 'default'} ---"))
+
+                # 2. Load, a missing export or optional package only skips this runtime
+                started = time.perf_counter()
+                try:
+                    model = reference if runtime == 'torch' else load_embedding_model(model_name, runtime, threads)
+                except (ImportError, OSError, ValueError) as e:
+                    self.stderr.write(f"Could not load {runtime}: {e}")
+                    continue
+                self.stdout.write(f"load_seconds: {time.perf_counter() - started:.2f}")
+
+                # 3. Parity against torch on the same chunks
+                parity = cosine_parity(reference_vectors, model.embed_documents(texts))
+                self.stdout.write(f"min_cosine: {parity['min_cosine']:.5f}")
+                self.stdout.write(f"mean_cosine: {parity['mean_cosine']:.5f}")
+
+                # 4. Query latency (one text per call, like every chat request) and ingestion throughput
+                query_ms = query_latency_ms(model, SAMPLE_QUERIES * 5)
+                self.stdout.write(f"query_median_ms: {query_ms:.2f}")
+
+                tuned = autotune_batch_size(model, texts, options['batch_sizes'])
+                for batch_size, rate in tuned['documents_per_second'].items():
+                    self.stdout.write(f"batch_{batch_size}_chunks_per_second: {rate:.1f}")
+                self.stdout.write(f"best_batch_size: {tuned['batch_size']}")
+
+                if parity['min_cosine'] < min_cosine:
+                    self.stdout.write(self.style.ERROR(
+                        f"Parity check failed: min cosine {parity['min_cosine']:.5f} < {min_cosine}, not saved."
+                    ))
+                    continue
+
+                passed[(runtime, threads)] = {
+                    'query_ms': query_ms,
+                    'chunks_per_second': tuned['documents_per_second'][tuned['batch_size']],
+                }
+
+                if options['save']:
+                    save_tuning(tuning_key(model_name, runtime, threads), {
+                        'batch_size': tuned['batch_size'],
+                        'min_cosine': parity['min_cosine'],
+                        'query_median_ms': query_ms,
+                    })
+                    self.stdout.write(f"Saved batch size {tuned['batch_size']} for {runtime}, threads={threads}.")
+
+        # The batch size only affects ingestion, query latency decides what chat requests wait for.
+        # Web processes and celery workers read the same EMBEDDING_RUNTIME, so both are shown.
+        if passed:
+            fastest_queries = min(passed, key=lambda key: passed[key]['query_ms'])
+            fastest_ingestion = max(passed, key=lambda key: passed[key]['chunks_per_second'])
+            self.stdout.write(self.style.SUCCESS("--- summary ---"))
+            self.stdout.write(f"lowest_query_latency: {fastest_queries[0]}, threads={fastest_queries[1] or 'default'} ({passed[fastest_queries]['query_ms']:.2f} ms)")
+            self.stdout.write(f"highest_ingestion_throughput: {fastest_ingestion[0]}, threads={fastest_ingestion[1] or 'default'} ({passed[fastest_ingestion]['chunks_per_second']:.1f} chunks/s)")
@@ -0,0 +1,30 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+
+@database_sync_to_async
+def get_jwt_user(raw_token: str):
+    """The user of a SimpleJWT access token, AnonymousUser if it is invalid or expired."""
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates a WebSocket connection once, at the handshake, with the same SimpleJWT access
+    token the REST API uses. Browsers can't set headers on a WebSocket, so it is sent as ?token=.
+    Sets scope['user'] (AnonymousUser without a valid token), the consumers decide what to refuse.
+    """
+
+    async def __call__(self, scope, receive, send):
+        token = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+        scope['user'] = await get_jwt_user(token) if token else AnonymousUser()
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_chatsession_summary'),
+        ('users', '0002_userdocument_ingestion_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='pinned_documents',
+            field=models.ManyToManyField(blank=True, related_name='pinned_sessions', to='users.userdocument'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_chatsession_pinned_documents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='request_id',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
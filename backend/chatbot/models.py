@@ -10,6 +10,22 @@ class ChatSession(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Rolling summary of the oldest messages, maintained by the update_session_summary task.
+    # It covers the first `summary_message_count` messages of the session (in timestamp order).
+    summary = models.TextField(blank=True, default="")
+
+    summary_message_count = models.PositiveIntegerField(default=0)
+
+    # Documents the session is pinned to. When set, answers are only retrieved from these
+    # documents, unless a message names its own document_ids.
+    pinned_documents = models.ManyToManyField('users.UserDocument', blank=True, related_name='pinned_sessions')
+
+    class Meta:
+        indexes = [
+            # The sidebar: a user's sessions, newest first
+            models.Index(fields=['user', 'created_at'], name='chatsession_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Chat Session with {self.user.username} at {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
@@ -24,6 +40,16 @@ class ChatMessage(models.Model):
 
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    # Id of the chat request that saved this message, the same one found in the request's
+    # trace log line, so a slow or wrong answer can be traced back to its stage timings
+    request_id = models.CharField(max_length=64, blank=True, default='', db_index=True)
+
+    class Meta:
+        indexes = [
+            # A session's messages in order: chat history, the last message time of the sidebar
+            models.Index(fields=['session', 'timestamp'], name='chatmessage_session_ts_idx'),
+        ]
+
     def __str__(self):
         sender = "AI" if self.is_from_ai else "User"
         return f"{sender}: {self.message[:50]}..."
\ No newline at end of file
@@ -0,0 +1,86 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+
+
+class ChatSessionPagination(CursorPagination):
+    """
+    Sessions newest first. Pages continue from the last session the client saw, so sessions
+    created in the meantime don't shift later pages (no duplicates, unlike page numbers).
+    """
+    ordering = ('-created_at', '-id')
+    page_size = settings.CHAT_SESSION_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+def encode_cursor(message) -> str:
+    raw = f"{message.timestamp.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Returns the (timestamp, id) position a cursor points at. Raises ValueError if it is malformed."""
+    timestamp, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(timestamp), int(message_id)
+
+
+class MessageKeysetPagination(BasePagination):
+    """
+    Keyset pagination of a session's messages on (timestamp, id), served oldest to newest:
+      no cursor       the most recent page
+      ?before=<c>     the page just older than the cursor (scrolling back)
+      ?after=<c>      the messages newer than the cursor (polling for new ones)
+    Every page is one indexed range query, however deep into the history it is.
+    """
+    page_size = settings.CHAT_MESSAGE_PAGE_SIZE
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        before = request.query_params.get('before')
+        after = request.query_params.get('after')
+        if before and after:
+            raise ValidationError({'detail': "Use either 'before' or 'after', not both."})
+
+        try:
+            limit = min(int(request.query_params.get('limit', self.page_size)), self.max_page_size)
+            position = decode_cursor(before or after) if (before or after) else None
+        except ValueError:
+            raise ValidationError({'detail': 'Invalid limit or cursor.'})
+        if limit < 1:
+            raise ValidationError({'detail': 'Invalid limit or cursor.'})
+
+        self.after = after
+
+        if after:
+            timestamp, message_id = position
+            newer = Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=message_id)
+            rows = list(queryset.filter(newer).order_by('timestamp', 'id')[:limit + 1])
+        else:
+            if before:
+                timestamp, message_id = position
+                older = Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id)
+                queryset = queryset.filter(older)
+            # Newest first to take the page
+            rows = list(queryset.order_by('-timestamp', '-id')[:limit + 1])
+
+        # The extra row only tells whether there is more in the direction we read
+        self.has_more = len(rows) > limit
+        self.page = rows[:limit] if after else rows[:limit][::-1]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'results': data,
+            # More messages past this page: older ones for latest / before, newer ones for after
+            'has_more': self.has_more,
+            # Pass as ?before= to load the older page
+            'before': encode_cursor(self.page[0]) if self.page else None,
+            # Pass as ?after= to fetch what was added since (kept as-is when nothing was new)
+            'after': encode_cursor(self.page[-1]) if self.page else self.after,
+        })
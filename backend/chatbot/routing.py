@@ -0,0 +1,10 @@
+# WebSocket routes, served by the ProtocolTypeRouter in core/asgi.py
+
+from django.urls import path
+
+from .consumers import ChatConsumer, UserEventsConsumer
+
+websocket_urlpatterns = [
+    path('ws/sessions/<int:session_id>/', ChatConsumer.as_asgi()),
+    path('ws/documents/', UserEventsConsumer.as_asgi()),
+]
@@ -1,19 +1,40 @@
 from rest_framework import serializers
 from .models import ChatSession, ChatMessage
+from users.models import UserDocument
 
 class ChatMessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         
         model = ChatMessage
-        fields = ['id', 'message', 'is_from_ai', 'timestamp']
+        fields = ['id', 'message', 'is_from_ai', 'timestamp', 'request_id']
+
+class ChatSessionListSerializer(serializers.ModelSerializer):
+
+    # Compact sidebar entry, the counts come from annotations on the list queryset
+    message_count = serializers.IntegerField(read_only=True)
+
+    last_message_at = serializers.DateTimeField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = ChatSession
+        fields = ['id', 'title', 'created_at', 'last_message_at', 'message_count']
 
 class ChatSessionSerializer(serializers.ModelSerializer):
 
     # This nested serializer will include all messages for a session
     messages = ChatMessageSerializer(many=True, read_only=True)
 
+    pinned_documents = serializers.PrimaryKeyRelatedField(many=True, required=False, queryset=UserDocument.objects.all())
+
     class Meta:
         model = ChatSession
-        fields = ['id', 'user', 'title', 'created_at', 'messages']
-        read_only_fields = ['user'] # User is set automatically
\ No newline at end of file
+        fields = ['id', 'user', 'title', 'created_at', 'pinned_documents', 'messages']
+        read_only_fields = ['user'] # User is set automatically
+
+    def validate_pinned_documents(self, documents):
+        # A session can only be pinned to the user's own documents
+        user = self.context['request'].user
+        if any(document.user_id != user.id for document in documents):
+            raise serializers.ValidationError("Documents not found or access denied.")
+        return documents
\ No newline at end of file
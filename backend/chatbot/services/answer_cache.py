@@ -0,0 +1,145 @@
+# Semantic answer cache, scoped per user.
+# Users keep asking near-identical questions about the same documents. If a new question's
+# embedding is close enough to one we already answered, and the user's documents have not
+# changed since (same corpus version), we return the stored answer without any LLM call.
+#
+# Only document-grounded (RAG) answers to questions asked without any earlier turns are cached:
+# a follow-up ("tell me more") is condensed against its chat history, so its answer depends on
+# the conversation and not only on the question and the user's corpus (see ChatBot._lookup_cached_answer).
+#
+# Each user's entries live in `max_entries` slots, one cache key per slot, next to a small key
+# per slot holding when the entry was last used and when it expires. A store fills an empty slot,
+# else replaces the least recently used entry, and claims its slot with an atomic add first, so
+# concurrent requests never overwrite each other's entries.
+# Hits and misses are counted in the chat_answer_cache_lookups Prometheus counter (metrics.py).
+
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.core.cache import cache
+
+from .corpus_version import get_corpus_version
+from .metrics import ANSWER_CACHE_LOOKUPS
+
+# Seconds a slot stays claimed by a store, long enough for its single write
+CLAIM_TIMEOUT = 10
+
+
+def _slot_key(user_id: int, slot: int) -> str:
+    return f"chatbot:answer_cache:user:{user_id}:slot:{slot}"
+
+
+def _used_key(user_id: int, slot: int) -> str:
+    # (last used, expires at) of the slot's entry, both epoch seconds
+    return f"chatbot:answer_cache:user:{user_id}:slot:{slot}:used"
+
+
+def _claim_key(user_id: int, slot: int) -> str:
+    return f"chatbot:answer_cache:user:{user_id}:slot:{slot}:claim"
+
+
+def _scope(document_ids: Optional[Sequence[int]]) -> Optional[List[int]]:
+    return sorted(document_ids) if document_ids else None
+
+
+def _normalize(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+
+    def __init__(self, similarity_threshold: float, ttl: int, max_entries: int):
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def lookup(self, user_id: int, question_embedding: List[float], document_ids: Optional[Sequence[int]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns {'question', 'answer', 'sources', 'similarity'} for the closest cached question
+        above the similarity threshold, or None.
+        Only answers given for the same document selection (`document_ids`, None for all) match.
+        """
+        scope = _scope(document_ids)
+        candidates = [(slot, entry) for slot, entry in self._live_entries(user_id) if entry['scope'] == scope]
+        hit = None
+
+        if candidates:
+            query = _normalize(question_embedding)
+            matrix = np.frombuffer(b"".join(entry['embedding'] for _, entry in candidates), dtype=np.float32)
+            similarities = matrix.reshape(len(candidates), -1) @ query
+            best = int(np.argmax(similarities))
+
+            if similarities[best] >= self.similarity_threshold:
+                slot, entry = candidates[best]
+                hit = {
+                    'question': entry['question'],
+                    'answer': entry['answer'],
+                    'sources': entry['sources'],
+                    'similarity': float(similarities[best]),
+                }
+                self._touch(user_id, slot, entry['expires_at'])
+
+        ANSWER_CACHE_LOOKUPS.labels('hit' if hit else 'miss').inc()
+
+        return hit
+
+    def store(self, user_id: int, question: str, question_embedding: List[float], answer: str, sources: List[str], document_ids: Optional[Sequence[int]] = None) -> None:
+        slot = self._claim_slot(user_id)
+        if slot is None:
+            # Every slot is being written by another request right now
+            return
+
+        now = time.time()
+        cache.set(_slot_key(user_id, slot), {
+            'question': question,
+            'embedding': _normalize(question_embedding).tobytes(),
+            'answer': answer,
+            'sources': sources,
+            'scope': _scope(document_ids),
+            'corpus_version': get_corpus_version(user_id),
+            'expires_at': now + self.ttl,
+        }, timeout=self.ttl)
+        cache.set(_used_key(user_id, slot), (now, now + self.ttl), timeout=self.ttl)
+        cache.delete(_claim_key(user_id, slot))
+
+    def _claim_slot(self, user_id: int) -> Optional[int]:
+        """
+        Claims an empty slot, else the least recently used one. A slot another store claimed is
+        skipped for the next candidate. Returns None if none could be claimed.
+        """
+        now = time.time()
+        used = cache.get_many([_used_key(user_id, slot) for slot in range(self.max_entries)])
+
+        def last_used(slot: int) -> float:
+            value = used.get(_used_key(user_id, slot))
+            # Never stored, or expired: free
+            return value[0] if value and value[1] > now else float('-inf')
+
+        for slot in sorted(range(self.max_entries), key=last_used):
+            if cache.add(_claim_key(user_id, slot), 1, timeout=CLAIM_TIMEOUT):
+                return slot
+        return None
+
+    @staticmethod
+    def _touch(user_id: int, slot: int, expires_at: float) -> None:
+        """Marks a slot's entry as just used, the entry itself keeps its expiry."""
+        now = time.time()
+        if expires_at > now:
+            cache.set(_used_key(user_id, slot), (now, expires_at), timeout=max(1, int(expires_at - now)))
+
+    def _live_entries(self, user_id: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        (slot, entry) of the entries still within their TTL (expired slots are gone) that were
+        answered from the current corpus.
+        """
+        version = get_corpus_version(user_id)
+        keys = [_slot_key(user_id, slot) for slot in range(self.max_entries)]
+        entries = cache.get_many(keys)
+
+        return [
+            (slot, entries[key]) for slot, key in enumerate(keys)
+            if key in entries and entries[key]['corpus_version'] == version
+        ]
@@ -0,0 +1,88 @@
+# Status of answers generated in a celery worker (CHAT_ANSWER_MODE = 'celery').
+# The send endpoint (or the session's WebSocket) creates a job and returns its id right away, the
+# `generate_answer` task moves it through PENDING -> PROCESSING -> SUCCESS / FAILURE and the client
+# polls it, or gets it pushed on the WebSocket.
+# Jobs live in the shared Django cache (Redis) so web processes and workers see the same record.
+# A job is two keys: its fixed fields, written once by create_job, and its state (status + result),
+# which update_job overwrites in a single write. Nothing is read, modified and written back, so
+# concurrent updates can't resurrect fields another writer just changed.
+
+import uuid
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from chatbot.models import ChatMessage, ChatSession
+from chatbot.tasks import generate_answer
+
+
+FINISHED = ('SUCCESS', 'FAILURE')
+
+
+def _key(job_id: str) -> str:
+    return f"chatbot:answer_job:{job_id}"
+
+
+def _state_key(job_id: str) -> str:
+    return f"chatbot:answer_job:{job_id}:state"
+
+
+def _load(job_id: str) -> Optional[Dict[str, Any]]:
+    values = cache.get_many([_key(job_id), _state_key(job_id)])
+    if _key(job_id) not in values:
+        return None
+    return {**values[_key(job_id)], **values.get(_state_key(job_id), {'status': 'PENDING', 'result': None})}
+
+
+def create_job(user_id: int, session_id: int, request_id: str) -> Dict[str, Any]:
+    job = {
+        'job_id': uuid.uuid4().hex,
+        'user_id': user_id,
+        'session_id': session_id,
+        'request_id': request_id,
+    }
+    state = {'status': 'PENDING', 'result': None}
+    cache.set_many({_key(job['job_id']): job, _state_key(job['job_id']): state}, timeout=settings.CHAT_ANSWER_JOB_TTL_SECONDS)
+    return {**job, **state}
+
+
+def enqueue_answer(user_id: int, session: ChatSession, question: str, document_ids: Optional[List[int]], request_id: str) -> Dict[str, Any]:
+    """Saves the question and queues its answer on the chat_answers queue, returns the new job."""
+    # Saved here, the task only adds the answer
+    ChatMessage.objects.create(session=session, message=question, is_from_ai=False, request_id=request_id)
+
+    job = create_job(user_id, session.id, request_id)
+    generate_answer.delay(job['job_id'], session.id, question, document_ids, request_id)
+    return job
+
+
+def get_job(job_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+    """The job, or None if it doesn't exist (any more) or belongs to another user."""
+    job = _load(job_id)
+    if job is None or job['user_id'] != user_id:
+        return None
+    return job
+
+
+def is_finished(job_id: str) -> bool:
+    """True once the job reached SUCCESS or FAILURE (or expired), e.g. for a redelivered task."""
+    job = _load(job_id)
+    return job is None or job['status'] in FINISHED
+
+
+def update_job(job_id: str, status: str, result: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Sets the job's status and result, returns the updated job or None if it expired."""
+    job = cache.get(_key(job_id))
+    if job is None:
+        # Expired before the worker got to it, nobody is polling any more
+        return None
+
+    state = {'status': status, 'result': result}
+    cache.set(_state_key(job_id), state, timeout=settings.CHAT_ANSWER_JOB_TTL_SECONDS)
+    return {**job, **state}
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """What a client sees of a job, polled or pushed."""
+    return {key: job[key] for key in ('job_id', 'session_id', 'request_id', 'status', 'result')}
@@ -3,10 +3,16 @@
 #  Its purpose is to create and manage a single, shared instance of your resource-intensive ChatBot class, ensuring it's only loaded into memory when it's first needed.
 
 
+from django.conf import settings
+
+from .model_registry import warn_about_stale_documents
 from .rag_pipeline import ChatBot
+from .vector_store_pool import VectorStorePool
+from .vector_stores import open_user_vector_store
 
 class ChatbotService:
     _instance = None
+    _vector_store_pool = None
 
     @classmethod
     def get_instance(cls):
@@ -16,11 +22,28 @@ class ChatbotService:
         """
         if cls._instance is None:
             print("Initializing ChatBot instance for the first time...")
-            cls._instance = ChatBot()
+            cls._instance = ChatBot(vector_store_pool=cls.get_vector_store_pool())
             print("ChatBot instance created successfully.")
+            # Queries are embedded with the configured runtime, vectors built with another one don't match
+            warn_about_stale_documents()
 
         return cls._instance
 
+    @classmethod
+    def get_vector_store_pool(cls):
+        """
+        Returns the pool of open per-user vector store handles shared by the ChatBot.
+        """
+        if cls._vector_store_pool is None:
+            cls._vector_store_pool = VectorStorePool(
+                factory=open_user_vector_store,
+                max_size=settings.VECTOR_STORE_POOL_SIZE,
+                idle_timeout=settings.VECTOR_STORE_POOL_IDLE_SECONDS,
+                version_check_interval=settings.VECTOR_STORE_POOL_VERSION_CHECK_SECONDS
+            )
+
+        return cls._vector_store_pool
+
 def get_bot_instance():
 
     return ChatbotService.get_instance()
\ No newline at end of file
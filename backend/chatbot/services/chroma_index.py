@@ -0,0 +1,69 @@
+# Chroma backend of the VectorIndex interface: one persistent collection per user.
+
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+
+from .vector_index import VectorIndex
+
+# Chroma rejects very large single writes
+WRITE_BATCH_SIZE = 1000
+
+
+class ChromaIndex(Chroma, VectorIndex):
+
+    def upsert_vectors(self, ids: List[str], vectors: Sequence[Sequence[float]], texts: List[str], metadatas: List[dict]) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32).tolist()
+        # Chroma wants None rather than an empty metadata dict
+        metadatas = [metadata or None for metadata in metadatas]
+
+        for start in range(0, len(ids), WRITE_BATCH_SIZE):
+            end = start + WRITE_BATCH_SIZE
+            self._collection.upsert(
+                ids=ids[start:end], embeddings=vectors[start:end], documents=texts[start:end], metadatas=metadatas[start:end]
+            )
+
+    def delete_document(self, user_document_id: int, keep: Set[str] = frozenset()) -> int:
+        existing = self._collection.get(where={"user_document_id": user_document_id}, include=[])['ids']
+        stale = [vector_id for vector_id in existing if vector_id not in keep]
+
+        for start in range(0, len(stale), WRITE_BATCH_SIZE):
+            self._collection.delete(ids=stale[start:start + WRITE_BATCH_SIZE])
+        return len(stale)
+
+    def delete_untagged(self) -> int:
+        # A where clause cannot match a missing key
+        existing = self._collection.get(include=["metadatas"])
+        untagged = [
+            vector_id for vector_id, metadata in zip(existing['ids'], existing['metadatas'])
+            if not metadata or 'user_document_id' not in metadata
+        ]
+
+        for start in range(0, len(untagged), WRITE_BATCH_SIZE):
+            self._collection.delete(ids=untagged[start:start + WRITE_BATCH_SIZE])
+        return len(untagged)
+
+    def clear(self) -> None:
+        existing = self._collection.get(include=[])['ids']
+        for start in range(0, len(existing), WRITE_BATCH_SIZE):
+            self._collection.delete(ids=existing[start:start + WRITE_BATCH_SIZE])
+
+    def search_by_vectors(self, embeddings: Sequence[Sequence[float]], k: int, filter: Optional[Dict[str, Any]] = None) -> List[List[Tuple[Document, float]]]:
+        # All query vectors in a single multi-vector query
+        results = self._collection.query(
+            query_embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+            n_results=k,
+            where=filter,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                (Document(page_content=text, metadata=metadata or {}, id=doc_id), distance)
+                for text, metadata, doc_id, distance in zip(texts, metadatas, ids, distances)
+            ]
+            for texts, metadatas, ids, distances in zip(
+                results["documents"], results["metadatas"], results["ids"], results["distances"]
+            )
+        ]
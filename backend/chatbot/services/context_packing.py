@@ -0,0 +1,121 @@
+# Context packing between retrieval and the answer call.
+# Multi-query retrieval hands back up to six variants x k chunks, and with chunk_overlap=120
+# many of them repeat each other. Before they are stuffed into the prompt we:
+#   1. pick chunks in MMR order (relevant to the question, but not to what is already picked),
+#   2. drop near-duplicates of chunks already picked,
+#   3. stop adding chunks once the (estimated) token budget is used up,
+#   4. stitch picked chunks that overlap on the same page back into one passage.
+# Chunk vectors come from the ingestion embedding cache, so this normally runs no model call.
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+# Rough token estimate for English text, good enough for a budget. The answer model's tokenizer
+# isn't available offline (and tiktoken's encodings would need a download and only approximate it),
+# so the budget is in estimated tokens, not exact ones.
+CHARS_PER_TOKEN = 4
+
+# Shorter shared text is likely a coincidence, not the splitter's chunk overlap
+MIN_OVERLAP_CHARS = 20
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def text_overlap(left: str, right: str, min_overlap: int = MIN_OVERLAP_CHARS) -> int:
+    """
+    Length of the longest suffix of `left` that is also a prefix of `right`, 0 if it is
+    shorter than `min_overlap`.
+    """
+    if len(left) < min_overlap or len(right) < min_overlap:
+        return 0
+
+    head = right[:min_overlap]
+    start = left.find(head)
+    while start != -1:
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start = left.find(head, start + 1)
+
+    return 0
+
+
+def _page_key(doc: Document) -> Tuple:
+    metadata = doc.metadata
+    return (metadata.get('user_document_id', metadata.get('source')), metadata.get('page'))
+
+
+def merge_adjacent(docs: List[Document]) -> List[Document]:
+    """
+    Joins chunks of the same page whose text overlaps (consecutive splitter chunks) into one
+    passage, so the shared text is only sent once. Order follows the first chunk of each passage.
+    """
+    merged = []
+    for doc in docs:
+        for index, kept in enumerate(merged):
+            if _page_key(kept) != _page_key(doc):
+                continue
+
+            if overlap := text_overlap(kept.page_content, doc.page_content):
+                text = kept.page_content + doc.page_content[overlap:]
+            elif overlap := text_overlap(doc.page_content, kept.page_content):
+                text = doc.page_content + kept.page_content[overlap:]
+            else:
+                continue
+
+            merged[index] = Document(page_content=text, metadata=kept.metadata, id=kept.id)
+            break
+        else:
+            merged.append(doc)
+
+    # A merged passage may now overlap a chunk it didn't touch before
+    return merged if len(merged) == len(docs) else merge_adjacent(merged)
+
+
+class ContextPacker:
+    """
+    Selects and packs retrieved chunks into at most `estimated_token_budget` tokens of context,
+    as counted by estimate_tokens().
+    """
+
+    def __init__(self, embeddings: Embeddings, estimated_token_budget: int, duplicate_similarity: float, mmr_lambda: float):
+        self.embeddings = embeddings
+        self.estimated_token_budget = estimated_token_budget
+        self.duplicate_similarity = duplicate_similarity
+        self.mmr_lambda = mmr_lambda
+
+    def pack(self, query: str, docs: List[Document], query_embedding: Optional[List[float]] = None) -> List[Document]:
+        if not docs:
+            return []
+
+        vectors = np.asarray(self.embeddings.embed_documents([doc.page_content for doc in docs]), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        if query_embedding is None:
+            query_embedding = self.embeddings.embed_query(query)
+
+        order = maximal_marginal_relevance(
+            np.asarray(query_embedding, dtype=np.float32), vectors, lambda_mult=self.mmr_lambda, k=len(docs)
+        )
+
+        selected = []
+        used_tokens = 0
+        for index in order:
+            # Near-duplicate of a chunk we already have (e.g. the same paragraph in two uploads)
+            if selected and float(np.max(vectors[selected] @ vectors[index])) >= self.duplicate_similarity:
+                continue
+
+            tokens = estimate_tokens(docs[index].page_content)
+            if used_tokens + tokens > self.estimated_token_budget:
+                # A smaller chunk further down may still fit
+                continue
+
+            selected.append(index)
+            used_tokens += tokens
+
+        return merge_adjacent([docs[index] for index in selected])
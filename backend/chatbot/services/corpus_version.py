@@ -0,0 +1,23 @@
+# Per-user corpus version, bumped every time a user's vector collection changes.
+# It lives in the shared Django cache (Redis) so the web processes notice ingestion
+# that happened in a celery worker and can drop anything derived from the old corpus.
+
+from django.core.cache import cache
+
+
+def _key(user_id: int) -> str:
+    return f"chatbot:corpus_version:{user_id}"
+
+
+def get_corpus_version(user_id: int) -> int:
+    return cache.get(_key(user_id), 0)
+
+
+def bump_corpus_version(user_id: int) -> int:
+    """Marks the user's corpus as changed and returns the new version."""
+    try:
+        return cache.incr(_key(user_id))
+    except ValueError:
+        # incr() raises when the key does not exist yet
+        cache.add(_key(user_id), 0, timeout=None)
+        return cache.incr(_key(user_id))
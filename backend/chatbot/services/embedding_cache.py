@@ -0,0 +1,224 @@
+
+# Content-addressed embedding cache used during ingestion.
+# A chunk's vector only depends on its text and the model that produced it, so we key
+# every vector by sha256(model_name + text). Re-uploading a revised document (or the
+# same boilerplate pages uploaded by another user) then only embeds the chunks we have
+# never seen before.
+# The query path (context packing) only reads it, through a separate read-only connection, so
+# chat requests never take SQLite's write lock away from running ingestions.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCache:
+    """
+    Persistent key -> vector store backed by a local SQLite file.
+    Entries are evicted least-recently-used first once the stored vectors
+    grow past `max_bytes`. Hit/miss counters are persisted with the data so
+    they survive worker restarts.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+        self._read_conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Several celery worker processes share the same file, WAL keeps readers from blocking writers
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.executemany(
+                "INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)",
+                [('hits',), ('misses',), ('size_bytes',)]
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _read_connection(self) -> Optional[sqlite3.Connection]:
+        """Read-only connection, None while no ingestion has created the file yet."""
+        if self._read_conn is None and os.path.exists(self.path):
+            self._read_conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30, check_same_thread=False)
+        return self._read_conn
+
+    @staticmethod
+    def make_key(namespace: str, text: str) -> str:
+        return hashlib.sha256(f"{namespace}\x00{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Returns the cached vectors for the given keys (missing keys are simply absent)
+        and records one hit or miss per requested key.
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+
+        with self._lock:
+            conn = self._connection()
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+
+            now = time.time()
+            conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'hits'", (len(found),))
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'misses'", (len(unique_keys) - len(found),))
+            conn.commit()
+
+        return found
+
+    def peek_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Like get_many, but without touching anything: no LRU or counter updates, no schema
+        setup. For the query path, the counters describe ingestion.
+        """
+        found = {}
+
+        with self._lock:
+            conn = self._read_connection()
+            if conn is None:
+                return found
+
+            unique_keys = list(dict.fromkeys(keys))
+            try:
+                for start in range(0, len(unique_keys), 500):
+                    batch = unique_keys[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = array('f', blob).tolist()
+            except sqlite3.OperationalError:
+                # The file exists but its tables don't yet, everything is a miss
+                pass
+
+        return found
+
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = array('f', vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+
+        with self._lock:
+            conn = self._connection()
+            # Only count bytes for keys we actually add, another worker may have stored some of them already
+            added = 0
+            for row in rows:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)", row
+                )
+                if cursor.rowcount:
+                    added += row[2]
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'size_bytes'", (added,))
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drops least-recently-used vectors until the cache fits in max_bytes again."""
+        size = conn.execute("SELECT value FROM counters WHERE name = 'size_bytes'").fetchone()[0]
+        while size > self.max_bytes:
+            rows = conn.execute("SELECT key, size FROM embeddings ORDER BY last_used LIMIT 1000").fetchall()
+            if not rows:
+                size = 0
+                break
+            freed = 0
+            victims = []
+            for key, entry_size in rows:
+                victims.append((key,))
+                freed += entry_size
+                if size - freed <= self.max_bytes:
+                    break
+            conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+            size -= freed
+        conn.execute("UPDATE counters SET value = ? WHERE name = 'size_bytes'", (size,))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self._connection()
+            stats = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            stats['entries'] = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return stats
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model so embed_documents() only runs the model on cache misses.
+    Query embeddings are not cached, they are one-off and cheap compared to ingestion.
+    With read_only=True (the query path) cached vectors are only looked up: misses are
+    embedded but not stored, and nothing is written to the cache file.
+    """
+
+    def __init__(self, embeddings: Embeddings, namespace: str, cache: Optional[EmbeddingCache] = None, read_only: bool = False):
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.cache = cache or get_embedding_cache()
+        self.read_only = read_only
+        # Per-instance counters, handy for reporting on a single ingestion run
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [EmbeddingCache.make_key(self.namespace, text) for text in texts]
+        vectors = self.cache.peek_many(keys) if self.read_only else self.cache.get_many(keys)
+
+        # Embed each missing text once, even if it appears several times in this batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        self.hits += len(set(keys)) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), new_vectors))
+            if not self.read_only:
+                self.cache.set_many(computed)
+            vectors.update(computed)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+_cache = None
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Returns the process-wide embedding cache configured in settings."""
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_BYTES)
+    return _cache
@@ -0,0 +1,158 @@
+# CPU runtimes for the sentence-transformer behind every embedding.
+#   torch       sentence-transformers as is (float32 PyTorch)
+#   torch-int8  the same model with its Linear layers dynamically quantized to int8
+#   onnx        ONNX Runtime on the float32 ONNX export shipped in the model repo
+#   onnx-int8   ONNX Runtime on the int8 quantized export shipped in the model repo
+# All of them return the same HuggingFaceEmbeddings wrapper, so nothing downstream changes.
+# `python manage.py tune_embeddings` checks a runtime's vectors against torch and picks the
+# encode batch size, which is stored in settings.EMBEDDING_TUNING_PATH and applied at load.
+
+import json
+import os
+import statistics
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+RUNTIMES = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+
+# sentence-transformers' own default
+DEFAULT_BATCH_SIZE = 32
+
+# Among batch sizes this close to the best throughput, the smallest wins (less padding and memory)
+BATCH_SIZE_TOLERANCE = 0.05
+
+
+def load_embedding_model(model_name: str, runtime: str, threads: int = 0, batch_size: int = None) -> HuggingFaceEmbeddings:
+    """
+    Builds the embedding model on the given runtime. `threads` caps the intra-op threads
+    (0 keeps the library default), `batch_size` is the encode batch used by embed_documents.
+    """
+    if runtime not in RUNTIMES:
+        raise ImproperlyConfigured(f"Unknown EMBEDDING_RUNTIME '{runtime}', expected one of: {', '.join(RUNTIMES)}")
+
+    model_kwargs = {}
+
+    if runtime.startswith('onnx'):
+        import onnxruntime
+
+        session_options = onnxruntime.SessionOptions()
+        if threads:
+            session_options.intra_op_num_threads = threads
+            session_options.inter_op_num_threads = 1
+
+        model_kwargs = {
+            'backend': 'onnx',
+            'model_kwargs': {
+                'file_name': settings.EMBEDDING_ONNX_FILES[runtime],
+                'provider': 'CPUExecutionProvider',
+                'session_options': session_options,
+            },
+        }
+    elif threads:
+        import torch
+
+        # Process wide, like the torch default it replaces
+        torch.set_num_threads(threads)
+
+    model = HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs={'batch_size': batch_size or DEFAULT_BATCH_SIZE}
+    )
+
+    if runtime == 'torch-int8':
+        import torch
+
+        torch.ao.quantization.quantize_dynamic(model._client, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+    return model
+
+
+# --- Tuning profile ---
+
+def tuning_key(model_name: str, runtime: str, threads: int) -> str:
+    return f"{model_name}|{runtime}|{threads}"
+
+
+def load_tuning(path: str = None) -> Dict[str, dict]:
+    path = path or settings.EMBEDDING_TUNING_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_tuning(key: str, entry: dict, path: str = None) -> None:
+    path = path or settings.EMBEDDING_TUNING_PATH
+    tuning = load_tuning(path)
+    tuning[key] = entry
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written whole then renamed, so a worker starting meanwhile never reads half a file
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(tuning, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def tuned_batch_size(model_name: str, runtime: str, threads: int) -> Optional[int]:
+    entry = load_tuning().get(tuning_key(model_name, runtime, threads))
+    return entry['batch_size'] if entry else None
+
+
+# --- Measurements ---
+
+def cosine_parity(reference: Sequence[Sequence[float]], candidate: Sequence[Sequence[float]]) -> Dict[str, float]:
+    """Row-wise cosine similarity between two sets of vectors for the same texts."""
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+
+    similarities = np.sum(reference * candidate, axis=1) / np.maximum(
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1), 1e-12
+    )
+    return {'min_cosine': float(similarities.min()), 'mean_cosine': float(similarities.mean())}
+
+
+def documents_per_second(model: HuggingFaceEmbeddings, texts: List[str], batch_size: int, repeat: int = 3) -> float:
+    model.encode_kwargs['batch_size'] = batch_size
+    # Warm-up, the first call at a new shape pays for allocations
+    model.embed_documents(texts[:batch_size])
+
+    best = 0.0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        model.embed_documents(texts)
+        best = max(best, len(texts) / (time.perf_counter() - started))
+    return best
+
+
+def query_latency_ms(model: Embeddings, queries: List[str]) -> float:
+    model.embed_query(queries[0])
+
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        model.embed_query(query)
+        timings.append((time.perf_counter() - started) * 1e3)
+    return statistics.median(timings)
+
+
+def autotune_batch_size(model: HuggingFaceEmbeddings, texts: List[str], candidates: Sequence[int]) -> Dict:
+    """
+    Measures ingestion throughput at each candidate batch size and returns the smallest one
+    within BATCH_SIZE_TOLERANCE of the best, with every measurement.
+    Query latency plays no part here: embed_query encodes a single text, whatever the batch size.
+    It is what tells runtimes apart for chat requests, see tune_embeddings.
+    """
+    throughput = {batch_size: documents_per_second(model, texts, batch_size) for batch_size in sorted(candidates)}
+    best = max(throughput.values())
+
+    batch_size = next(size for size, rate in throughput.items() if rate >= best * (1 - BATCH_SIZE_TOLERANCE))
+    model.encode_kwargs['batch_size'] = batch_size
+
+    return {'batch_size': batch_size, 'documents_per_second': throughput}
@@ -0,0 +1,70 @@
+# Streaming building blocks for PDF ingestion.
+# Pages are read lazily, split one at a time and grouped into fixed-size batches, so a
+# 2,000-page manual never has more than one batch of chunks (and their vectors) in memory.
+
+import hashlib
+from itertools import islice
+from typing import Iterable, Iterator, List, Set
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+
+def make_text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=500,
+        chunk_overlap=120,
+        length_function=len,
+        separators=["\n\n", "\n", ".", " "]
+    )
+
+
+def count_pages(pdf_path: str) -> int:
+    # pypdf only reads the page tree here, not the page contents
+    return len(PdfReader(pdf_path).pages)
+
+
+def iter_pages(pdf_path: str) -> Iterator[Document]:
+    yield from PyPDFLoader(pdf_path).lazy_load()
+
+
+def iter_chunks(pages: Iterable[Document], text_splitter: RecursiveCharacterTextSplitter) -> Iterator[Document]:
+    for page in pages:
+        yield from text_splitter.split_documents([page])
+
+
+def iter_batches(chunks: Iterable[Document], batch_size: int) -> Iterator[List[Document]]:
+    chunks = iter(chunks)
+    while batch := list(islice(chunks, batch_size)):
+        yield batch
+
+
+def make_chunk_id(user_document_id: int, page: int, text: str) -> str:
+    """
+    Deterministic vector id for a chunk of a user document. Re-ingesting the same document
+    produces the same ids, so writes overwrite instead of appending copies.
+    """
+    content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return f"doc{user_document_id}:p{page}:{content_hash}"
+
+
+def assign_chunk_ids(chunks: List[Document], user_document_id: int, seen_ids: Set[str]) -> List[Document]:
+    """
+    Tags each chunk with its document and page, sets its deterministic id, and drops chunks
+    whose id is already in `seen_ids` (the same text repeated on a page). `seen_ids` is updated.
+    """
+    unique = []
+    for chunk in chunks:
+        page = chunk.metadata.get('page', 0)
+        chunk.metadata['user_document_id'] = user_document_id
+        chunk.metadata['page'] = page
+        chunk.id = make_chunk_id(user_document_id, page, chunk.page_content)
+
+        if chunk.id not in seen_ids:
+            seen_ids.add(chunk.id)
+            unique.append(chunk)
+
+    return unique
+
@@ -0,0 +1,158 @@
+# Per-user BM25 keyword index.
+# Dense MiniLM vectors are good at paraphrases but blur exact identifiers (part numbers,
+# clause IDs, error codes). Every user gets a small SQLite file with an FTS5 full-text
+# index over their chunks, ranked with BM25, that is searched next to the vector store
+# and fused with it (see retrievers.HybridRetriever).
+#
+# The index is kept up to date by process_document_ingestion, using the same
+# deterministic chunk ids as the vector store, so both can be replaced per document.
+# Only writes create the file and its schema (and switch it to WAL, which persists in the
+# file), searches on the query path just open it.
+
+import json
+import os
+import re
+import sqlite3
+from contextlib import closing
+from typing import List, Optional, Sequence, Set
+
+from django.conf import settings
+from langchain_core.documents import Document
+
+_TOKEN = re.compile(r"\w+")
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS chunks ("
+    "id INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL UNIQUE, user_document_id INTEGER, "
+    "text TEXT NOT NULL, metadata TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS chunks_user_document ON chunks (user_document_id)",
+    # External-content FTS table: the text is stored once, in 'chunks'
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5("
+    "text, content='chunks', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN "
+    "INSERT INTO chunks_fts (rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN "
+    "INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+]
+
+
+def match_expression(query: str) -> str:
+    """
+    FTS5 query for free text: any of the query's words, where a word like 'AX-7731' must
+    match as the exact token sequence 'ax 7731'. Quoting every word keeps FTS5 syntax
+    characters in user input from being interpreted.
+    """
+    phrases = []
+    for word in query.split():
+        tokens = _TOKEN.findall(word)
+        if tokens:
+            phrases.append('"' + " ".join(tokens) + '"')
+
+    return " OR ".join(dict.fromkeys(phrases))
+
+
+class KeywordIndex:
+    """
+    BM25 index over one user's chunks. Connections are opened per call, so an instance is
+    cheap to create and can be used from any thread or process.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Set once this instance has made sure the file and its schema exist
+        self._schema_ready = False
+
+    @classmethod
+    def for_user(cls, user_id: int) -> 'KeywordIndex':
+        return cls(os.path.join(settings.KEYWORD_INDEX_DIR, f"user_{user_id}.sqlite3"))
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _connect_for_write(self) -> sqlite3.Connection:
+        if self._schema_ready:
+            return self._connect()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._connect()
+        # Readers (chat requests) don't block the ingestion worker writing to the same file
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        self._schema_ready = True
+        return conn
+
+    def upsert(self, documents: List[Document]) -> None:
+        """
+        Adds chunks, keyed by their document id. A chunk id identifies its content, so an id that
+        is already indexed only gets its metadata refreshed.
+        """
+        rows = [
+            (doc.id, doc.metadata.get('user_document_id'), doc.page_content, json.dumps(doc.metadata))
+            for doc in documents
+        ]
+
+        with closing(self._connect_for_write()) as conn, conn:
+            conn.executemany(
+                "INSERT INTO chunks (chunk_id, user_document_id, text, metadata) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (chunk_id) DO UPDATE SET "
+                "user_document_id = excluded.user_document_id, metadata = excluded.metadata",
+                rows
+            )
+
+    def delete_document(self, user_document_id: int, keep: Set[str] = frozenset()) -> int:
+        """
+        Deletes every chunk of a user document, except the chunk ids in `keep`.
+        Returns how many chunks were removed.
+        """
+        if not os.path.exists(self.path):
+            return 0
+
+        with closing(self._connect_for_write()) as conn, conn:
+            existing = conn.execute(
+                "SELECT chunk_id FROM chunks WHERE user_document_id = ?", (user_document_id,)
+            ).fetchall()
+            stale = [(chunk_id,) for (chunk_id,) in existing if chunk_id not in keep]
+            conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", stale)
+
+        return len(stale)
+
+    def search(self, query: str, k: int, document_ids: Optional[Sequence[int]] = None) -> List[Document]:
+        """
+        The k chunks with the best BM25 score for the query, best first, optionally limited
+        to some of the user's documents.
+        """
+        expression = match_expression(query)
+        # A user without any ingested document has no index file yet
+        if not expression or not os.path.exists(self.path):
+            return []
+
+        sql = (
+            "SELECT chunks.chunk_id, chunks.text, chunks.metadata FROM chunks_fts "
+            "JOIN chunks ON chunks.id = chunks_fts.rowid WHERE chunks_fts MATCH ?"
+        )
+        params = [expression]
+        if document_ids:
+            sql += f" AND chunks.user_document_id IN ({','.join('?' * len(document_ids))})"
+            params.extend(document_ids)
+        # bm25() is lower-is-better
+        sql += " ORDER BY bm25(chunks_fts) LIMIT ?"
+        params.append(k)
+
+        try:
+            with closing(self._connect()) as conn:
+                rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            # The first ingestion created the file but not its tables yet
+            return []
+
+        return [
+            Document(page_content=text, metadata=json.loads(metadata), id=chunk_id)
+            for chunk_id, text, metadata in rows
+        ]
+
+    def __len__(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
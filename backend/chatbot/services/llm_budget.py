@@ -0,0 +1,26 @@
+# Per-request cap on the number of LLM round trips.
+# Each Groq call adds its full latency to time-to-answer, so the fast pipeline decides which
+# optional calls (query expansion, routing) it can afford before making them.
+
+
+class LLMCallBudgetExceeded(Exception):
+    pass
+
+
+class LLMCallBudget:
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+
+    @property
+    def remaining(self) -> int:
+        return self.limit - self.used
+
+    def spend(self, calls: int = 1) -> None:
+        """Records LLM calls about to be made, refusing to go over the limit."""
+        if calls > self.remaining:
+            raise LLMCallBudgetExceeded(
+                f"LLM call budget of {self.limit} exhausted ({self.used} used, {calls} more requested)"
+            )
+        self.used += calls
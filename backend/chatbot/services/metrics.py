@@ -0,0 +1,66 @@
+# Prometheus histograms of the chat pipeline, filled from each finished RequestTrace (tracing.py),
+# plus counters updated where their event happens, served in the Prometheus text format by MetricsView.
+# With several worker processes, set PROMETHEUS_MULTIPROC_DIR (an empty directory shared by the
+# workers) so every process writes its samples there and the endpoint reports all of them.
+
+import os
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+# Seconds, from a cached answer (milliseconds) to a slow multi-call RAG answer
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+
+REQUEST_SECONDS = Histogram(
+    'chat_request_seconds', 'Wall time of a chat request, question saved to answer saved.',
+    ['endpoint', 'mode', 'route'], buckets=LATENCY_BUCKETS
+)
+
+STAGE_SECONDS = Histogram(
+    'chat_stage_seconds', 'Wall time of one pipeline stage within a chat request.',
+    ['stage', 'mode'], buckets=LATENCY_BUCKETS
+)
+
+LLM_CALLS = Histogram(
+    'chat_llm_calls', 'LLM calls made by a chat request.',
+    ['mode'], buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10)
+)
+
+TOKENS = Histogram(
+    'chat_tokens', 'LLM tokens used by a chat request.',
+    ['kind'], buckets=(0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+)
+
+RETRIEVED_DOCUMENTS = Histogram(
+    'chat_retrieved_documents', 'Chunks returned by retrieval for a chat request, before packing.',
+    ['mode'], buckets=(0, 1, 2, 5, 10, 20, 30, 50, 100)
+)
+
+# Hit rate: rate(chat_answer_cache_lookups_total{result="hit"}[5m]) / rate(chat_answer_cache_lookups_total[5m])
+ANSWER_CACHE_LOOKUPS = Counter(
+    'chat_answer_cache_lookups', 'Semantic answer cache lookups, by outcome.',
+    ['result']
+)
+
+
+def observe_request(trace) -> None:
+    route = trace.route or ('error' if trace.error else 'none')
+
+    REQUEST_SECONDS.labels(trace.endpoint, trace.mode, route).observe(trace.seconds)
+    for stage, seconds in trace.stages.items():
+        STAGE_SECONDS.labels(stage, trace.mode).observe(seconds)
+
+    LLM_CALLS.labels(trace.mode).observe(trace.llm_calls)
+    TOKENS.labels('prompt').observe(trace.prompt_tokens)
+    TOKENS.labels('completion').observe(trace.completion_tokens)
+    RETRIEVED_DOCUMENTS.labels(trace.mode).observe(trace.retrieved_documents)
+
+
+def render_metrics() -> bytes:
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry)
+
@@ -0,0 +1,88 @@
+
+# Process-wide registry for the heavy models we use.
+# Loading the sentence-transformer takes seconds and a few hundred MB, so every process
+# (celery worker child, web worker, management command) should pay that exactly once.
+# Celery workers warm the registry at process init (see core/celery.py), everything else
+# loads lazily on first use. The runtime (torch, ONNX, int8) and its thread count come from
+# settings, see embedding_runtime.py.
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from .embedding_runtime import load_embedding_model, tuned_batch_size
+
+logger = logging.getLogger(__name__)
+
+_embedding_models = {}
+_lock = threading.Lock()
+
+
+def get_embedding_model(model_name: str = None) -> HuggingFaceEmbeddings:
+    """
+    Returns the shared embedding model for `model_name` (defaults to settings.EMBEDDING_MODEL_NAME),
+    loading it on the first call in this process.
+    """
+    model_name = model_name or settings.EMBEDDING_MODEL_NAME
+
+    model = _embedding_models.get(model_name)
+    if model is None:
+        with _lock:
+            # Another thread may have loaded it while we were waiting for the lock
+            model = _embedding_models.get(model_name)
+            if model is None:
+                runtime, threads = settings.EMBEDDING_RUNTIME, settings.EMBEDDING_THREADS
+                # An explicit batch size wins over the one found by `manage.py tune_embeddings`
+                batch_size = settings.EMBEDDING_BATCH_SIZE or tuned_batch_size(model_name, runtime, threads)
+
+                started = time.perf_counter()
+                model = load_embedding_model(model_name, runtime, threads, batch_size)
+                _embedding_models[model_name] = model
+                logger.info("Loaded embedding model '%s' (%s) in %.2fs", model_name, runtime, time.perf_counter() - started)
+
+    return model
+
+
+def embedding_namespace(model_name: str = None) -> str:
+    """
+    Embedding cache namespace of the configured model. Other runtimes produce slightly different
+    vectors, so they get their own entries instead of mixing with the torch ones.
+    """
+    model_name = model_name or settings.EMBEDDING_MODEL_NAME
+    return model_name if settings.EMBEDDING_RUNTIME == 'torch' else f"{model_name}@{settings.EMBEDDING_RUNTIME}"
+
+
+def set_embedding_model(model: Embeddings, model_name: str = None) -> None:
+    """Installs an already-built model in the registry, e.g. a fake one for offline benchmarks."""
+    with _lock:
+        _embedding_models[model_name or settings.EMBEDDING_MODEL_NAME] = model
+
+
+def stale_documents():
+    """
+    Ingested documents whose vectors were not built with the configured model and runtime
+    (or before that was recorded). Their vectors don't match the query vectors any more.
+    """
+    from users.models import UserDocument
+
+    return UserDocument.objects.filter(ingestion_status='SUCCESS').exclude(embedding_namespace=embedding_namespace())
+
+
+def warn_about_stale_documents() -> None:
+    count = stale_documents().count()
+    if count:
+        logger.warning(
+            "%d ingested document(s) were embedded with another model or EMBEDDING_RUNTIME than '%s', "
+            "their search results will be poor until `python manage.py reingest_documents` has run.",
+            count, embedding_namespace()
+        )
+
+
+def preload_models() -> None:
+    """Loads every model a worker needs, called once per worker process."""
+    get_embedding_model()
+    warn_about_stale_documents()
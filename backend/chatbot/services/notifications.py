@@ -0,0 +1,48 @@
+# Pushes events to the WebSocket consumers (chatbot/consumers.py) through the channel layer,
+# from web processes and celery workers alike. Sending is best effort: a missing or unreachable
+# channel layer never fails the task that produced the event, clients can still reload.
+
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+
+def session_group(session_id: int) -> str:
+    return f"chat_session_{session_id}"
+
+
+def user_group(user_id: int) -> str:
+    return f"user_{user_id}"
+
+
+def _send(group: str, event: dict) -> None:
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    try:
+        async_to_sync(channel_layer.group_send)(group, event)
+    except Exception:
+        logger.warning("Could not push '%s' to %s", event['type'], group, exc_info=True)
+
+
+def notify_session_title(session) -> None:
+    _send(session_group(session.id), {'type': 'session.title', 'session_id': session.id, 'title': session.title})
+
+
+def notify_answer_job(session_id: int, job: dict) -> None:
+    _send(session_group(session_id), {'type': 'answer.job', 'job': job})
+
+
+def notify_document_status(doc) -> None:
+    _send(user_group(doc.user_id), {
+        'type': 'document.status',
+        'document_id': doc.id,
+        'status': doc.ingestion_status,
+        'total_pages': doc.total_pages,
+        'pages_processed': doc.pages_processed,
+        'chunks_ingested': doc.chunks_ingested,
+    })
@@ -0,0 +1,494 @@
+# Compact vector store on memory-mapped NumPy files.
+# Chroma keeps every user's float32 vectors (plus an HNSW graph) in RAM once a collection is
+# opened. Here the vectors used for scanning are stored as int8 (4x smaller) or float16 (2x),
+# memory-mapped, so the OS only keeps the pages of recently queried users resident. The search
+# is brute force over the compact codes, and the best `k * rescore_factor` candidates are then
+# rescored exactly against the float32 vectors, which are kept in a separate file that is only
+# read for those few rows.
+#
+# Layout of a store directory (one per user):
+#   chunks.sqlite3      chunk id, text, metadata and row number of every vector, plus counters
+#   codes.<gen>.bin     (rows, dim) int8 / float16 / float32 codes scanned for every query
+#   scales.<gen>.bin    (rows,) float32 dequantization scale per vector (int8 only)
+#   vectors.<gen>.bin   (rows, dim) float32 unit vectors for exact rescoring (not for float32 codes)
+#
+# Rows are append-only. Upserted and deleted chunks are tombstoned and the files are compacted
+# once enough of them are dead. Writers serialize on the SQLite write lock.
+# Compaction writes the next generation's files next to the current ones and only then commits
+# the new generation, so a reader always maps the files of the generation it read in the same
+# transaction. Older generations are removed by the compaction after that one.
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from contextlib import closing
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from .vector_index import VectorIndex
+
+DTYPES = {'int8': np.int8, 'float16': np.float16, 'float32': np.float32}
+
+# Rows dequantized at a time while scanning: keeps the temporary float32 copy small and in cache
+SCAN_BLOCK_ROWS = 1024
+
+# Compact once this share of the rows are tombstones
+COMPACT_DEAD_RATIO = 0.3
+
+_ARRAY_FILE = re.compile(r'^(codes|scales|vectors)\.(\d+)\.bin$')
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS chunks ("
+    "row INTEGER PRIMARY KEY, chunk_id TEXT UNIQUE, user_document_id INTEGER, "
+    "text TEXT NOT NULL, metadata TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)",
+    "CREATE INDEX IF NOT EXISTS chunks_user_document ON chunks (user_document_id, deleted)",
+]
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization, returns (codes, scales) with vectors ~= codes * scales."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def _filter_document_ids(filter: Optional[Dict[str, Any]]) -> Optional[List[int]]:
+    """Reads the user_document_id filters built by retrievers.document_filter, the only kind supported."""
+    if not filter:
+        return None
+    if set(filter) != {'user_document_id'}:
+        raise ValueError(f"Unsupported filter {filter}, only user_document_id filters are supported.")
+
+    value = filter['user_document_id']
+    if isinstance(value, dict):
+        if set(value) != {'$in'}:
+            raise ValueError(f"Unsupported filter {filter}, only user_document_id filters are supported.")
+        return list(value['$in'])
+    return [value]
+
+
+class QuantizedVectorStore(VectorIndex):
+    """
+    Brute-force cosine search over int8 / float16 / float32 codes in memory-mapped files,
+    with exact float32 rescoring of the best candidates. Distances are 1 - cosine similarity.
+    With float32 codes it is a plain vectorized NumPy brute-force index.
+    """
+
+    def __init__(self, path: str, embedding_function: Embeddings, dtype: str = 'int8', rescore_factor: int = 4):
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {sorted(DTYPES)}, got '{dtype}'.")
+
+        self.path = path
+        self._embedding_function = embedding_function
+        self.dtype = dtype
+        self.rescore_factor = rescore_factor
+        self._lock = threading.Lock()
+        # Memory maps and tombstone mask for one (generation, rows, deleted) state of the files
+        self._snapshot = None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    # --- Storage ---
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _array_file(self, name: str, generation: int) -> str:
+        return self._file(f"{name}.{generation}.bin")
+
+    def _arrays(self) -> List[Tuple[str, Any, Optional[int]]]:
+        """(name, dtype, values per row, None for one per dimension) of the array files this dtype keeps."""
+        arrays = [('codes', DTYPES[self.dtype], None)]
+        if self.dtype == 'int8':
+            arrays.append(('scales', np.float32, 1))
+        if self._stores_full_vectors():
+            arrays.append(('vectors', np.float32, None))
+        return arrays
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self.path, exist_ok=True)
+        conn = sqlite3.connect(self._file('chunks.sqlite3'), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        return conn
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection) -> Dict[str, str]:
+        return dict(conn.execute("SELECT name, value FROM meta").fetchall())
+
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, **values) -> None:
+        conn.executemany(
+            "INSERT INTO meta (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+            [(name, str(value)) for name, value in values.items()]
+        )
+
+    def _stores_full_vectors(self) -> bool:
+        return self.dtype != 'float32'
+
+    def _append_arrays(self, generation: int, rows: int, dim: int, vectors: np.ndarray) -> None:
+        """Appends vectors after the first `rows` rows, cutting off anything an interrupted write left behind."""
+        if self.dtype == 'int8':
+            codes, scales = quantize_int8(vectors)
+            data = {'codes': codes, 'scales': scales}
+        else:
+            data = {'codes': vectors.astype(DTYPES[self.dtype])}
+        data['vectors'] = vectors
+
+        for name, dtype, width in self._arrays():
+            with open(self._array_file(name, generation), 'ab') as f:
+                f.truncate(rows * (width or dim) * np.dtype(dtype).itemsize)
+                f.write(np.ascontiguousarray(data[name]).tobytes())
+
+    def _read_vectors(self, generation: int, rows: int, dim: int, wanted: List[int]) -> np.ndarray:
+        """The stored float32 unit vectors of the given rows."""
+        name = 'vectors' if self._stores_full_vectors() else 'codes'
+        stored = np.memmap(self._array_file(name, generation), dtype=np.float32, mode='r', shape=(rows, dim))
+        return np.array(stored[wanted])
+
+    def _load_snapshot(self, conn: sqlite3.Connection):
+        meta = self._meta(conn)
+        key = (int(meta.get('generation', 0)), int(meta.get('rows', 0)), int(meta.get('deleted', 0)))
+
+        with self._lock:
+            if self._snapshot is not None and self._snapshot['key'] == key:
+                return self._snapshot
+
+            generation, rows, _ = key
+            snapshot = {'key': key, 'rows': rows, 'codes': None, 'scales': None, 'vectors': None, 'live': None}
+
+            if rows:
+                dim = int(meta['dim'])
+                # The files of the generation read above, a compaction committing meanwhile writes new ones
+                for name, dtype, width in self._arrays():
+                    shape = (rows,) if width == 1 else (rows, dim)
+                    snapshot[name] = np.memmap(self._array_file(name, generation), dtype=dtype, mode='r', shape=shape)
+                if not self._stores_full_vectors():
+                    snapshot['vectors'] = snapshot['codes']
+
+                live = np.ones(rows, dtype=bool)
+                dead = [row for (row,) in conn.execute("SELECT row FROM chunks WHERE deleted = 1 AND row < ?", (rows,))]
+                live[dead] = False
+                snapshot['live'] = live
+
+            # Plain ndarray views on the maps, slicing a np.memmap is much slower
+            for name in ('codes', 'scales', 'vectors'):
+                if snapshot[name] is not None:
+                    snapshot[name] = np.asarray(snapshot[name])
+
+            self._snapshot = snapshot
+            return snapshot
+
+    # --- Writes ---
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        self.upsert_vectors(ids, self._embedding_function.embed_documents(texts), texts, metadatas or [{} for _ in texts])
+        return ids
+
+    def upsert_vectors(self, ids: List[str], vectors: Sequence[Sequence[float]], texts: List[str], metadatas: List[dict]) -> None:
+        """
+        Replaces whatever is stored under the same ids. A chunk id that is already stored with the
+        same text and the same vector only gets its metadata refreshed, any other stored id is
+        tombstoned and its new vector appended.
+        """
+        vectors = _normalize(vectors)
+
+        # Last write wins for an id repeated within the call
+        latest = {chunk_id: index for index, chunk_id in enumerate(ids)}
+
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                meta = self._meta(conn)
+                rows = int(meta.get('rows', 0))
+                dim = vectors.shape[1] if len(vectors) else int(meta.get('dim', 0))
+
+                if meta.get('dtype', self.dtype) != self.dtype or int(meta.get('dim', dim)) != dim:
+                    raise ValueError(
+                        f"Store at {self.path} holds {meta['dtype']} vectors of dimension {meta['dim']}, "
+                        f"cannot add {self.dtype} vectors of dimension {dim}."
+                    )
+
+                stored = {}
+                chunk_ids = list(latest)
+                for start in range(0, len(chunk_ids), 500):
+                    batch = chunk_ids[start:start + 500]
+                    stored.update({
+                        chunk_id: (row, text) for chunk_id, row, text in conn.execute(
+                            f"SELECT chunk_id, row, text FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                        )
+                    })
+
+                same_text = [chunk_id for chunk_id, index in latest.items() if chunk_id in stored and stored[chunk_id][1] == texts[index]]
+                unchanged = set()
+                if same_text:
+                    # Same text but another embedding model (or runtime) must still replace the vector
+                    stored_vectors = self._read_vectors(int(meta.get('generation', 0)), rows, dim, [stored[chunk_id][0] for chunk_id in same_text])
+                    unchanged = {
+                        chunk_id for chunk_id, stored_vector in zip(same_text, stored_vectors)
+                        if np.array_equal(stored_vector, vectors[latest[chunk_id]])
+                    }
+
+                conn.executemany(
+                    "UPDATE chunks SET metadata = ?, user_document_id = ? WHERE chunk_id = ?",
+                    [
+                        (json.dumps(metadatas[latest[chunk_id]]), metadatas[latest[chunk_id]].get('user_document_id'), chunk_id)
+                        for chunk_id in unchanged
+                    ]
+                )
+
+                new = [index for chunk_id, index in latest.items() if chunk_id not in unchanged]
+                replaced = [(chunk_id,) for chunk_id in latest if chunk_id in stored and chunk_id not in unchanged]
+                conn.executemany("UPDATE chunks SET deleted = 1, chunk_id = NULL WHERE chunk_id = ?", replaced)
+
+                if new:
+                    self._append_arrays(int(meta.get('generation', 0)), rows, dim, vectors[new])
+                    conn.executemany(
+                        "INSERT INTO chunks (row, chunk_id, user_document_id, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                        [
+                            (rows + offset, ids[index], metadatas[index].get('user_document_id'), texts[index], json.dumps(metadatas[index]))
+                            for offset, index in enumerate(new)
+                        ]
+                    )
+
+                self._set_meta(
+                    conn, dtype=self.dtype, dim=dim, rows=rows + len(new),
+                    deleted=int(meta.get('deleted', 0)) + len(replaced), generation=meta.get('generation', 0)
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        self._maybe_compact()
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        self._tombstone("chunk_id IN ({})".format(','.join('?' * len(ids))), list(ids))
+        return True
+
+    def delete_document(self, user_document_id: int, keep: Set[str] = frozenset()) -> int:
+        """
+        Deletes every vector of a user document, except the chunk ids in `keep`.
+        Returns how many vectors were removed.
+        """
+        if not os.path.exists(self._file('chunks.sqlite3')):
+            return 0
+
+        with closing(self._connect()) as conn:
+            existing = conn.execute(
+                "SELECT chunk_id FROM chunks WHERE user_document_id = ? AND deleted = 0", (user_document_id,)
+            ).fetchall()
+        stale = [chunk_id for (chunk_id,) in existing if chunk_id not in keep]
+
+        for start in range(0, len(stale), 500):
+            self.delete(stale[start:start + 500])
+        return len(stale)
+
+    def delete_untagged(self) -> int:
+        if not os.path.exists(self._file('chunks.sqlite3')):
+            return 0
+        return self._tombstone("user_document_id IS NULL", [])
+
+    def clear(self) -> None:
+        if os.path.exists(self._file('chunks.sqlite3')):
+            self._tombstone("1 = 1", [])
+
+    def _tombstone(self, where: str, params: List[Any]) -> int:
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = conn.execute(
+                    f"UPDATE chunks SET deleted = 1, chunk_id = NULL WHERE deleted = 0 AND {where}", params
+                ).rowcount
+                meta = self._meta(conn)
+                self._set_meta(conn, deleted=int(meta.get('deleted', 0)) + removed)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        self._maybe_compact()
+        return removed
+
+    def _maybe_compact(self) -> None:
+        with closing(self._connect()) as conn:
+            meta = self._meta(conn)
+        rows, deleted = int(meta.get('rows', 0)), int(meta.get('deleted', 0))
+        if deleted and deleted >= rows * COMPACT_DEAD_RATIO:
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Writes the live rows to the next generation's files and commits that generation. The current
+        files are left untouched: readers that read the old generation keep mapping them, and they
+        are removed by the next compaction, once no reader can still be about to open them.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                meta = self._meta(conn)
+                rows = int(meta.get('rows', 0))
+                generation = int(meta.get('generation', 0))
+                live_rows = [row for (row,) in conn.execute("SELECT row FROM chunks WHERE deleted = 0 ORDER BY row")]
+
+                if rows:
+                    dim = int(meta['dim'])
+                    for name, dtype, width in self._arrays():
+                        shape = (rows,) if width == 1 else (rows, dim)
+                        old = np.memmap(self._array_file(name, generation), dtype=dtype, mode='r', shape=shape)
+                        # A new name, nothing maps it until the generation is committed
+                        with open(self._array_file(name, generation + 1), 'wb') as f:
+                            for start in range(0, len(live_rows), SCAN_BLOCK_ROWS):
+                                f.write(np.ascontiguousarray(old[live_rows[start:start + SCAN_BLOCK_ROWS]]).tobytes())
+                        del old
+
+                conn.execute("DELETE FROM chunks WHERE deleted = 1")
+                # Ascending order never collides: the i-th live row moves to row i <= its old row
+                conn.executemany("UPDATE chunks SET row = ? WHERE row = ?", list(enumerate(live_rows)))
+                self._set_meta(conn, rows=len(live_rows), deleted=0, generation=generation + 1)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        self._remove_generations_before(generation)
+
+    def _remove_generations_before(self, generation: int) -> None:
+        """Deletes array files older than `generation`, the one just replaced is kept for its readers."""
+        for name in os.listdir(self.path):
+            match = _ARRAY_FILE.match(name)
+            if match and int(match.group(2)) < generation:
+                try:
+                    os.remove(self._file(name))
+                except OSError:
+                    # Still mapped on a platform that doesn't allow that (Windows), retried next time
+                    pass
+
+    # --- Search ---
+
+    def _scores(self, snapshot, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Approximate cosine similarity of every candidate row (all rows if None) to every query."""
+        codes, scales = snapshot['codes'], snapshot['scales']
+        count = snapshot['rows'] if rows is None else len(rows)
+        scores = np.empty((count, len(queries)), dtype=np.float32)
+
+        for start in range(0, count, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, count)
+            block_rows = slice(start, end) if rows is None else rows[start:end]
+
+            block = np.asarray(codes[block_rows], dtype=np.float32) @ queries.T
+            if scales is not None:
+                block *= np.asarray(scales[block_rows])[:, None]
+            scores[start:end] = block
+
+        return scores
+
+    def search_by_vectors(self, embeddings: Sequence[Sequence[float]], k: int, filter: Optional[Dict[str, Any]] = None) -> List[List[Tuple[Document, float]]]:
+        queries = _normalize(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        document_ids = _filter_document_ids(filter)
+
+        if not os.path.exists(self._file('chunks.sqlite3')):
+            return [[] for _ in queries]
+
+        with closing(self._connect()) as conn:
+            # One read transaction: rows, files and texts all belong to the same generation
+            conn.execute("BEGIN")
+            snapshot = self._load_snapshot(conn)
+
+            if not snapshot['rows']:
+                conn.execute("COMMIT")
+                return [[] for _ in queries]
+
+            if document_ids is None:
+                rows = None
+                live = snapshot['live']
+            else:
+                rows = np.array(sorted(
+                    row for (row,) in conn.execute(
+                        f"SELECT row FROM chunks WHERE deleted = 0 AND row < ? AND user_document_id IN ({','.join('?' * len(document_ids))})",
+                        [snapshot['rows'], *document_ids]
+                    )
+                ), dtype=np.int64)
+                live = np.ones(len(rows), dtype=bool)
+
+            scores = self._scores(snapshot, queries, rows)
+            scores[~live] = -np.inf
+
+            results = []
+            needed = set()
+            candidates_needed = min(k * self.rescore_factor, int(live.sum()))
+            for column, query in enumerate(queries):
+                if candidates_needed == 0:
+                    results.append([])
+                    continue
+
+                candidates = np.argpartition(-scores[:, column], candidates_needed - 1)[:candidates_needed]
+                candidate_rows = candidates if rows is None else rows[candidates]
+
+                # Exact rescoring of the short list against the float32 vectors
+                candidate_rows = np.sort(candidate_rows)
+                exact = np.asarray(snapshot['vectors'][candidate_rows], dtype=np.float32) @ query
+                best = np.argsort(-exact)[:k]
+
+                hits = [(int(candidate_rows[index]), 1.0 - float(exact[index])) for index in best]
+                needed.update(row for row, _ in hits)
+                results.append(hits)
+
+            chunks = {}
+            needed = list(needed)
+            for start in range(0, len(needed), 500):
+                batch = needed[start:start + 500]
+                for row, chunk_id, text, metadata in conn.execute(
+                    f"SELECT row, chunk_id, text, metadata FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch
+                ):
+                    chunks[row] = Document(page_content=text, metadata=json.loads(metadata), id=chunk_id)
+            conn.execute("COMMIT")
+
+        return [[(chunks[row], distance) for row, distance in hits] for hits in results]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.search_by_vectors([embedding], k, filter)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return self._cosine_relevance_score_fn
+
+    def __len__(self) -> int:
+        if not os.path.exists(self._file('chunks.sqlite3')):
+            return 0
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM chunks WHERE deleted = 0").fetchone()[0]
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, *, path: str, dtype: str = 'int8', ids: Optional[List[str]] = None, **kwargs: Any) -> 'QuantizedVectorStore':
+        store = cls(path, embedding, dtype=dtype, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
@@ -1,165 +1,611 @@
-import os
+import asyncio
+import logging
+from asgiref.sync import sync_to_async
+from celery.exceptions import SoftTimeLimitExceeded
 from django.conf import settings
-from typing import Dict, Any, List
+from django.core.cache import cache
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 
 from langchain_groq import ChatGroq
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.retrievers.multi_query import MultiQueryRetriever
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStoreRetriever
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
 from chatbot.models import ChatMessage, ChatSession
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.utils.json import parse_json_markdown
+from chatbot.services.model_registry import embedding_namespace, get_embedding_model
+from chatbot.services.vector_store_pool import VectorStorePool
+from chatbot.services.llm_budget import LLMCallBudget
+from chatbot.services.answer_cache import AnswerCache
+from chatbot.services.context_packing import ContextPacker
+from chatbot.services.embedding_cache import CachedEmbeddings
+from chatbot.services.keyword_index import KeywordIndex
+from chatbot.services.retrievers import BatchedMultiQueryRetriever, HybridRetriever, document_filter
+from chatbot.services.tracing import set_route, stage, trace_request
+from chatbot.tasks import summary_pending_key, update_session_summary
+
+logger = logging.getLogger(__name__)
 
-CHROMA_PATH = os.path.join(settings.BASE_DIR, 'chroma_db')
 
 class ChatBot:
 
-    def __init__(self):
+    def __init__(self, vector_store_pool: VectorStorePool, llm: BaseChatModel = None):
 
-        self.llm = ChatGroq(
+        self.llm = llm or ChatGroq(
             model="llama3-70b-8192", temperature=0.4
         )
 
-        self.embedding_model = HuggingFaceEmbeddings(
-            model_name="all-MiniLM-L6-v2"
+        self.embedding_model = get_embedding_model()
+
+        # Open per-user collections, shared with the ChatbotService singleton
+        self.vector_store_pool = vector_store_pool
+
+        self.answer_cache = AnswerCache(
+            similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+            ttl=settings.ANSWER_CACHE_TTL_SECONDS,
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES
+        ) if settings.ANSWER_CACHE_ENABLED else None
+
+        # Dedupes, diversifies and trims retrieved chunks before they go into a prompt.
+        # Chunk vectors are read from the ingestion embedding cache instead of being recomputed,
+        # the query path never writes to it.
+        self.context_packer = ContextPacker(
+            embeddings=CachedEmbeddings(self.embedding_model, namespace=embedding_namespace(), read_only=True),
+            estimated_token_budget=settings.CONTEXT_ESTIMATED_TOKEN_BUDGET,
+            duplicate_similarity=settings.CONTEXT_DUPLICATE_SIMILARITY,
+            mmr_lambda=settings.CONTEXT_MMR_LAMBDA
         )
 
-        self.vector_db = Chroma(
-            persist_directory=CHROMA_PATH,
-            embedding_function=self.embedding_model
+        # Prompts and chains don't depend on the user, so they are built once here.
+        # Only the retriever is per-user, it is passed in as part of the chain input by 'ask'.
+        self._build_chains()
+
+    def _build_chains(self) -> None:
+
+        multi_query_prompt = ChatPromptTemplate.from_messages([
+            ("system", "You are an AI language model assistant. Your task is to generate five different versions of the given user question to retrieve relevant documents from a vector database. Provide these alternative questions separated by newlines."),
+            ("human", "{question}")
+        ])
+
+        self.generate_queries_chain = (
+            multi_query_prompt | self.llm | StrOutputParser() | (lambda x: x.split("\n"))
+        ).with_config(run_name="generate_queries")
+
+        router_prompt = ChatPromptTemplate.from_template(
+            """You are an expert at routing a user's question. 
+        Given the user's question, classify it as either "RAG" or "General".
+        - Choose "RAG" if the retrieved documents seem relevant to the question.
+        - Choose "General" if the retrieved documents are not relevant to the question, or if the question is a greeting or general chit-chat.
+        Return only the single word "RAG" or "General".
+            Retrieved Documents:
+            \n{context}\n\nQuestion: {question}\nClassification:"""
         )
 
-        # chain and retriever will be created dynamically inside the 'ask' method.
+        self.router_chain = (router_prompt | self.llm | StrOutputParser()).with_config(run_name="route_question")
+
+        condense_question_prompt = ChatPromptTemplate.from_messages([
+            ("system", "Given a chat history and a follow up question, rephrase the follow up question to be a standalone question."),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("human", "{input}")
+        ])
+
+        self.condense_question_chain = (
+            condense_question_prompt | self.llm | StrOutputParser()
+        ).with_config(run_name="condense_question")
+
+        qa_prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are an expert AI assistant. Your task is to answer the user's question based ONLY on the provided context. 
+            Read all the context snippets carefully, combine information from them if necessary, and formulate a single, coherent response.
+            If the context does not contain the answer, state that you do not have enough information. Do not use any outside knowledge. 
+             Context:\n{context}"""),
+            ("human", "{input}")
+        ])
+
+        self.question_answer_chain = create_stuff_documents_chain(self.llm, qa_prompt)
+
+        # Same retrieval step create_history_aware_retriever builds, except the retriever is read
+        # from the input instead of being baked into the chain. The answer step runs separately
+        # so it can be either invoked or streamed.
+        self.history_aware_retrieval = RunnableLambda(self._retrieve_with_history).with_config(
+            run_name="retrieve_documents"
+        )
+
+        # Fast pipeline: one call that both routes the question and makes it standalone
+        route_and_condense_prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are an expert at routing a user's question and rewriting follow up questions.
+            Reply with a JSON object with exactly two keys:
+            - "route": "RAG" if the retrieved documents seem relevant to the latest question, otherwise "General" (also for greetings or general chit-chat).
+            - "standalone_question": the latest question rephrased so it can be understood without the chat history.
+            Return only the JSON object.
+            Retrieved Documents:\n{context}"""),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("human", "{input}")
+        ])
+
+        self.route_and_condense_chain = (
+            route_and_condense_prompt | self.llm | StrOutputParser()
+        ).with_config(run_name="route_and_condense")
+
+        general_prompt = ChatPromptTemplate.from_messages([
+            ("system", "You are a helpful assistant. Answer the following question."),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("human", "{input}")
+        ])
+
+        self.general_chain = (general_prompt | self.llm | StrOutputParser()).with_config(run_name="general_answer")
+
+    def _retrieve_with_history(self, inputs: Dict[str, Any], config: RunnableConfig = None) -> List[Document]:
+        """
+        Rephrases follow-up questions into standalone ones before searching, like create_history_aware_retriever.
+        """
+        query = inputs["input"]
+        if inputs.get("chat_history"):
+            query = self.condense_question_chain.invoke(inputs, config)
+
+        return inputs["retriever"].invoke(query, config)
+
+    def get_base_retriever(self, user_id: int, document_ids: Optional[Tuple[int, ...]] = None) -> VectorStoreRetriever:
+        """
+        Plain similarity retriever over the user's own collection, limited to `document_ids` if given.
+        """
+        # Reuses the user's open collection handle, reopened only after new ingestion
+        user_vector_db = self.vector_store_pool.get(user_id)
+
+        search_kwargs = {'k': 5}
+        # The selection is applied inside the vector search, not on its results
+        if document_ids:
+            search_kwargs['filter'] = document_filter(document_ids)
+
+        return user_vector_db.as_retriever(search_kwargs=search_kwargs)
+
+    def get_retriever(self, user_id: int, document_ids: Optional[Tuple[int, ...]] = None) -> BaseRetriever:
+        """
+        Multi-query retriever over the user's own collection, the only per-user part of the pipeline.
+        """
+        return self._get_retrievers(user_id, document_ids)[1]
+
+    def _expand_queries(self, base_retriever: VectorStoreRetriever) -> BaseRetriever:
+        # All query variants are embedded in one batch and searched in one multi-vector query
+        return BatchedMultiQueryRetriever(
+            retriever=base_retriever,
+            llm_chain=self.generate_queries_chain,
+            include_original=True
+        )
 
-    def ask(self, question: str, session: ChatSession) -> Dict[str, Any]:
+    def _with_keywords(self, retriever: BaseRetriever, user_id: int, k: int, document_ids: Optional[Tuple[int, ...]]) -> BaseRetriever:
+        """
+        Fuses a dense retriever with the user's BM25 keyword index, so exact identifiers are found too.
+        """
+        if not settings.HYBRID_SEARCH_ENABLED:
+            return retriever
+
+        return HybridRetriever(
+            retriever=retriever,
+            keyword_index=KeywordIndex.for_user(user_id),
+            k=k,
+            document_ids=list(document_ids) if document_ids else None,
+            rrf_k=settings.HYBRID_RRF_K
+        )
 
-        # Save the user's message to the database first.
-        ChatMessage.objects.create(session=session, message=question, is_from_ai=False)
+    def ask(self, question: str, session: ChatSession, document_ids: Optional[List[int]] = None, request_id: Optional[str] = None, save_question: bool = True) -> Dict[str, Any]:
+        """
+        Answers a question in a session. `document_ids` limits retrieval to those user documents,
+        if it is None the session's pinned documents are used (no pins: all documents).
+        The request is traced under `request_id` (a new id if None), which is saved on both messages.
+        `save_question=False` when the caller already saved the user's message (the celery answer task).
+        """
+        with trace_request(request_id, 'ask', settings.CHAT_PIPELINE_MODE) as trace:
+
+            # Save the user's message to the database first.
+            if save_question:
+                ChatMessage.objects.create(session=session, message=question, is_from_ai=False, request_id=trace.request_id)
+
+            try:
+                document_ids = self._document_scope(session, document_ids)
+
+                # --- Step 1: Build Chat History from the Database ---
+                chat_history = self._load_chat_history(session)
+
+                # --- Step 2: Reuse the answer to a near-identical question if we have one ---
+                question_embedding, cached = self._lookup_cached_answer(question, session.user_id, chat_history, document_ids)
+
+                if cached:
+                    set_route('cache')
+                    answer, sources = cached['answer'], cached['sources']
 
-        try:
-            # --- Step 1: Create a User-Specific Retriever This is created dynamically for each request. ---
-
-            user_collection_name = f"user_{session.user.id}"
-
-            # Create user-specific vector DB instance
-            user_vector_db = Chroma(
-                persist_directory=CHROMA_PATH,
-                embedding_function=self.embedding_model,
-                collection_name=user_collection_name
-            )
-
-            base_retriever = user_vector_db.as_retriever(search_kwargs={'k': 5})
-
-            # user_collection_name = f"user_{session.user.id}"
-            
-            # base_retriever = self.vector_db.as_retriever(
-            #     search_kwargs={'k': 5},
-            #     # This ensures we only search this user's documents
-            #     collection_name=user_collection_name
-            # )
-            
-            multi_query_prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are an AI language model assistant. Your task is to generate five different versions of the given user question to retrieve relevant documents from a vector database. Provide these alternative questions separated by newlines."),
-                ("human", "{question}")
-            ])
-
-            generate_queries_chain = (
-                multi_query_prompt | self.llm | StrOutputParser() | (lambda x: x.split("\n"))
-            )
-
-            retriever = MultiQueryRetriever(
-                retriever=base_retriever,
-                llm_chain=generate_queries_chain,
-                include_original=True
-            )
-
-            # --- Step 2: Build Chat History from the Database ---
-            recent_messages = session.messages.order_by('timestamp').all()
-            chat_history = []
-
-            for msg in recent_messages:
-                if msg.is_from_ai:
-                    chat_history.append(AIMessage(content=msg.message))
                 else:
-                    chat_history.append(HumanMessage(content=msg.message))
-            
-            # --- Step 3: Route the question ---
-            retrieved_docs = retriever.invoke(question)
-            context_for_router = "\n\n".join([doc.page_content for doc in retrieved_docs])
-            
-            router_prompt = ChatPromptTemplate.from_template(
-                """You are an expert at routing a user's question. 
-            Given the user's question, classify it as either "RAG" or "General".
-            - Choose "RAG" if the retrieved documents seem relevant to the question.
-            - Choose "General" if the retrieved documents are not relevant to the question, or if the question is a greeting or general chit-chat.
-            Return only the single word "RAG" or "General".
-                Retrieved Documents:
-                \n{context}\n\nQuestion: {question}\nClassification:"""
-            )
-
-            router_chain = router_prompt | self.llm | StrOutputParser()
-            topic = router_chain.invoke({"context": context_for_router, "question": question})
-
-            # --- Step 4: Execute the Correct Chain ---
-            if "RAG" in topic:
-                print("--> Routing to Document-Specific RAG Chain...")
-                
-                condense_question_prompt = ChatPromptTemplate.from_messages([
-                    ("system", "Given a chat history and a follow up question, rephrase the follow up question to be a standalone question."),
-                    MessagesPlaceholder(variable_name="chat_history"),
-                    ("human", "{input}")
-                ])
-
-                history_aware_retriever = create_history_aware_retriever(
-                    self.llm, retriever, condense_question_prompt
-                )
-                
-                qa_prompt = ChatPromptTemplate.from_messages([
-                    ("system", """You are an expert AI assistant. Your task is to answer the user's question based ONLY on the provided context. 
-                    Read all the context snippets carefully, combine information from them if necessary, and formulate a single, coherent response.
-                    If the context does not contain the answer, state that you do not have enough information. Do not use any outside knowledge. 
-                     Context:\n{context}"""),
-                    ("human", "{input}")
-                ])
-
-                question_answer_chain = create_stuff_documents_chain(self.llm, qa_prompt)
-                
-                rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
-
-                response = rag_chain.invoke({"chat_history": chat_history, "input": question})
-
-                answer = response.get("answer", "No answer found.")
-                sources = [doc.metadata.get('source', 'Unknown') for doc in response.get('context', [])]
+                    # --- Step 3: Retrieve and route with the configured pipeline ---
+                    answer_chain, answer_inputs, sources = self._prepare_answer(question, chat_history, session.user_id, document_ids)
 
-            else:
-                print("--> Routing to General Knowledge Chain...")
-                
-                prompt = ChatPromptTemplate.from_messages([
-                    ("system", "You are a helpful assistant. Answer the following question."),
-                    MessagesPlaceholder(variable_name="chat_history"),
-                    ("human", "{input}")
-                ])
+                    # --- Step 4: Generate the answer ---
+                    answer = answer_chain.invoke(answer_inputs)
+
+                    self._cache_answer(session.user_id, question, question_embedding, answer, sources, document_ids)
+
+                # Save the AI's response to the database
+                ai_message = ChatMessage.objects.create(session=session, message=answer, is_from_ai=True, request_id=trace.request_id)
+
+                self._schedule_summary_update(session)
+
+                return {'answer': answer, 'sources': sources, 'request_id': trace.request_id, 'message_id': ai_message.id}
+
+            except SoftTimeLimitExceeded:
+                # The generate_answer task's time limit, it reports the failure on the answer job
+                trace.error = True
+                raise
+
+            except Exception:
+                trace.error = True
+
+                logger.exception("An exception occurred in the 'ask' method")
+
+                return {'answer': "I'm sorry, an internal error occurred.", 'sources': [], 'request_id': trace.request_id}
+
+    async def aask(self, question: str, session: ChatSession, document_ids: Optional[List[int]] = None, request_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Async version of 'ask'. LLM calls go through ainvoke, so the event loop serves other
+        chats while Groq is generating, and independent stages run concurrently.
+        """
+        with trace_request(request_id, 'ask', settings.CHAT_PIPELINE_MODE) as trace:
 
-                general_chain = prompt | self.llm | StrOutputParser()
-                answer = general_chain.invoke({"chat_history": chat_history, "input": question})
-                sources = []
+            await ChatMessage.objects.acreate(session=session, message=question, is_from_ai=False, request_id=trace.request_id)
 
-            # Save the AI's response to the database
-            ChatMessage.objects.create(session=session, message=answer, is_from_ai=True)
+            try:
+                document_ids = await sync_to_async(self._document_scope)(session, document_ids)
 
-            return {'answer': answer, 'sources': sources}
+                chat_history = await sync_to_async(self._load_chat_history)(session)
 
-        except Exception as e:
+                question_embedding, cached = await sync_to_async(
+                    self._lookup_cached_answer, thread_sensitive=False
+                )(question, session.user_id, chat_history, document_ids)
 
-            print(f"An exception occurred in the 'ask' method: {e}")
+                if cached:
+                    set_route('cache')
+                    answer, sources = cached['answer'], cached['sources']
 
-            import traceback
-            traceback.print_exc()
+                else:
+                    answer_chain, answer_inputs, sources = await self._aprepare_answer(question, chat_history, session.user_id, document_ids)
+
+                    answer = await answer_chain.ainvoke(answer_inputs)
+
+                    await sync_to_async(self._cache_answer, thread_sensitive=False)(
+                        session.user_id, question, question_embedding, answer, sources, document_ids
+                    )
+
+                ai_message = await ChatMessage.objects.acreate(session=session, message=answer, is_from_ai=True, request_id=trace.request_id)
+
+                await sync_to_async(self._schedule_summary_update)(session)
+
+                return {'answer': answer, 'sources': sources, 'request_id': trace.request_id, 'message_id': ai_message.id}
+
+            except Exception:
+                trace.error = True
+
+                logger.exception("An exception occurred in the 'aask' method")
+
+                return {'answer': "I'm sorry, an internal error occurred.", 'sources': [], 'request_id': trace.request_id}
+
+    async def astream(self, question: str, session: ChatSession, document_ids: Optional[List[int]] = None, request_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Same pipeline as 'ask', but yields the answer token by token as {'event': 'token', 'data': ...}
+        dicts. Once the answer is complete it is saved and a final 'sources' event is yielded.
+        """
+        with trace_request(request_id, 'stream', settings.CHAT_PIPELINE_MODE) as trace:
+
+            await ChatMessage.objects.acreate(session=session, message=question, is_from_ai=False, request_id=trace.request_id)
 
-            return {'answer': "I'm sorry, an internal error occurred.", 'sources': []}
+            try:
+                document_ids = await sync_to_async(self._document_scope)(session, document_ids)
+
+                chat_history = await sync_to_async(self._load_chat_history)(session)
+
+                question_embedding, cached = await sync_to_async(
+                    self._lookup_cached_answer, thread_sensitive=False
+                )(question, session.user_id, chat_history, document_ids)
+
+                if cached:
+                    set_route('cache')
+                    answer, sources = cached['answer'], cached['sources']
+                    yield {'event': 'token', 'data': answer}
+
+                else:
+                    answer_chain, answer_inputs, sources = await self._aprepare_answer(question, chat_history, session.user_id, document_ids)
+
+                    tokens = []
+                    async for token in answer_chain.astream(answer_inputs):
+                        tokens.append(token)
+                        yield {'event': 'token', 'data': token}
+
+                    answer = "".join(tokens)
+
+                    await sync_to_async(self._cache_answer, thread_sensitive=False)(
+                        session.user_id, question, question_embedding, answer, sources, document_ids
+                    )
+
+            except Exception:
+                trace.error = True
+
+                logger.exception("An exception occurred in the 'astream' method")
+
+                yield {'event': 'error', 'data': "I'm sorry, an internal error occurred."}
+                return
+
+            # Save the AI's response to the database once the stream is complete
+            ai_message = await ChatMessage.objects.acreate(session=session, message=answer, is_from_ai=True, request_id=trace.request_id)
+
+            await sync_to_async(self._schedule_summary_update)(session)
+
+            yield {'event': 'sources', 'data': {'message_id': ai_message.id, 'request_id': trace.request_id, 'sources': sources}}
+
+    def _document_scope(self, session: ChatSession, document_ids: Optional[List[int]]) -> Optional[Tuple[int, ...]]:
+        """
+        The documents to search: the message's own selection, else the session's pinned documents.
+        None means the whole collection.
+        """
+        if document_ids is None:
+            document_ids = session.pinned_documents.values_list('id', flat=True)
+
+        return tuple(sorted(document_ids)) or None
+
+    def _lookup_cached_answer(self, question: str, user_id: int, chat_history: List[BaseMessage], document_ids: Optional[Tuple[int, ...]] = None) -> Tuple[Optional[List[float]], Optional[Dict[str, Any]]]:
+        """
+        Embeds the question and looks it up in the user's answer cache, returns (embedding, hit or None).
+        Follow-ups skip the cache both ways (embedding None, so the answer isn't stored either): they
+        are condensed against the conversation, so the same words can ask something else in another session.
+        """
+        # The history ends with the question being answered, it is saved before the history is loaded
+        if self.answer_cache is None or len(chat_history) > 1:
+            return None, None
+
+        with stage('answer_cache_lookup'):
+            question_embedding = self.embedding_model.embed_query(question)
+            cached = self.answer_cache.lookup(user_id, question_embedding, document_ids)
+
+        if cached:
+            logger.debug("Answer cache hit (similarity %.3f)", cached['similarity'])
+
+        return question_embedding, cached
+
+    def _cache_answer(self, user_id: int, question: str, question_embedding: Optional[List[float]], answer: str, sources: List[str], document_ids: Optional[Tuple[int, ...]] = None) -> None:
+        # Only document-grounded answers to questions without earlier turns are reusable
+        if self.answer_cache is not None and question_embedding is not None and sources:
+            with stage('answer_cache_store'):
+                self.answer_cache.store(user_id, question, question_embedding, answer, sources, document_ids)
+
+    def _prepare_answer(self, question: str, chat_history: List[BaseMessage], user_id: int, document_ids: Optional[Tuple[int, ...]] = None) -> Tuple[Runnable, Dict[str, Any], List[str]]:
+        """
+        Runs everything before the answer call and returns the answer chain, its inputs and the sources.
+        """
+        if settings.CHAT_PIPELINE_MODE == 'fast':
+            return self._prepare_fast(question, chat_history, user_id, document_ids)
+
+        return self._prepare_standard(question, chat_history, user_id, document_ids)
+
+    def _load_chat_history(self, session: ChatSession) -> List[BaseMessage]:
+        """
+        Every message the session's rolling summary doesn't cover yet, verbatim, plus the summary,
+        so the DB read and the prompt size stay flat however long the session gets.
+        That is the window plus the messages waiting for the next summary run, capped at a batch more
+        than the window so a lagging or failing summary task can't grow the prompt without limit.
+        """
+        limit = settings.CHAT_HISTORY_WINDOW_TURNS * 2 + settings.CHAT_HISTORY_SUMMARY_BATCH
+        with stage('chat_history'):
+            unsummarized = min(session.messages.count() - session.summary_message_count, limit)
+            recent_messages = list(reversed(session.messages.order_by('-timestamp', '-id')[:max(unsummarized, 0)]))
+        chat_history = []
+
+        if session.summary:
+            chat_history.append(SystemMessage(content=f"Summary of the earlier conversation:\n{session.summary}"))
+
+        for msg in recent_messages:
+            if msg.is_from_ai:
+                chat_history.append(AIMessage(content=msg.message))
+            else:
+                chat_history.append(HumanMessage(content=msg.message))
+
+        return chat_history
+
+    def _schedule_summary_update(self, session: ChatSession) -> None:
+        """
+        Queues a summary update once enough messages have scrolled out of the history window,
+        unless one is already queued or running for the session.
+        """
+        window = settings.CHAT_HISTORY_WINDOW_TURNS * 2
+        unsummarized = session.messages.count() - window - session.summary_message_count
+
+        # add() is atomic, only one request gets to queue the run; the task clears the flag when it ends
+        if unsummarized >= settings.CHAT_HISTORY_SUMMARY_BATCH and cache.add(
+            summary_pending_key(session.id), True, timeout=settings.CHAT_HISTORY_SUMMARY_PENDING_SECONDS
+        ):
+            update_session_summary.delay(session.id)
+
+    def _prepare_standard(self, question: str, chat_history: List[BaseMessage], user_id: int, document_ids: Optional[Tuple[int, ...]] = None) -> Tuple[Runnable, Dict[str, Any], List[str]]:
+        """
+        Full pipeline: multi-query retrieval, router, history-aware retrieval and answer.
+        """
+        # --- Get the User-Specific Retriever ---
+        retriever = self.get_retriever(user_id, document_ids)
+
+        # --- Route the question ---
+        retrieved_docs = self._pack_context(question, retriever.invoke(question))
+        context_for_router = "\n\n".join([doc.page_content for doc in retrieved_docs])
+
+        topic = self.router_chain.invoke({"context": context_for_router, "question": question})
+
+        # --- Pick the Correct Chain ---
+        if "RAG" in topic:
+            logger.debug("Routing to Document-Specific RAG Chain...")
+
+            context = self.history_aware_retrieval.invoke({"chat_history": chat_history, "input": question, "retriever": retriever})
+            context = self._pack_context(question, context)
+            sources = [doc.metadata.get('source', 'Unknown') for doc in context]
+
+            set_route('rag')
+            return self.question_answer_chain, {"context": context, "input": question}, sources
+
+        logger.debug("Routing to General Knowledge Chain...")
+
+        set_route('general')
+        return self.general_chain, {"chat_history": chat_history, "input": question}, []
+
+    def _prepare_fast(self, question: str, chat_history: List[BaseMessage], user_id: int, document_ids: Optional[Tuple[int, ...]] = None) -> Tuple[Runnable, Dict[str, Any], List[str]]:
+        """
+        Low-latency pipeline: routing and question condensation share a single LLM call, and the
+        documents retrieved for routing are reused for the answer instead of being fetched again.
+        Never makes more than settings.CHAT_LLM_CALL_BUDGET LLM calls.
+        """
+        budget = LLMCallBudget(settings.CHAT_LLM_CALL_BUDGET)
+
+        # --- Retrieve once, with query expansion only if the budget leaves room for it ---
+        base_retriever, retriever = self._get_retrievers(user_id, document_ids)
+        if budget.remaining >= 3:
+            budget.spend()
+        else:
+            retriever = base_retriever
+
+        retrieved_docs = self._pack_context(question, retriever.invoke(question))
+
+        # --- Route and condense in one call (skipped with a budget of 1, which always answers from the documents) ---
+        route, standalone_question = "RAG", question
+        if budget.remaining >= 2:
+            budget.spend()
+            raw_route = self.route_and_condense_chain.invoke({
+                "context": "\n\n".join([doc.page_content for doc in retrieved_docs]),
+                "chat_history": chat_history,
+                "input": question
+            })
+            route, standalone_question = self._parse_route(raw_route, question)
+
+        # --- Reserve the answer call ---
+        budget.spend()
+        if route == "RAG":
+            logger.debug("Fast path: answering from retrieved documents...")
+
+            sources = [doc.metadata.get('source', 'Unknown') for doc in retrieved_docs]
+            set_route('rag')
+            return self.question_answer_chain, {"context": retrieved_docs, "input": standalone_question}, sources
+
+        logger.debug("Fast path: answering from general knowledge...")
+
+        set_route('general')
+        return self.general_chain, {"chat_history": chat_history, "input": question}, []
+
+    async def _aprepare_answer(self, question: str, chat_history: List[BaseMessage], user_id: int, document_ids: Optional[Tuple[int, ...]] = None) -> Tuple[Runnable, Dict[str, Any], List[str]]:
+        """
+        Async version of '_prepare_answer'.
+        """
+        # Getting the retrievers may open the user's collection, keep that off the event loop
+        # (and off the shared sync thread, it doesn't touch the database)
+        retrievers = await sync_to_async(self._get_retrievers, thread_sensitive=False)(user_id, document_ids)
+
+        if settings.CHAT_PIPELINE_MODE == 'fast':
+            return await self._aprepare_fast(question, chat_history, *retrievers)
+
+        return await self._aprepare_standard(question, chat_history, retrievers[1])
+
+    def _get_retrievers(self, user_id: int, document_ids: Optional[Tuple[int, ...]] = None) -> Tuple[BaseRetriever, BaseRetriever]:
+        """
+        The single-query and the multi-query retriever, both hybrid (dense + keyword) when enabled.
+        """
+        base_retriever = self.get_base_retriever(user_id, document_ids)
+        k = base_retriever.search_kwargs['k']
+
+        return (
+            self._with_keywords(base_retriever, user_id, k, document_ids),
+            self._with_keywords(self._expand_queries(base_retriever), user_id, k, document_ids)
+        )
+
+    async def _aprepare_standard(self, question: str, chat_history: List[BaseMessage], retriever: BaseRetriever) -> Tuple[Runnable, Dict[str, Any], List[str]]:
+        """
+        Async standard pipeline. The standalone question is condensed while retrieval and
+        routing run, instead of after them.
+        """
+        async def route() -> str:
+            retrieved_docs = await self._apack_context(question, await retriever.ainvoke(question))
+            context_for_router = "\n\n".join([doc.page_content for doc in retrieved_docs])
+            return await self.router_chain.ainvoke({"context": context_for_router, "question": question})
+
+        async def condense() -> str:
+            if not chat_history:
+                return question
+            return await self.condense_question_chain.ainvoke({"chat_history": chat_history, "input": question})
+
+        topic, standalone_question = await asyncio.gather(route(), condense())
+
+        if "RAG" in topic:
+            logger.debug("Routing to Document-Specific RAG Chain...")
+
+            context = await self._apack_context(question, await retriever.ainvoke(standalone_question))
+            sources = [doc.metadata.get('source', 'Unknown') for doc in context]
+
+            set_route('rag')
+            return self.question_answer_chain, {"context": context, "input": question}, sources
+
+        logger.debug("Routing to General Knowledge Chain...")
+
+        set_route('general')
+        return self.general_chain, {"chat_history": chat_history, "input": question}, []
+
+    async def _aprepare_fast(self, question: str, chat_history: List[BaseMessage], base_retriever: BaseRetriever, retriever: BaseRetriever) -> Tuple[Runnable, Dict[str, Any], List[str]]:
+        """
+        Async version of '_prepare_fast', with the same LLM call budget.
+        """
+        budget = LLMCallBudget(settings.CHAT_LLM_CALL_BUDGET)
+
+        if budget.remaining >= 3:
+            budget.spend()
+        else:
+            retriever = base_retriever
+
+        retrieved_docs = await self._apack_context(question, await retriever.ainvoke(question))
+
+        route, standalone_question = "RAG", question
+        if budget.remaining >= 2:
+            budget.spend()
+            raw_route = await self.route_and_condense_chain.ainvoke({
+                "context": "\n\n".join([doc.page_content for doc in retrieved_docs]),
+                "chat_history": chat_history,
+                "input": question
+            })
+            route, standalone_question = self._parse_route(raw_route, question)
+
+        budget.spend()
+        if route == "RAG":
+            sources = [doc.metadata.get('source', 'Unknown') for doc in retrieved_docs]
+            set_route('rag')
+            return self.question_answer_chain, {"context": retrieved_docs, "input": standalone_question}, sources
+
+        set_route('general')
+        return self.general_chain, {"chat_history": chat_history, "input": question}, []
+
+    def _pack_context(self, question: str, docs: List[Document]) -> List[Document]:
+        with stage('context_packing'):
+            return self.context_packer.pack(question, docs)
+
+    async def _apack_context(self, question: str, docs: List[Document]) -> List[Document]:
+        # Embedding cache reads and numpy work, keep them off the event loop
+        return await sync_to_async(self._pack_context, thread_sensitive=False)(question, docs)
+
+    @staticmethod
+    def _parse_route(raw_route: str, question: str) -> Tuple[str, str]:
+        """
+        Reads the route-and-condense JSON reply, falling back to the old keyword check
+        if the model did not return valid JSON.
+        """
+        try:
+            parsed = parse_json_markdown(raw_route)
+            route = "RAG" if "RAG" in str(parsed.get("route", "")) else "General"
+            standalone_question = (parsed.get("standalone_question") or "").strip() or question
+        except (ValueError, AttributeError):
+            route = "RAG" if "RAG" in raw_route else "General"
+            standalone_question = question
+
+        return route, standalone_question
         
 
 
@@ -0,0 +1,155 @@
+# Retrieval stages used by the RAG pipeline.
+
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable
+from langchain_core.vectorstores import VectorStore, VectorStoreRetriever
+
+from .keyword_index import KeywordIndex
+from .vector_index import VectorIndex
+
+
+def document_filter(document_ids: Optional[Sequence[int]]) -> Optional[Dict[str, Any]]:
+    """
+    Vector store metadata filter that keeps only chunks of the given user documents,
+    or None (no filter) when no documents are selected.
+    """
+    if not document_ids:
+        return None
+    if len(document_ids) == 1:
+        return {"user_document_id": document_ids[0]}
+    return {"user_document_id": {"$in": list(document_ids)}}
+
+
+def search_by_vectors(vector_store: VectorStore, embeddings: List[List[float]], k: int, filter: Optional[Dict[str, Any]] = None) -> List[List[Tuple[Document, float]]]:
+    """
+    Runs one similarity search per query vector and returns (document, distance) lists, lower is closer.
+    Our vector indexes answer all of them in a single call.
+    """
+    if isinstance(vector_store, VectorIndex):
+        return vector_store.search_by_vectors(embeddings, k=k, filter=filter)
+
+    # Other stores: one search per vector, the rank stands in for the distance
+    return [
+        [(doc, float(rank)) for rank, doc in enumerate(vector_store.similarity_search_by_vector(embedding, k=k, filter=filter))]
+        for embedding in embeddings
+    ]
+
+
+def merge_results(results: List[List[Tuple[Document, float]]]) -> List[Document]:
+    """
+    Unique union of several result lists, each chunk kept once at its best distance, closest first.
+    """
+    best = {}
+    for docs_and_distances in results:
+        for doc, distance in docs_and_distances:
+            key = _result_key(doc)
+            if key not in best or distance < best[key][1]:
+                best[key] = (doc, distance)
+
+    return [doc for doc, _ in sorted(best.values(), key=lambda item: item[1])]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = 60) -> List[Document]:
+    """
+    Fuses several rankings of the same corpus: each chunk scores sum(1 / (k + rank)) over the
+    rankings it appears in. Only ranks are used, so BM25 scores and vector distances don't
+    need to be comparable.
+    """
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _result_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def _result_key(doc: Document):
+    return doc.id or (doc.page_content, tuple(sorted(doc.metadata.items())))
+
+
+class BatchedMultiQueryRetriever(BaseRetriever):
+    """
+    Multi-query retrieval with a single embedding pass.
+    The LLM expands the question into variants like MultiQueryRetriever does, but all variants
+    are embedded in one batched encode call and searched with one multi-vector query, instead of
+    one embed + search round trip per variant.
+    """
+
+    retriever: VectorStoreRetriever
+    llm_chain: Runnable
+    include_original: bool = True
+
+    def generate_queries(self, question: str, run_manager: CallbackManagerForRetrieverRun) -> List[str]:
+        lines = self.llm_chain.invoke({"question": question}, config={"callbacks": run_manager.get_child()})
+        return self._clean_queries(question, lines)
+
+    async def agenerate_queries(self, question: str, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[str]:
+        lines = await self.llm_chain.ainvoke({"question": question}, config={"callbacks": run_manager.get_child()})
+        return self._clean_queries(question, lines)
+
+    def _clean_queries(self, question: str, lines: List[str]) -> List[str]:
+        queries = [line.strip() for line in lines if line.strip()]
+        if self.include_original:
+            queries.append(question)
+        # Keep order, drop repeated variants
+        return list(dict.fromkeys(queries))
+
+    def search(self, queries: List[str]) -> List[Document]:
+        vector_store = self.retriever.vectorstore
+        search_kwargs = self.retriever.search_kwargs
+
+        # One batched forward pass for every variant
+        embeddings = vector_store.embeddings.embed_documents(queries)
+
+        results = search_by_vectors(
+            vector_store, embeddings, k=search_kwargs.get('k', 4), filter=search_kwargs.get('filter')
+        )
+        return merge_results(results)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        queries = self.generate_queries(query, run_manager)
+        return self.search(queries)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        queries = await self.agenerate_queries(query, run_manager)
+        # Embedding and the vector search are CPU / blocking work, run them off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, self.search, queries)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense retrieval fused with the user's BM25 keyword index by reciprocal rank fusion.
+    The dense retriever finds paraphrases, the keyword index finds exact identifiers.
+    """
+
+    retriever: BaseRetriever
+    keyword_index: KeywordIndex
+    k: int = 5
+    document_ids: Optional[List[int]] = None
+    rrf_k: int = 60
+
+    def _fuse(self, dense_docs: List[Document], keyword_docs: List[Document]) -> List[Document]:
+        fused = reciprocal_rank_fusion([dense_docs, keyword_docs], k=self.rrf_k)
+        # Hand on as many chunks as the dense retriever alone would have
+        return fused[:max(len(dense_docs), self.k)]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        dense_docs = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        keyword_docs = self.keyword_index.search(query, self.k, self.document_ids)
+        return self._fuse(dense_docs, keyword_docs)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        # Both searches run at the same time, the keyword search in a thread (SQLite is blocking)
+        dense_docs, keyword_docs = await asyncio.gather(
+            self.retriever.ainvoke(query, config={"callbacks": run_manager.get_child()}),
+            asyncio.get_running_loop().run_in_executor(None, self.keyword_index.search, query, self.k, self.document_ids)
+        )
+        return self._fuse(dense_docs, keyword_docs)
@@ -0,0 +1,225 @@
+# Per-request tracing of the chat pipeline.
+# A RequestTrace is opened around every ChatBot.ask / aask / astream call. It is installed as a
+# LangChain callback handler for everything that runs inside it (threads and tasks included, via
+# a context variable), so the named chains, retrievers and LLM calls report themselves; the steps
+# outside LangChain are timed with `stage()`. When the request ends the trace is logged as one
+# JSON line and added to the Prometheus histograms (see metrics.py).
+
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# LangChain run name (see ChatBot._build_chains) -> stage it is reported as
+CHAIN_STAGES = {
+    'generate_queries': 'generate_queries',
+    'route_question': 'route',
+    'condense_question': 'condense',
+    'route_and_condense': 'route_and_condense',
+    'retrieve_documents': 'history_aware_retrieval',
+    'stuff_documents_chain': 'answer',
+    'general_answer': 'answer',
+}
+
+# What a client may send as X-Request-ID, anything else gets a fresh id
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_current_trace: ContextVar[Optional['RequestTrace']] = ContextVar('chat_request_trace', default=None)
+
+# Every LangChain run started while a trace is current gets it as a callback handler
+register_configure_hook(_current_trace, inheritable=True)
+
+
+def make_request_id(candidate: Optional[str] = None) -> str:
+    if candidate and REQUEST_ID_PATTERN.match(candidate):
+        return candidate
+    return uuid.uuid4().hex
+
+
+class RequestTrace(BaseCallbackHandler):
+    """
+    Wall time per stage, LLM calls and tokens, retrieved documents and route of one chat request.
+    """
+
+    # Called in the thread / task of the run itself, in order
+    run_inline = True
+
+    def __init__(self, request_id: str, endpoint: str, mode: str):
+        self.request_id = request_id
+        self.endpoint = endpoint
+        self.mode = mode
+        self.route = None
+        self.error = False
+        self.stages = defaultdict(float)
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retrieved_documents = 0
+        self.started = time.perf_counter()
+        self.seconds = None
+
+        self._lock = threading.Lock()
+        # run id -> (stage, start time) of the runs being timed
+        self._open_runs = {}
+        self._retriever_runs = set()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add_stage(name, time.perf_counter() - started)
+
+    def _add_stage(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[name] += seconds
+
+    def _start_run(self, run_id: UUID, stage: str) -> None:
+        with self._lock:
+            self._open_runs[run_id] = (stage, time.perf_counter())
+
+    def _end_run(self, run_id: UUID) -> None:
+        with self._lock:
+            opened = self._open_runs.pop(run_id, None)
+        if opened:
+            self._add_stage(opened[0], time.perf_counter() - opened[1])
+
+    # --- LangChain callbacks ---
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID, **kwargs: Any) -> None:
+        stage = CHAIN_STAGES.get(kwargs.get('name'))
+        if stage:
+            self._start_run(run_id, stage)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        with self._lock:
+            outermost = parent_run_id not in self._retriever_runs
+            self._retriever_runs.add(run_id)
+        # Only the outermost retriever, it already includes the expansion and every search
+        if outermost:
+            self._start_run(run_id, 'retrieval')
+
+    def on_retriever_end(self, documents, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            outermost = run_id in self._open_runs
+            if outermost:
+                self.retrieved_documents += len(documents)
+        self._end_run(run_id)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self.llm_calls += 1
+        self._start_run(run_id, 'llm')
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        prompt_tokens = completion_tokens = 0
+
+        for generation in (response.generations[0] if response.generations else []):
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if usage:
+                prompt_tokens += usage.get('input_tokens', 0)
+                completion_tokens += usage.get('output_tokens', 0)
+
+        # Older integrations only report usage in llm_output
+        if not prompt_tokens and not completion_tokens:
+            usage = (response.llm_output or {}).get('token_usage') or {}
+            prompt_tokens = usage.get('prompt_tokens', 0)
+            completion_tokens = usage.get('completion_tokens', 0)
+
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        self._end_run(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    # --- Results ---
+
+    def finish(self) -> None:
+        self.seconds = time.perf_counter() - self.started
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'request_id': self.request_id,
+            'endpoint': self.endpoint,
+            'mode': self.mode,
+            'route': self.route,
+            'error': self.error,
+            'total_ms': round(self.seconds * 1e3, 2) if self.seconds is not None else None,
+            'stages_ms': {stage: round(seconds * 1e3, 2) for stage, seconds in sorted(self.stages.items())},
+            'llm_calls': self.llm_calls,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'retrieved_documents': self.retrieved_documents,
+        }
+
+
+@contextmanager
+def trace_request(request_id: Optional[str], endpoint: str, mode: str) -> Iterator[RequestTrace]:
+    """
+    Traces everything run inside the block as one request, then logs and records it.
+    """
+    trace = RequestTrace(make_request_id(request_id), endpoint, mode)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except BaseException:
+        trace.error = True
+        raise
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # A stream closed from another task (client went away) runs this in a different context
+            pass
+        trace.finish()
+        logger.info("chat_request %s", json.dumps(trace.summary()))
+        metrics.observe_request(trace)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Times a step outside LangChain as part of the current request, if there is one."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    with trace.stage(name):
+        yield
+
+
+def set_route(route: str) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.route = route
@@ -0,0 +1,57 @@
+# The vector store interface the chatbot codes against.
+# Ingestion, retrieval and the data_ingestion command only use these operations, so the
+# backend (see vector_stores.py) can be swapped through settings.VECTOR_STORE_BACKEND.
+#
+# Filters are the ones built by retrievers.document_filter:
+#   {"user_document_id": 3} or {"user_document_id": {"$in": [3, 4]}}
+
+from abc import abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+
+class VectorIndex(VectorStore):
+    """
+    A LangChain VectorStore (so it works with as_retriever) plus the write and batch-search
+    operations ingestion and the multi-query retriever need.
+    """
+
+    def upsert(self, documents: List[Document]) -> List[str]:
+        """
+        Embeds and writes documents under their `id`, replacing whatever was stored under it.
+        """
+        texts = [doc.page_content for doc in documents]
+        ids = [doc.id for doc in documents]
+        self.upsert_vectors(ids, self.embeddings.embed_documents(texts), texts, [doc.metadata for doc in documents])
+        return ids
+
+    @abstractmethod
+    def upsert_vectors(self, ids: List[str], vectors: Sequence[Sequence[float]], texts: List[str], metadatas: List[dict]) -> None:
+        """Writes precomputed vectors, replacing whatever was stored under the same ids."""
+
+    @abstractmethod
+    def delete_document(self, user_document_id: int, keep: Set[str] = frozenset()) -> int:
+        """
+        Deletes every vector of a user document, except the ids in `keep`.
+        Returns how many vectors were removed.
+        """
+
+    @abstractmethod
+    def delete_untagged(self) -> int:
+        """
+        Deletes the vectors that carry no user_document_id, written before chunks were tagged
+        with their document. Returns how many vectors were removed.
+        """
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Deletes every vector in the collection."""
+
+    @abstractmethod
+    def search_by_vectors(self, embeddings: Sequence[Sequence[float]], k: int, filter: Optional[Dict[str, Any]] = None) -> List[List[Tuple[Document, float]]]:
+        """
+        Runs one similarity search per query vector, in a single call where the backend allows it.
+        Returns (document, distance) lists, closest first.
+        """
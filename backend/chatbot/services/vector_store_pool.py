@@ -0,0 +1,82 @@
+# Bounded LRU pool of per-user vector store handles.
+# Opening a user's Chroma collection on every message means re-attaching to the persistent
+# store and looking the collection up again. The pool keeps the handles of recently active
+# users open, closes the ones that sit idle, and reopens a handle whenever the user's corpus
+# version moves (i.e. process_document_ingestion added documents in a worker).
+# The version lives in Redis, so it is only re-read once an entry's last check is older than
+# `version_check_interval` seconds: a user's follow-up questions reuse the handle without a
+# round trip, and a finished ingestion is picked up at most that much later.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from .corpus_version import get_corpus_version
+
+
+class VectorStorePool:
+
+    def __init__(self, factory: Callable[[int], Any], max_size: int, idle_timeout: float, version_check_interval: float = 0.0):
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.version_check_interval = version_check_interval
+        # user_id -> [handle, corpus_version, last_used, version_checked_at]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Any:
+        """Returns an open handle for the user's collection, opening one if needed."""
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_idle(now)
+
+            # Checked recently enough, no need to ask Redis again
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[3] < self.version_check_interval:
+                return self._touch(user_id, entry, now)
+
+        version = get_corpus_version(user_id)
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] == version:
+                entry[3] = now
+                return self._touch(user_id, entry, now)
+
+        # Open outside the lock so one slow open does not stall every other user
+        handle = self.factory(user_id)
+
+        with self._lock:
+            self._entries[user_id] = [handle, version, now, now]
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return handle
+
+    def _touch(self, user_id: int, entry: list, now: float) -> Any:
+        entry[2] = now
+        self._entries.move_to_end(user_id)
+        return entry[0]
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _evict_idle(self, now: float) -> None:
+        # Entries are kept in last-used order, so idle ones are always at the front
+        while self._entries:
+            user_id, entry = next(iter(self._entries.items()))
+            if now - entry[2] < self.idle_timeout:
+                break
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,70 @@
+# Opens vector indexes with the backend chosen in settings.VECTOR_STORE_BACKEND:
+#   'chroma'     persistent Chroma collections (HNSW), the default
+#   'numpy'      in-process vectorized NumPy brute force over memory-mapped float32 vectors,
+#                exact and fast for the small collections most users have
+#   'quantized'  the same engine storing int8 / float16 codes, with exact rescoring
+# Every backend implements VectorIndex, so ingestion and the retrievers work the same on any of them.
+
+import os
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from langchain_core.embeddings import Embeddings
+
+from .chroma_index import ChromaIndex
+from .model_registry import get_embedding_model
+from .quantized_store import QuantizedVectorStore
+from .vector_index import VectorIndex
+
+CHROMA_PATH = os.path.join(settings.BASE_DIR, 'chroma_db')
+
+
+def _open_chroma(root: str, collection_name: str, embedding_function: Embeddings) -> VectorIndex:
+    return ChromaIndex(persist_directory=root, embedding_function=embedding_function, collection_name=collection_name)
+
+
+def _open_numpy(root: str, collection_name: str, embedding_function: Embeddings) -> VectorIndex:
+    return QuantizedVectorStore(os.path.join(root, collection_name), embedding_function, dtype='float32')
+
+
+def _open_quantized(root: str, collection_name: str, embedding_function: Embeddings) -> VectorIndex:
+    return QuantizedVectorStore(
+        os.path.join(root, collection_name),
+        embedding_function,
+        dtype=settings.QUANTIZED_VECTOR_DTYPE,
+        rescore_factor=settings.QUANTIZED_RESCORE_FACTOR
+    )
+
+
+# backend name -> function(root directory, collection name, embedding function) opening an index
+BACKENDS = {
+    'chroma': _open_chroma,
+    'numpy': _open_numpy,
+    'quantized': _open_quantized,
+}
+
+
+def vector_store_root(backend: str = None) -> str:
+    """Directory holding every collection of a backend (the configured one by default)."""
+    backend = backend or settings.VECTOR_STORE_BACKEND
+    return {
+        'chroma': CHROMA_PATH,
+        'numpy': settings.NUMPY_VECTOR_DIR,
+        'quantized': settings.QUANTIZED_VECTOR_DIR,
+    }[backend]
+
+
+def open_vector_store(collection_name: str, embedding_function: Embeddings = None) -> VectorIndex:
+    backend = settings.VECTOR_STORE_BACKEND
+    if backend not in BACKENDS:
+        raise ImproperlyConfigured(f"Unknown VECTOR_STORE_BACKEND '{backend}', expected one of: {', '.join(BACKENDS)}.")
+
+    return BACKENDS[backend](vector_store_root(backend), collection_name, embedding_function or get_embedding_model())
+
+
+def open_user_vector_store(user_id: int, embedding_function: Embeddings = None) -> VectorIndex:
+    """
+    Opens the user's own vector index. Used as the VectorStorePool factory, and by ingestion
+    with a caching embedding function.
+    """
+    return open_vector_store(f"user_{user_id}", embedding_function)
@@ -1,66 +1,111 @@
 
 import os
 import shutil
+import time
 from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
 from django.conf import settings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from django.core.cache import cache
 from users.models import UserDocument
+from chatbot.services.embedding_cache import CachedEmbeddings
+from chatbot.services.model_registry import embedding_namespace, get_embedding_model
+from chatbot.services.corpus_version import bump_corpus_version
+from chatbot.services.keyword_index import KeywordIndex
+from chatbot.services.notifications import notify_answer_job, notify_document_status, notify_session_title
+from chatbot.services.vector_stores import open_user_vector_store
+from chatbot.services.ingestion import (
+    assign_chunk_ids, count_pages, iter_batches, iter_chunks, iter_pages, make_text_splitter
+)
 
 from chatbot.models import ChatSession 
 from langchain_groq import ChatGroq
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-CHROMA_PATH = os.path.join(settings.BASE_DIR, 'chroma_db')
-
 @shared_task
 def process_document_ingestion(user_document_id: int):
+    """
+    Streams a PDF into the user's collection: page -> chunks -> fixed-size embedding batch -> vector
+    store write. Peak memory is bounded by INGESTION_BATCH_SIZE, and progress is saved on the
+    UserDocument after every batch.
+    Chunk ids are derived from the document, page and content, so a retried or repeated run
+    overwrites the document's vectors instead of adding copies.
+    """
+    started = time.perf_counter()
 
     try:
         doc = UserDocument.objects.get(id=user_document_id)
+        # Ingested before chunks were tagged with their document (and the namespace recorded)
+        legacy = doc.ingestion_status == 'SUCCESS' and not doc.embedding_namespace
         doc.ingestion_status = 'PROCESSING'
+        doc.total_pages = count_pages(doc.file.path)
+        doc.pages_processed = 0
+        doc.chunks_ingested = 0
         doc.save()
+        notify_document_status(doc)
 
-        # Load Document
-        loader = PyPDFLoader(doc.file.path)
-        documents = loader.load()
+        # Shared per worker process, loaded at worker start (see core/celery.py)
+        embedding_model = get_embedding_model()
 
-        # Split Document
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=120,
-            length_function = len,
-            separators=["\n\n", "\n", ".", " "]
-        )
+        # Only chunks we have never embedded before (for any user) go through the model
+        cached_embeddings = CachedEmbeddings(embedding_model, namespace=embedding_namespace())
 
-        chunks = text_splitter.split_documents(documents)
+        # Add to the user's existing collection, or create it if it doesn't exist
+        vector_db = open_user_vector_store(doc.user_id, cached_embeddings)
 
-        # Create user-specific collection
-        user_collection_name = f"user_{doc.user.id}"
-        
-        embedding_model = HuggingFaceEmbeddings(model_name='all-MiniLM-L6-v2')
-        
-        # We add to the existing collection or create a new one if it doesn't exist
-        Chroma.from_documents(
-            documents=chunks,
-            embedding=embedding_model,
-            persist_directory=CHROMA_PATH,
-            collection_name=user_collection_name
-        )
+        if legacy:
+            # Their random ids are never overwritten, nor matched by delete_document. The user's
+            # other legacy documents lose theirs too, reingest_documents queues them all.
+            vector_db.delete_untagged()
+
+        # BM25 index searched next to the vectors, updated with the same chunks and ids
+        keyword_index = KeywordIndex.for_user(doc.user_id)
+
+        # Load, split, embed and write one batch at a time
+        chunks = iter_chunks(iter_pages(doc.file.path), make_text_splitter())
+
+        written_ids = set()
+
+        for batch in iter_batches(chunks, settings.INGESTION_BATCH_SIZE):
+            unique = assign_chunk_ids(batch, doc.id, written_ids)
+            if unique:
+                # An id that is already stored is overwritten, not duplicated
+                vector_db.upsert(unique)
+                keyword_index.upsert(unique)
+
+            doc.chunks_ingested += len(unique)
+            doc.pages_processed = batch[-1].metadata.get('page', 0) + 1
+            doc.save(update_fields=['chunks_ingested', 'pages_processed'])
+            notify_document_status(doc)
+
+        # Drop vectors an earlier run of this document wrote that this run did not produce
+        vector_db.delete_document(doc.id, keep=written_ids)
+        keyword_index.delete_document(doc.id, keep=written_ids)
+
+        # Tells the web processes to reopen this user's collection
+        bump_corpus_version(doc.user_id)
 
         doc.ingestion_status = 'SUCCESS'
+        doc.pages_processed = doc.total_pages
+        doc.embedding_namespace = cached_embeddings.namespace
         doc.save()
-        return f"Successfully ingested document ID {user_document_id}"
+        notify_document_status(doc)
+        return (
+            f"Successfully ingested document ID {user_document_id} "
+            f"({cached_embeddings.hits} chunks from embedding cache, {cached_embeddings.misses} embedded) "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
 
     except UserDocument.DoesNotExist:
         return f"Error: UserDocument with ID {user_document_id} not found."
     except Exception as e:
         if 'doc' in locals():
+            # Some batches may already be in the collection
+            if doc.chunks_ingested:
+                bump_corpus_version(doc.user_id)
             doc.ingestion_status = 'FAILURE'
             doc.save()
+            notify_document_status(doc)
         return f"Error processing document ID {user_document_id}: {str(e)}"
     
 
@@ -92,8 +137,126 @@ def generate_chat_title(session_id: int):
         session.title = title.strip().strip('"') # Clean up any extra quotes
         session.save()
 
+        # Pushed to the session's open WebSocket, if any
+        notify_session_title(session)
+
         return f"Successfully generated title for session {session_id}: {title}"
     except ChatSession.DoesNotExist:
         return f"Error: ChatSession with ID {session_id} not found."
     except Exception as e:
-        return f"Error generating title for session {session_id}: {str(e)}"
\ No newline at end of file
+        return f"Error generating title for session {session_id}: {str(e)}"
+
+
+def _finish_answer_job(job_id: str, session_id: int, status: str, result: dict) -> None:
+    from chatbot.services.answer_jobs import public_job, update_job
+
+    job = update_job(job_id, status, result)
+
+    # Clients connected to the session's WebSocket get it without polling
+    if job is not None:
+        notify_answer_job(session_id, public_job(job))
+
+
+# acks_late: a worker that dies mid-answer leaves the message on the queue for another worker.
+# The soft limit turns a stuck LLM call into a FAILURE the client sees, the hard limit gives
+# that write some time before the child process is killed.
+@shared_task(
+    ignore_result=True,
+    acks_late=True,
+    soft_time_limit=settings.CHAT_ANSWER_SOFT_TIME_LIMIT_SECONDS,
+    time_limit=settings.CHAT_ANSWER_SOFT_TIME_LIMIT_SECONDS + 30,
+)
+def generate_answer(job_id: str, session_id: int, question: str, document_ids=None, request_id: str = None):
+    """
+    Answers a question the send endpoint already saved (CHAT_ANSWER_MODE = 'celery'), so the
+    web worker returns right away instead of waiting on the LLM. Runs on the chat_answers queue.
+    The outcome is recorded on the answer job the client polls (see services/answer_jobs.py)
+    and pushed to the session's WebSocket.
+    """
+    # Imported here, the pipeline module imports this one
+    from chatbot.services.answer_jobs import is_finished, update_job
+    from chatbot.services.chatbot_service import get_bot_instance
+
+    # Redelivered (acks_late) after the first run already finished it
+    if is_finished(job_id):
+        return
+
+    try:
+        session = ChatSession.objects.get(id=session_id)
+    except ChatSession.DoesNotExist:
+        _finish_answer_job(job_id, session_id, 'FAILURE', {'error': 'Chat session not found.'})
+        return
+
+    update_job(job_id, 'PROCESSING')
+
+    try:
+        result = get_bot_instance().ask(question, session, document_ids, request_id, save_question=False)
+    except SoftTimeLimitExceeded:
+        _finish_answer_job(job_id, session_id, 'FAILURE', {'error': 'The answer took too long.', 'request_id': request_id})
+        return
+    except Exception:
+        _finish_answer_job(job_id, session_id, 'FAILURE', {'error': 'An internal error occurred.', 'request_id': request_id})
+        raise
+
+    # Only a saved answer has a message id, errors come back as an apology without one
+    _finish_answer_job(job_id, session_id, 'SUCCESS' if result.get('message_id') else 'FAILURE', result)
+
+
+def summary_pending_key(session_id: int) -> str:
+    # Set while an update_session_summary run is queued or running (see ChatBot._schedule_summary_update)
+    return f"chatbot:summary_pending:{session_id}"
+
+
+@shared_task
+def update_session_summary(session_id: int):
+    """
+    Folds messages that have scrolled out of the recent-history window into the
+    session's rolling summary, so the prompt stays the same size however long the chat gets.
+    """
+    try:
+        return _update_session_summary(session_id)
+    finally:
+        # The next request past the threshold may queue another run
+        cache.delete(summary_pending_key(session_id))
+
+
+def _update_session_summary(session_id: int):
+    try:
+        session = ChatSession.objects.get(id=session_id)
+
+        window = settings.CHAT_HISTORY_WINDOW_TURNS * 2
+        summarize_until = session.messages.count() - window
+
+        if summarize_until <= session.summary_message_count:
+            return f"Summary of session {session_id} is up to date."
+
+        # Only the messages that are not in the summary yet
+        new_messages = session.messages.order_by('timestamp', 'id')[session.summary_message_count:summarize_until]
+        new_lines = "\n".join(
+            f"{'Assistant' if msg.is_from_ai else 'User'}: {msg.message}" for msg in new_messages
+        )
+
+        llm = ChatGroq(model="llama3-8b-8192", temperature=0.2)
+
+        prompt = ChatPromptTemplate.from_template(
+            "Progressively summarize the conversation, adding onto the current summary and returning a new summary. "
+            "Keep names, numbers and any facts the user may refer back to.\n\n"
+            "Current summary:\n{summary}\n\nNew lines of conversation:\n{new_lines}\n\nNew summary:"
+        )
+        chain = prompt | llm | StrOutputParser()
+
+        summary = chain.invoke({"summary": session.summary or "(empty)", "new_lines": new_lines})
+
+        # Only save if no other run moved the summary forward in the meantime
+        updated = ChatSession.objects.filter(
+            id=session_id, summary_message_count=session.summary_message_count
+        ).update(summary=summary.strip(), summary_message_count=summarize_until)
+
+        if not updated:
+            return f"Summary of session {session_id} was updated concurrently, skipped."
+
+        return f"Summarized the first {summarize_until} messages of session {session_id}."
+    except ChatSession.DoesNotExist:
+        return f"Error: ChatSession with ID {session_id} not found."
+    except Exception as e:
+        return f"Error summarizing session {session_id}: {str(e)}"
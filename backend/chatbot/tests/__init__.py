@@ -0,0 +1,7 @@
+# Tests of the chatbot app, one module per feature. Run with `python manage.py test chatbot`.
+
+# Nothing here needs Redis: jobs and cached answers go to memory, WebSocket events to an in-memory layer
+TEST_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'chatbot-tests'}},
+    'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+}
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.test import TestCase, override_settings
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from chatbot.benchmarks.offline import write_text_pdf
+from chatbot.services import embedding_cache, model_registry, vector_stores
+from chatbot.services.embedding_cache import EmbeddingCache
+from chatbot.tasks import process_document_ingestion
+from users.models import UserDocument
+
+from . import TEST_SETTINGS
+
+
+class IngestionTestCase(TestCase):
+    """
+    Runs process_document_ingestion offline: a fake embedding model, and every store (uploads,
+    vectors, keyword index, embedding cache) in a temporary directory.
+    """
+
+    backend = 'chroma'
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+        settings_override = override_settings(
+            **TEST_SETTINGS,
+            VECTOR_STORE_BACKEND=self.backend,
+            MEDIA_ROOT=os.path.join(self.root, 'media'),
+            KEYWORD_INDEX_DIR=os.path.join(self.root, 'keyword_index'),
+            NUMPY_VECTOR_DIR=os.path.join(self.root, 'numpy_vectors'),
+            QUANTIZED_VECTOR_DIR=os.path.join(self.root, 'quantized_vectors'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        os.makedirs(settings.KEYWORD_INDEX_DIR)
+        patches = [
+            mock.patch.object(vector_stores, 'CHROMA_PATH', os.path.join(self.root, 'chroma_db')),
+            mock.patch.object(embedding_cache, '_cache', EmbeddingCache(os.path.join(self.root, 'embeddings.sqlite3'), 1024 * 1024)),
+            mock.patch.dict(model_registry._embedding_models, {settings.EMBEDDING_MODEL_NAME: DeterministicFakeEmbedding(size=16)}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.user = User.objects.create_user('reader', password='pass')
+
+    def write_pdf(self, pages) -> str:
+        path = os.path.join(self.root, 'upload.pdf')
+        write_text_pdf(path, pages)
+        return path
+
+    def create_document(self, pages, **fields) -> UserDocument:
+        with open(self.write_pdf(pages), 'rb') as f:
+            return UserDocument.objects.create(user=self.user, file=File(f, name='manual.pdf'), original_filename='manual.pdf', **fields)
+
+    def ingest(self, doc: UserDocument) -> UserDocument:
+        process_document_ingestion(doc.id)
+        doc.refresh_from_db()
+        self.assertEqual(doc.ingestion_status, 'SUCCESS')
+        return doc
+
+    def vector_store(self):
+        return vector_stores.open_user_vector_store(self.user.id)
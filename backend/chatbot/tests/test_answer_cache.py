@@ -0,0 +1,67 @@
+import itertools
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from chatbot.services.answer_cache import AnswerCache
+from chatbot.services.corpus_version import bump_corpus_version
+from chatbot.services.metrics import ANSWER_CACHE_LOOKUPS
+
+from . import TEST_SETTINGS
+
+
+def _vector(seed):
+    return np.random.default_rng(seed).standard_normal(16).tolist()
+
+
+@override_settings(**TEST_SETTINGS)
+class AnswerCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.cache = AnswerCache(similarity_threshold=0.95, ttl=3600, max_entries=2)
+
+    def _store(self, seed, **kwargs):
+        self.cache.store(1, f"Question {seed}?", _vector(seed), f"Answer {seed}.", ['manual.pdf'], **kwargs)
+
+    def test_near_identical_question_hits(self):
+        self._store(1)
+
+        hit = self.cache.lookup(1, (np.array(_vector(1)) * 2).tolist())
+        self.assertEqual(hit['answer'], 'Answer 1.')
+        self.assertIsNone(self.cache.lookup(1, _vector(2)))
+        # Scoped per user and per document selection
+        self.assertIsNone(self.cache.lookup(2, _vector(1)))
+        self.assertIsNone(self.cache.lookup(1, _vector(1), document_ids=[3]))
+
+    def test_changed_corpus_invalidates_entries(self):
+        self._store(1)
+        bump_corpus_version(1)
+
+        self.assertIsNone(self.cache.lookup(1, _vector(1)))
+
+    def test_store_replaces_the_least_recently_used_entry(self):
+        # A clock that moves on with every reading, the cache expiry reads it too
+        with mock.patch('time.time', side_effect=itertools.count(1000)):
+            self._store(1)
+            self._store(2)
+            # Entry 1 is now the most recently used one, entry 2 is replaced
+            self.assertIsNotNone(self.cache.lookup(1, _vector(1)))
+            self._store(3)
+
+            self.assertIsNotNone(self.cache.lookup(1, _vector(1)))
+            self.assertIsNone(self.cache.lookup(1, _vector(2)))
+            self.assertIsNotNone(self.cache.lookup(1, _vector(3)))
+
+    def test_lookups_are_counted(self):
+        hits = ANSWER_CACHE_LOOKUPS.labels('hit')._value.get()
+        misses = ANSWER_CACHE_LOOKUPS.labels('miss')._value.get()
+        self._store(1)
+
+        self.cache.lookup(1, _vector(1))
+        self.cache.lookup(1, _vector(2))
+
+        self.assertEqual(ANSWER_CACHE_LOOKUPS.labels('hit')._value.get(), hits + 1)
+        self.assertEqual(ANSWER_CACHE_LOOKUPS.labels('miss')._value.get(), misses + 1)
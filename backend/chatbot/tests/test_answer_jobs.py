@@ -0,0 +1,80 @@
+from unittest import mock
+
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chatbot.models import ChatSession
+from chatbot.services import model_registry
+from chatbot.services.answer_jobs import create_job, get_job, update_job
+from chatbot.services.rag_pipeline import ChatBot
+from chatbot.tasks import generate_answer
+
+from . import TEST_SETTINGS
+
+
+@override_settings(**TEST_SETTINGS)
+class AnswerJobTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass')
+        cls.other = User.objects.create_user('other', password='pass')
+        cls.session = ChatSession.objects.create(user=cls.owner)
+
+    def _get(self, user, job_id):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(reverse('chat_answer_job', args=[job_id]))
+
+    def test_owner_sees_the_job_and_its_updates(self):
+        job = create_job(self.owner.id, self.session.id, 'request-1')
+        self.assertEqual(self._get(self.owner, job['job_id']).data['status'], 'PENDING')
+
+        update_job(job['job_id'], 'SUCCESS', {'answer': 'Hello'})
+        response = self._get(self.owner, job['job_id'])
+        self.assertEqual(response.data['status'], 'SUCCESS')
+        self.assertEqual(response.data['result'], {'answer': 'Hello'})
+        self.assertNotIn('user_id', response.data)
+
+    def test_other_user_gets_not_found(self):
+        job = create_job(self.owner.id, self.session.id, 'request-1')
+        self.assertEqual(self._get(self.other, job['job_id']).status_code, 404)
+
+    def test_unknown_job_is_not_found(self):
+        self.assertEqual(self._get(self.owner, 'missing').status_code, 404)
+
+    @override_settings(CHAT_ANSWER_MODE='celery')
+    def test_celery_mode_send_queues_the_answer(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.owner)}")
+        generate_answer = mock.Mock()
+
+        with mock.patch('chatbot.services.answer_jobs.generate_answer', generate_answer), \
+                mock.patch('chatbot.views.generate_chat_title'):
+            response = client.post(reverse('send_message', args=[self.session.id]), {'message': 'Hi'}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job_id']
+        self.assertEqual(response['Location'], reverse('chat_answer_job', args=[job_id]))
+        self.assertEqual(generate_answer.delay.call_args.args[:3], (job_id, self.session.id, 'Hi'))
+        self.assertTrue(self.session.messages.filter(message='Hi', is_from_ai=False).exists())
+
+    def test_soft_time_limit_fails_the_job(self):
+        with mock.patch.dict(model_registry._embedding_models, {settings.EMBEDDING_MODEL_NAME: DeterministicFakeEmbedding(size=16)}):
+            bot = ChatBot(vector_store_pool=mock.Mock(), llm=FakeListChatModel(responses=['Hello']))
+        job = create_job(self.owner.id, self.session.id, 'request-1')
+
+        with mock.patch('chatbot.services.chatbot_service.get_bot_instance', return_value=bot), \
+                mock.patch.object(bot, '_load_chat_history', side_effect=SoftTimeLimitExceeded()):
+            generate_answer(job['job_id'], self.session.id, 'Hi', request_id='request-1')
+
+        job = get_job(job['job_id'], self.owner.id)
+        self.assertEqual(job['status'], 'FAILURE')
+        self.assertEqual(job['result']['error'], 'The answer took too long.')
@@ -0,0 +1,51 @@
+from asgiref.testing import ApplicationCommunicator
+from channels.routing import URLRouter
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chatbot.consumers import CLOSE_NOT_FOUND, CLOSE_UNAUTHORIZED
+from chatbot.middleware import JWTAuthMiddleware
+from chatbot.models import ChatSession
+from chatbot.routing import websocket_urlpatterns
+
+from . import TEST_SETTINGS
+
+
+@override_settings(**TEST_SETTINGS)
+class ChatConsumerAuthTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass')
+        cls.other = User.objects.create_user('other', password='pass')
+        cls.session = ChatSession.objects.create(user=cls.owner)
+
+    async def _connect(self, path, user=None, token=None):
+        # The routes behind the origin check of core/asgi.py
+        if user is not None:
+            token = AccessToken.for_user(user)
+        communicator = ApplicationCommunicator(JWTAuthMiddleware(URLRouter(websocket_urlpatterns)), {
+            'type': 'websocket',
+            'path': path,
+            'query_string': f"token={token}".encode() if token else b'',
+            'headers': [],
+            'subprotocols': [],
+        })
+        await communicator.send_input({'type': 'websocket.connect'})
+        return await communicator.receive_output(timeout=5)
+
+    async def test_owner_connects(self):
+        message = await self._connect(f"/ws/sessions/{self.session.id}/", self.owner)
+        self.assertEqual(message['type'], 'websocket.accept')
+
+    async def test_missing_or_invalid_token_is_refused(self):
+        for path, token in ((f"/ws/sessions/{self.session.id}/", None), ('/ws/documents/', 'invalid')):
+            message = await self._connect(path, token=token)
+            self.assertEqual(message['type'], 'websocket.close')
+            self.assertEqual(message['code'], CLOSE_UNAUTHORIZED)
+
+    async def test_other_users_session_is_refused(self):
+        message = await self._connect(f"/ws/sessions/{self.session.id}/", self.other)
+        self.assertEqual(message['type'], 'websocket.close')
+        self.assertEqual(message['code'], CLOSE_NOT_FOUND)
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from chatbot.services.context_packing import ContextPacker, estimate_tokens, merge_adjacent, text_overlap
+from chatbot.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+TEXT = "The pump must be primed before the first start. Open the bleed valve and fill the housing with water."
+
+
+def _chunk(text, page=0, user_document_id=1):
+    return Document(page_content=text, metadata={'user_document_id': user_document_id, 'page': page})
+
+
+class ContextPackingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.packer = ContextPacker(
+            DeterministicFakeEmbedding(size=16), estimated_token_budget=1000, duplicate_similarity=0.97, mmr_lambda=0.5
+        )
+
+    def test_text_overlap_finds_the_shared_splitter_overlap(self):
+        self.assertEqual(text_overlap(TEXT[:70], TEXT[40:]), 30)
+        self.assertEqual(text_overlap(TEXT[:70], TEXT[60:]), 0)
+
+    def test_overlapping_chunks_of_a_page_are_merged(self):
+        merged = merge_adjacent([_chunk(TEXT[40:]), _chunk(TEXT[:70]), _chunk(TEXT[:70], page=1)])
+
+        self.assertEqual([doc.page_content for doc in merged], [TEXT, TEXT[:70]])
+
+    def test_duplicates_are_dropped(self):
+        # Same text from two uploads: identical vectors
+        packed = self.packer.pack("priming", [_chunk(TEXT), _chunk(TEXT, user_document_id=2)])
+
+        self.assertEqual(len(packed), 1)
+
+    def test_chunks_stop_at_the_token_budget(self):
+        self.packer.estimated_token_budget = 2 * estimate_tokens("x" * 100)
+        docs = [_chunk(f"{index} " + "x" * 98, page=index) for index in range(5)]
+
+        self.assertEqual(len(self.packer.pack("x", docs)), 2)
+
+
+class ReadOnlyEmbeddingCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.path = os.path.join(self.root, 'embeddings.sqlite3')
+
+    def test_query_path_does_not_create_the_cache(self):
+        embeddings = CachedEmbeddings(DeterministicFakeEmbedding(size=16), namespace='model', cache=EmbeddingCache(self.path, 1024 * 1024), read_only=True)
+
+        embeddings.embed_documents([TEXT])
+
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_query_path_reads_without_writing(self):
+        cache = EmbeddingCache(self.path, 1024 * 1024)
+        CachedEmbeddings(DeterministicFakeEmbedding(size=16), namespace='model', cache=cache).embed_documents([TEXT])
+        before = cache.stats()
+
+        embeddings = CachedEmbeddings(DeterministicFakeEmbedding(size=16), namespace='model', cache=EmbeddingCache(self.path, 1024 * 1024), read_only=True)
+        embeddings.embed_documents([TEXT, "Never ingested."])
+
+        self.assertEqual((embeddings.hits, embeddings.misses), (1, 1))
+        self.assertEqual(cache.stats(), before)
@@ -0,0 +1,50 @@
+import io
+import os
+from unittest import mock
+
+from django.core.management import call_command
+from langchain_core.documents import Document
+
+from chatbot.benchmarks.offline import write_text_pdf
+from chatbot.management.commands import data_ingestion
+from chatbot.services.vector_stores import open_vector_store, vector_store_root
+
+from .base import IngestionTestCase
+
+
+class DataIngestionCommandTests(IngestionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        pdfs_path = os.path.join(self.root, 'pdfs')
+        os.makedirs(pdfs_path)
+        write_text_pdf(os.path.join(pdfs_path, 'guide.pdf'), [[f"Line {line} of the guide." for line in range(40)]])
+
+        patches = [
+            mock.patch.object(data_ingestion, 'PDFS_PATH', pdfs_path),
+            mock.patch.object(data_ingestion, 'VECTOR_STORE_PATH', vector_store_root()),
+            mock.patch.object(data_ingestion, 'MANIFEST_PATH', os.path.join(vector_store_root(), 'manifest.json')),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _run(self):
+        call_command('data_ingestion', workers=1, stdout=io.StringIO())
+        return open_vector_store(data_ingestion.COLLECTION_NAME).get(include=[])['ids']
+
+    def test_first_run_replaces_vectors_written_without_a_manifest(self):
+        # Left by the command that rebuilt the collection from scratch, under random ids
+        open_vector_store(data_ingestion.COLLECTION_NAME).add_documents([Document(page_content="Old chunk.")])
+
+        ids = self._run()
+
+        self.assertTrue(ids)
+        self.assertTrue(all(vector_id.startswith('guide.pdf:') for vector_id in ids))
+
+    def test_unchanged_files_are_not_written_again(self):
+        ids = self._run()
+
+        with mock.patch.object(data_ingestion, 'embed_pdf') as embed_pdf:
+            self.assertEqual(sorted(self._run()), sorted(ids))
+        embed_pdf.assert_not_called()
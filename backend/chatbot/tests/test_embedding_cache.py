@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from chatbot.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Records every text the model was run on."""
+
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+class EmbeddingCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.cache = EmbeddingCache(os.path.join(self.root, 'embeddings.sqlite3'), max_bytes=1024 * 1024)
+        self.model = CountingEmbeddings(size=16, embedded=[])
+
+    def test_only_unseen_texts_are_embedded(self):
+        first = CachedEmbeddings(self.model, namespace='model', cache=self.cache)
+        vectors = first.embed_documents(['a', 'b', 'a'])
+        self.assertEqual(self.model.embedded, ['a', 'b'])
+        self.assertEqual(vectors[0], vectors[2])
+
+        second = CachedEmbeddings(self.model, namespace='model', cache=self.cache)
+        # Cached vectors come back as stored, in float32
+        np.testing.assert_allclose(second.embed_documents(['b', 'c']), [vectors[1], self.model.embed_query('c')], rtol=1e-6)
+        self.assertEqual(self.model.embedded, ['a', 'b', 'c'])
+        self.assertEqual((second.hits, second.misses), (1, 1))
+
+    def test_namespaces_do_not_share_vectors(self):
+        CachedEmbeddings(self.model, namespace='model', cache=self.cache).embed_documents(['a'])
+        CachedEmbeddings(self.model, namespace='model@onnx', cache=self.cache).embed_documents(['a'])
+
+        self.assertEqual(self.model.embedded, ['a', 'a'])
+
+    def test_least_recently_used_vectors_are_evicted(self):
+        # Room for two 16-dimension float32 vectors
+        cache = EmbeddingCache(os.path.join(self.root, 'small.sqlite3'), max_bytes=2 * 16 * 4)
+        cache.set_many({'a': [0.0] * 16, 'b': [1.0] * 16})
+        cache.get_many(['a'])
+        cache.set_many({'c': [2.0] * 16})
+
+        self.assertEqual(sorted(cache.get_many(['a', 'b', 'c'])), ['a', 'c'])
+        self.assertEqual(cache.stats()['size_bytes'], 2 * 16 * 4)
@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.core.files import File
+from django.test import SimpleTestCase, override_settings
+from langchain_core.documents import Document
+
+from chatbot.services.ingestion import iter_batches, iter_chunks, make_text_splitter
+from chatbot.services.vector_index import VectorIndex
+
+from .base import IngestionTestCase
+
+PAGES = [[f"Page {page} line {line} of the manual." for line in range(30)] for page in range(4)]
+
+
+class StreamingTests(SimpleTestCase):
+
+    def test_batches_have_the_requested_size(self):
+        self.assertEqual([len(batch) for batch in iter_batches(range(7), 3)], [3, 3, 1])
+
+    def test_pages_are_split_as_they_are_read(self):
+        read = []
+
+        def pages():
+            for page in range(3):
+                read.append(page)
+                yield Document(page_content="word " * 200, metadata={'page': page})
+
+        chunks = iter_chunks(pages(), make_text_splitter())
+        first = next(chunks)
+
+        self.assertEqual(first.metadata['page'], 0)
+        self.assertEqual(read, [0])
+
+
+class StreamedIngestionTests(IngestionTestCase):
+
+    @override_settings(INGESTION_BATCH_SIZE=4)
+    def test_each_batch_is_written_and_recorded(self):
+        doc = self.create_document(PAGES)
+        progress = []
+        save = doc.__class__.save
+
+        def record_progress(instance, *args, **kwargs):
+            if kwargs.get('update_fields'):
+                progress.append((instance.pages_processed, instance.chunks_ingested))
+            return save(instance, *args, **kwargs)
+
+        with mock.patch.object(VectorIndex, 'upsert', autospec=True, side_effect=VectorIndex.upsert) as upsert, \
+                mock.patch.object(doc.__class__, 'save', autospec=True, side_effect=record_progress):
+            doc = self.ingest(doc)
+
+        batches = [len(call.args[1]) for call in upsert.call_args_list]
+        self.assertGreater(len(batches), 1)
+        self.assertTrue(all(size <= 4 for size in batches))
+        self.assertEqual(sum(batches), doc.chunks_ingested)
+        self.assertEqual((doc.total_pages, doc.pages_processed), (4, 4))
+
+        # Saved after every batch
+        self.assertEqual(len(progress), len(batches))
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(progress[-1][1], doc.chunks_ingested)
+
+
+class IdempotentIngestionTestMixin:
+    """Ingests the same document twice on a backend, subclasses name theirs."""
+
+    def _stored_ids(self, doc):
+        hits = self.vector_store().search_by_vectors([[1.0] * 16], k=1000, filter={'user_document_id': doc.id})[0]
+        return sorted(hit.id for hit, _ in hits)
+
+    def test_ingesting_twice_keeps_one_copy_of_each_chunk(self):
+        doc = self.ingest(self.create_document(PAGES))
+        ids = self._stored_ids(doc)
+
+        doc = self.ingest(doc)
+
+        self.assertEqual(len(ids), doc.chunks_ingested)
+        self.assertEqual(self._stored_ids(doc), ids)
+
+    def test_reingesting_a_shorter_file_drops_the_missing_chunks(self):
+        doc = self.ingest(self.create_document(PAGES))
+
+        with open(self.write_pdf(PAGES[:2]), 'rb') as f:
+            doc.file.save('manual.pdf', File(f))
+        doc = self.ingest(doc)
+
+        ids = self._stored_ids(doc)
+        self.assertEqual(len(ids), doc.chunks_ingested)
+        self.assertTrue(all(':p0:' in chunk_id or ':p1:' in chunk_id for chunk_id in ids))
+
+
+class ChromaIngestionTests(IdempotentIngestionTestMixin, IngestionTestCase):
+    backend = 'chroma'
+
+
+class NumpyIngestionTests(IdempotentIngestionTestMixin, IngestionTestCase):
+    backend = 'numpy'
+
+
+class QuantizedIngestionTests(IdempotentIngestionTestMixin, IngestionTestCase):
+    backend = 'quantized'
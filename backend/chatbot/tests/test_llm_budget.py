@@ -0,0 +1,24 @@
+from django.test import SimpleTestCase
+
+from chatbot.services.llm_budget import LLMCallBudget, LLMCallBudgetExceeded
+
+
+class LLMCallBudgetTests(SimpleTestCase):
+
+    def test_spends_up_to_the_limit(self):
+        budget = LLMCallBudget(limit=2)
+        budget.spend()
+        budget.spend()
+        self.assertEqual(budget.remaining, 0)
+
+        with self.assertRaises(LLMCallBudgetExceeded):
+            budget.spend()
+        self.assertEqual(budget.used, 2)
+
+    def test_refuses_a_batch_that_does_not_fit(self):
+        budget = LLMCallBudget(limit=3)
+        budget.spend()
+        with self.assertRaises(LLMCallBudgetExceeded):
+            budget.spend(3)
+        # Nothing of the refused batch is recorded
+        self.assertEqual(budget.remaining, 2)
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from chatbot.models import ChatMessage, ChatSession
+from chatbot.pagination import encode_cursor
+
+from . import TEST_SETTINGS
+
+
+@override_settings(**TEST_SETTINGS, CHAT_MESSAGE_PAGE_SIZE=50)
+class MessageKeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='pass')
+        cls.session = ChatSession.objects.create(user=cls.user)
+
+        # Pairs of messages share a timestamp, so pages must break ties on the id
+        start = timezone.now() - timedelta(days=1)
+        cls.messages = []
+        for index in range(10):
+            message = ChatMessage.objects.create(session=cls.session, message=f"m{index}", is_from_ai=index % 2 == 1)
+            ChatMessage.objects.filter(id=message.id).update(timestamp=start + timedelta(minutes=index // 2))
+            cls.messages.append(ChatMessage.objects.get(id=message.id))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _page(self, **params):
+        response = self.client.get(reverse('chat_message_list', args=[self.session.id]), {'limit': 3, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def _texts(self, page):
+        return [message['message'] for message in page['results']]
+
+    def test_latest_page_is_oldest_to_newest(self):
+        page = self._page()
+        self.assertEqual(self._texts(page), ['m7', 'm8', 'm9'])
+        self.assertTrue(page['has_more'])
+
+    def test_before_walks_back_without_gaps_or_repeats(self):
+        seen = []
+        page = self._page()
+        while True:
+            seen = self._texts(page) + seen
+            if not page['has_more']:
+                break
+            page = self._page(before=page['before'])
+
+        self.assertEqual(seen, [f"m{index}" for index in range(10)])
+
+    def test_before_excludes_the_cursor_message_on_a_shared_timestamp(self):
+        # m4 and m5 share a timestamp, the page before m5 must end at m4
+        page = self._page(before=encode_cursor(self.messages[5]))
+        self.assertEqual(self._texts(page), ['m2', 'm3', 'm4'])
+
+    def test_after_returns_only_newer_messages(self):
+        page = self._page(after=encode_cursor(self.messages[4]))
+        self.assertEqual(self._texts(page), ['m5', 'm6', 'm7'])
+        self.assertTrue(page['has_more'])
+
+        page = self._page(after=page['after'])
+        self.assertEqual(self._texts(page), ['m8', 'm9'])
+        self.assertFalse(page['has_more'])
+
+    def test_after_the_newest_message_keeps_the_cursor(self):
+        cursor = encode_cursor(self.messages[-1])
+        page = self._page(after=cursor)
+        self.assertEqual(page['results'], [])
+        self.assertEqual(page['after'], cursor)
+
+    def test_rejects_both_cursors_and_bad_cursors(self):
+        url = reverse('chat_message_list', args=[self.session.id])
+        cursor = encode_cursor(self.messages[0])
+        self.assertEqual(self.client.get(url, {'before': cursor, 'after': cursor}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'before': 'not-a-cursor'}).status_code, 400)
+
+    def test_other_users_session_is_not_found(self):
+        other = User.objects.create_user('other', password='pass')
+        self.client.force_authenticate(other)
+        response = self.client.get(reverse('chat_message_list', args=[self.session.id]))
+        self.assertEqual(response.status_code, 404)
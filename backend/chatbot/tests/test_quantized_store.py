@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from chatbot.services.quantized_store import QuantizedVectorStore
+
+
+class QuantizedStoreCompactionTests(SimpleTestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+        self.embeddings = DeterministicFakeEmbedding(size=16)
+
+    def _store(self):
+        return QuantizedVectorStore(self.path, self.embeddings, dtype='int8')
+
+    def _array_files(self):
+        return sorted(name for name in os.listdir(self.path) if name.endswith('.bin'))
+
+    def test_compaction_keeps_live_vectors_searchable(self):
+        store = self._store()
+        texts = [f"chunk {index}" for index in range(20)]
+        store.add_texts(texts, metadatas=[{'user_document_id': 1} for _ in texts], ids=texts)
+
+        # Deleting most rows triggers a compaction into the next generation
+        store.delete(texts[:15])
+        self.assertEqual(len(store), 5)
+        self.assertIn('codes.1.bin', self._array_files())
+
+        for text in texts[15:]:
+            self.assertEqual(store.similarity_search(text, k=1)[0].page_content, text)
+
+    def test_old_generation_stays_readable_until_the_next_compaction(self):
+        store = self._store()
+        texts = [f"chunk {index}" for index in range(20)]
+        store.add_texts(texts, ids=texts)
+
+        # A reader that loaded generation 0 before the compaction
+        reader = self._store()
+        reader.similarity_search(texts[0], k=1)
+        old_codes = reader._snapshot['codes']
+
+        store.delete(texts[:15])
+        self.assertIn('codes.0.bin', self._array_files())
+        self.assertTrue(np.array_equal(old_codes, reader._snapshot['codes']))
+
+        # The next compaction removes generation 0, generation 1 is kept for its readers
+        store.delete(texts[15:18])
+        files = self._array_files()
+        self.assertNotIn('codes.0.bin', files)
+        self.assertIn('codes.1.bin', files)
+        self.assertIn('codes.2.bin', files)
+        self.assertEqual(reader.similarity_search(texts[19], k=1)[0].page_content, texts[19])
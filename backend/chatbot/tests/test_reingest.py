@@ -0,0 +1,29 @@
+from langchain_core.documents import Document
+
+from chatbot.services.model_registry import embedding_namespace
+
+from .base import IngestionTestCase
+
+PAGES = [[f"Page {page} line {line} of the manual." for line in range(30)] for page in range(3)]
+
+
+class LegacyReingestionTests(IngestionTestCase):
+
+    def test_reingesting_a_legacy_document_drops_its_untagged_vectors(self):
+        doc = self.create_document(PAGES, ingestion_status='SUCCESS')
+        # Written by the ingestion before chunks were tagged: random ids, no user_document_id
+        self.vector_store().add_documents([Document(page_content="Old chunk.", metadata={'source': doc.file.path, 'page': 0})])
+
+        doc = self.ingest(doc)
+
+        self.assertEqual(doc.embedding_namespace, embedding_namespace())
+        stored = self.vector_store().get(include=['metadatas'])
+        self.assertEqual(len(stored['ids']), doc.chunks_ingested)
+        self.assertTrue(all(metadata['user_document_id'] == doc.id for metadata in stored['metadatas']))
+
+    def test_ingesting_a_new_document_keeps_other_vectors(self):
+        self.vector_store().add_documents([Document(page_content="Old chunk.", metadata={'page': 0})])
+
+        doc = self.ingest(self.create_document(PAGES))
+
+        self.assertEqual(len(self.vector_store().get(include=[])['ids']), doc.chunks_ingested + 1)
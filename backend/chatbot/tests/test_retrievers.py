@@ -0,0 +1,20 @@
+from django.test import SimpleTestCase
+from langchain_core.documents import Document
+
+from chatbot.services.retrievers import reciprocal_rank_fusion
+
+
+class ReciprocalRankFusionTests(SimpleTestCase):
+
+    def test_chunks_found_by_both_rankings_come_first(self):
+        a, b, c, d = (Document(page_content=text, id=text) for text in 'abcd')
+        fused = reciprocal_rank_fusion([[a, b, c], [d, c, b]], k=60)
+
+        # b and c are in both lists (b: 1/62 + 1/63, c: 1/63 + 1/62), then a and d at rank 1 each
+        self.assertEqual({doc.id for doc in fused[:2]}, {'b', 'c'})
+        self.assertEqual({doc.id for doc in fused[2:]}, {'a', 'd'})
+
+    def test_same_chunk_without_id_is_fused_once(self):
+        first = Document(page_content='text', metadata={'page': 1})
+        again = Document(page_content='text', metadata={'page': 1})
+        self.assertEqual(len(reciprocal_rank_fusion([[first], [again]])), 1)
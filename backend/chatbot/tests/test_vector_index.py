@@ -0,0 +1,78 @@
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from chatbot.services.vector_stores import BACKENDS
+
+
+class VectorIndexTestMixin:
+    """Runs the same checks against every backend, subclasses name theirs."""
+
+    backend = None
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.embeddings = DeterministicFakeEmbedding(size=16)
+        self.store = BACKENDS[self.backend](self.root, 'user_1', self.embeddings)
+
+    def _vector(self, seed):
+        vector = np.random.default_rng(seed).standard_normal(16).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def test_upsert_replaces_the_vector_of_an_unchanged_text(self):
+        metadata = {'user_document_id': 1}
+        self.store.upsert_vectors(['chunk'], [self._vector(1)], ['same text'], [metadata])
+        # Same id and text, another embedding model
+        self.store.upsert_vectors(['chunk'], [self._vector(2)], ['same text'], [metadata])
+
+        [(doc, distance)] = self.store.search_by_vectors([self._vector(2)], k=5)[0]
+        self.assertEqual(doc.id, 'chunk')
+        self.assertAlmostEqual(distance, 0.0, places=2)
+
+    def _ids(self, **kwargs):
+        return sorted(doc.id for doc, _ in self.store.search_by_vectors([self._vector(0)], k=50, **kwargs)[0])
+
+    def test_upserting_the_same_ids_again_adds_nothing(self):
+        ids = [f"doc1:p0:{index}" for index in range(5)]
+        vectors = [self._vector(index) for index in range(5)]
+        metadatas = [{'user_document_id': 1, 'page': 0} for _ in ids]
+
+        self.store.upsert_vectors(ids, vectors, [f"text {index}" for index in range(5)], metadatas)
+        self.store.upsert_vectors(ids, vectors, [f"text {index}" for index in range(5)], metadatas)
+
+        self.assertEqual(self._ids(), ids)
+
+    def test_delete_document_keeps_the_given_ids(self):
+        self.store.upsert_vectors(
+            ['a', 'b', 'c'], [self._vector(1), self._vector(2), self._vector(3)], ['a', 'b', 'c'],
+            [{'user_document_id': 1}, {'user_document_id': 1}, {'user_document_id': 2}]
+        )
+
+        self.assertEqual(self.store.delete_document(1, keep={'a'}), 1)
+        self.assertEqual(self._ids(), ['a', 'c'])
+        self.assertEqual(self._ids(filter={'user_document_id': 1}), ['a'])
+
+    def test_delete_untagged_keeps_document_vectors(self):
+        self.store.upsert_vectors(
+            ['tagged', 'untagged'], [self._vector(1), self._vector(2)], ['tagged text', 'untagged text'],
+            [{'user_document_id': 1}, {'page': 0}]
+        )
+
+        self.assertEqual(self.store.delete_untagged(), 1)
+        self.assertEqual([doc.id for doc, _ in self.store.search_by_vectors([self._vector(2)], k=5)[0]], ['tagged'])
+
+
+class ChromaIndexTests(VectorIndexTestMixin, SimpleTestCase):
+    backend = 'chroma'
+
+
+class NumpyIndexTests(VectorIndexTestMixin, SimpleTestCase):
+    backend = 'numpy'
+
+
+class QuantizedIndexTests(VectorIndexTestMixin, SimpleTestCase):
+    backend = 'quantized'
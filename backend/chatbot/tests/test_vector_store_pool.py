@@ -0,0 +1,61 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from chatbot.services.vector_store_pool import VectorStorePool
+
+
+class VectorStorePoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.opened = []
+        self.version = 0
+        self.version_reads = 0
+        self.now = 1000.0
+
+        def get_corpus_version(user_id):
+            self.version_reads += 1
+            return self.version
+
+        for target, replacement in (
+            ('chatbot.services.vector_store_pool.get_corpus_version', get_corpus_version),
+            ('chatbot.services.vector_store_pool.time.monotonic', lambda: self.now),
+        ):
+            patcher = mock.patch(target, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.pool = VectorStorePool(self._open, max_size=2, idle_timeout=600, version_check_interval=2)
+
+    def _open(self, user_id):
+        self.opened.append(user_id)
+        return object()
+
+    def test_version_is_only_read_after_the_check_interval(self):
+        handle = self.pool.get(1)
+        self.now += 1
+        self.assertIs(self.pool.get(1), handle)
+        self.assertEqual(self.version_reads, 1)
+
+        self.now += 2
+        self.assertIs(self.pool.get(1), handle)
+        self.assertEqual(self.version_reads, 2)
+
+    def test_new_corpus_version_reopens_once_checked(self):
+        handle = self.pool.get(1)
+        self.version = 1
+
+        self.assertIs(self.pool.get(1), handle)
+        self.now += 2
+        self.assertIsNot(self.pool.get(1), handle)
+        self.assertEqual(self.opened, [1, 1])
+
+    def test_least_recently_used_handle_is_closed_first(self):
+        self.pool.get(1)
+        self.pool.get(2)
+        self.pool.get(1)
+        self.pool.get(3)
+
+        self.pool.get(1)
+        self.pool.get(2)
+        self.assertEqual(self.opened, [1, 2, 3, 2])
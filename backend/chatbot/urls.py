@@ -4,14 +4,22 @@
 from django.urls import path
 from .views import (
     SendMessageAPIView,
+    StreamMessageAPIView,
     ChatSessionListCreateView,
-    ChatSessionDetailView
+    ChatSessionDetailView,
+    ChatMessageListView,
+    ChatAnswerJobView,
+    MetricsView
 )
 
 urlpatterns  = [
     # path('chat/',ChatAPIView.as_view(),name="chat_api"),
 
     path('sessions/<int:session_id>/send/', SendMessageAPIView.as_view(), name='send_message'),
+    path('sessions/<int:session_id>/send/stream/', StreamMessageAPIView.as_view(), name='send_message_stream'),
     path('sessions/', ChatSessionListCreateView.as_view(), name='chat_session_list'),
     path('sessions/<int:pk>/', ChatSessionDetailView.as_view(), name='chat_session_detail'),
+    path('sessions/<int:session_id>/messages/', ChatMessageListView.as_view(), name='chat_message_list'),
+    path('jobs/<str:job_id>/', ChatAnswerJobView.as_view(), name='chat_answer_job'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
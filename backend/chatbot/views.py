@@ -1,5 +1,22 @@
 # from django.shortcuts import render
 
+import asyncio
+import contextvars
+import hmac
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db.models import Count, Max
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from prometheus_client import CONTENT_TYPE_LATEST
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
@@ -7,24 +24,37 @@ from rest_framework import status, generics
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
 from .services.rag_pipeline import ChatBot
+from .services.answer_jobs import enqueue_answer, get_job, public_job
 from .services.chatbot_service import get_bot_instance
+from .services.metrics import render_metrics
+from .services.tracing import make_request_id
 
-from .models import ChatSession
-from .serializers import ChatSessionSerializer
+from .models import ChatMessage, ChatSession
+from .pagination import ChatSessionPagination, MessageKeysetPagination
+from .serializers import ChatMessageSerializer, ChatSessionListSerializer, ChatSessionSerializer
 from chatbot.tasks import generate_chat_title
+from users.models import UserDocument
 
 
 # --- view for managing chat sessions ---
 class ChatSessionListCreateView(generics.ListCreateAPIView):
     """
-    API view to retrieve list of chat sessions or create a new one.
+    API view to retrieve a page of the user's chat sessions (newest first, without their
+    messages) or create a new one. Messages are served by the detail view.
     """
-    serializer_class = ChatSessionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ChatSessionPagination
+
+    def get_serializer_class(self):
+        # A created session is returned in full, like the detail view does
+        return ChatSessionSerializer if self.request.method == 'POST' else ChatSessionListSerializer
 
     def get_queryset(self):
-        # Only return sessions belonging to the logged-in user
-        return ChatSession.objects.filter(user=self.request.user)
+        # Only return sessions belonging to the logged-in user, with their message stats in the same query
+        return ChatSession.objects.filter(user=self.request.user).annotate(
+            message_count=Count('messages'),
+            last_message_at=Max('messages__timestamp')
+        ).order_by('-created_at', '-id')
 
     def perform_create(self, serializer):
         # Automatically associate the new session with the logged-in user
@@ -32,19 +62,177 @@ class ChatSessionListCreateView(generics.ListCreateAPIView):
 
 
 # --- view for retrieving a single session's history ---
-class ChatSessionDetailView(generics.RetrieveAPIView):
+class ChatSessionDetailView(generics.RetrieveUpdateAPIView):
     """
-    API view to retrieve a single chat session with all its messages.
+    API view to retrieve a single chat session with all its messages,
+    or update it (title, pinned_documents).
     """
     serializer_class = ChatSessionSerializer
     permission_classes = [IsAuthenticated]
-    queryset = ChatSession.objects.all()
+
+    def get_queryset(self):
+        # Only the logged-in user's sessions can be read or changed
+        return ChatSession.objects.filter(user=self.request.user)
+
+
+# --- view for paging through a session's messages ---
+class ChatMessageListView(generics.ListAPIView):
+    """
+    A session's messages, a page at a time (see MessageKeysetPagination): the latest page first,
+    then older pages with ?before=<cursor>, or only new messages with ?after=<cursor>.
+    """
+    serializer_class = ChatMessageSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = MessageKeysetPagination
+
+    def get_queryset(self):
+        # Only the logged-in user's sessions can be read
+        session = generics.get_object_or_404(ChatSession, id=self.kwargs['session_id'], user=self.request.user)
+        return ChatMessage.objects.filter(session=session)
 
 
 # --- view for sending a message ---
-class SendMessageAPIView(APIView):
+@method_decorator(csrf_exempt, name='dispatch')
+class SendMessageAPIView(View):
     """
     API View to handle sending a message to a specific chat session.
+    This is a native async Django view (DRF views are sync only): while the
+    LLM is generating, the worker is free to serve other chats.
+    With CHAT_ANSWER_MODE = 'celery' the answer is generated by a celery worker instead
+    and the response is 202 with the job to poll (see ChatAnswerJobView).
+    """
+
+    async def post(self, request, *args, **kwargs):
+
+        try:
+            user = await authenticate_jwt(request)
+        except AuthenticationFailed as e:
+            # Same body DRF's exception handler would send
+            detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+            return JsonResponse(detail, status=status.HTTP_401_UNAUTHORIZED)
+
+        if user is None:
+            return JsonResponse(
+                {'detail': 'Authentication credentials were not provided.'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        session_id = kwargs.get('session_id')
+        try:
+            data = json.loads(request.body or b'{}')
+            user_message = data.get('message')
+        except (ValueError, AttributeError):
+            data, user_message = {}, None
+
+        if not session_id or not user_message:
+            return JsonResponse(
+                {'error': 'session_id and message are required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            document_ids = await sync_to_async(resolve_document_ids)(user, data.get('document_ids'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # Ensure session belongs to the current user
+            session = await ChatSession.objects.aget(id=session_id, user=user)
+            # Check if this is the first message from the user in this session
+            is_first_message = not await session.messages.filter(is_from_ai=False).aexists()
+
+        except ChatSession.DoesNotExist:
+            return JsonResponse(
+                {'error': 'Chat session not found or access denied.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        # A proxy or client may send its own id, so its logs line up with our trace
+        request_id = make_request_id(request.headers.get('X-Request-ID'))
+
+        if settings.CHAT_ANSWER_MODE == 'celery':
+            job = await sync_to_async(enqueue_answer)(user.id, session, user_message, document_ids, request_id)
+
+            status_url = reverse('chat_answer_job', args=[job['job_id']])
+            response = JsonResponse(
+                {'job_id': job['job_id'], 'status': job['status'], 'status_url': status_url, 'request_id': request_id},
+                status=status.HTTP_202_ACCEPTED
+            )
+            response['Location'] = status_url
+
+        else:
+            # First call loads the models, don't do that on the event loop
+            bot = await sync_to_async(get_bot_instance)()
+            # Pass the session to the aask method to handle history
+            bot_response = await bot.aask(user_message, session, document_ids, request_id)
+
+            response = JsonResponse(bot_response, status=status.HTTP_200_OK)
+
+        # --- TRIGGERING BACKGROUND TASK ---
+        if is_first_message:
+            await sync_to_async(generate_chat_title.delay)(session.id)
+
+        response['X-Request-ID'] = request_id
+        return response
+
+
+# --- view for polling an answer generated in the background ---
+class ChatAnswerJobView(APIView):
+    """
+    Status of an answer job started by SendMessageAPIView in 'celery' mode: PENDING, PROCESSING,
+    SUCCESS or FAILURE. Once finished, 'result' holds the same body the synchronous send returns.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id, *args, **kwargs):
+
+        job = get_job(job_id, request.user.id)
+        if job is None:
+            return Response(
+                {'error': 'Job not found or access denied.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(public_job(job))
+
+
+async def authenticate_jwt(request):
+    """
+    Authenticates a plain (non-DRF) request with the SimpleJWT bearer token.
+    Returns the user, or None if no token was sent. Raises AuthenticationFailed for a bad token.
+    """
+    result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    return result[0] if result else None
+
+
+def resolve_document_ids(user, document_ids):
+    """
+    Validates the optional 'document_ids' a message was sent with.
+    Returns the ids, or None when no documents were selected (the session's pins apply then).
+    Raises ValueError if the ids are malformed or not all of them are the user's documents.
+    """
+    if not document_ids:
+        return None
+
+    if not isinstance(document_ids, list) or not all(isinstance(i, int) for i in document_ids):
+        raise ValueError('document_ids must be a list of document IDs.')
+
+    document_ids = sorted(set(document_ids))
+    if UserDocument.objects.filter(user=user, id__in=document_ids).count() != len(document_ids):
+        raise ValueError('Documents not found or access denied.')
+
+    return document_ids
+
+
+# --- view for sending a message and streaming the answer back ---
+class StreamMessageAPIView(APIView):
+    """
+    Streaming variant of SendMessageAPIView. The answer is sent as server-sent events:
+    one 'token' event per generated token, then a final 'sources' event once the
+    complete answer has been saved (or an 'error' event).
+    Serve it through the ASGI app (core/asgi.py) so a stream doesn't hold a worker thread.
+    Under WSGI it still streams, but holds the worker thread until the answer is complete.
     """
 
     permission_classes = [IsAuthenticated]
@@ -60,6 +248,11 @@ class SendMessageAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        try:
+            document_ids = resolve_document_ids(request.user, request.data.get('document_ids'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
             # Ensure session belongs to the current user
             session = ChatSession.objects.get(id=session_id, user=request.user)
@@ -71,16 +264,70 @@ class SendMessageAPIView(APIView):
                 {'error': 'Chat session not found or access denied.'},
                 status=status.HTTP_404_NOT_FOUND
             )
-        
+
         bot = get_bot_instance()
-        # Pass the session to the ask method to handle history
-        bot_response = bot.ask(user_message, session)
+        request_id = make_request_id(request.headers.get('X-Request-ID'))
 
-        # --- TRIGGERING BACKGROUND TASK ---
+        events = self._event_stream(bot, user_message, session, document_ids, is_first_message, request_id)
+        if isinstance(request._request, WSGIRequest):
+            # Django's WSGI handler would collect an async iterator into a list before sending anything
+            events = self._iterate_in_loop(events)
+
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        # Stop proxies (nginx) and browsers from buffering the stream
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        response['X-Request-ID'] = request_id
+        return response
+
+    @staticmethod
+    async def _event_stream(bot, user_message, session, document_ids, is_first_message, request_id):
+
+        async for event in bot.astream(user_message, session, document_ids, request_id):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+        # --- TRIGGERING BACKGROUND TASK --- (the user's message is saved by now)
         if is_first_message:
-            generate_chat_title.delay(session.id)
-        
-        return Response(bot_response, status=status.HTTP_200_OK)
+            await sync_to_async(generate_chat_title.delay)(session.id)
+
+    @staticmethod
+    def _iterate_in_loop(stream):
+        """
+        Iterates an async iterator from sync code on an event loop of its own, yielding each item as
+        soon as it is produced.
+        """
+        loop = asyncio.new_event_loop()
+        # Every step runs in the same context, so context variables the stream sets (its trace) persist
+        context = contextvars.copy_context()
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(loop.create_task(stream.__anext__(), context=context))
+                except StopAsyncIteration:
+                    return
+        finally:
+            loop.run_until_complete(loop.create_task(stream.aclose(), context=context))
+            loop.close()
+
+
+# --- view for the Prometheus metrics scrape ---
+class MetricsView(View):
+    """
+    Chat pipeline histograms (request and stage latency, LLM calls, tokens, retrieved documents)
+    in the Prometheus text format. Requires `Authorization: Bearer <METRICS_AUTH_TOKEN>`, and is
+    closed to everyone while METRICS_AUTH_TOKEN is not set.
+    """
+
+    def get(self, request, *args, **kwargs):
+
+        token = settings.METRICS_AUTH_TOKEN
+        if not token:
+            return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+
+        return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
 
 
 
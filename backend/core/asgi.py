@@ -2,6 +2,10 @@
 ASGI config for chatbot project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django, WebSockets (chatbot/routing.py) to the Channels consumers, authenticated
+with the SimpleJWT access token and only from the origins the frontend is served on.
+Serve it with an ASGI server (`uvicorn core.asgi:application`, see the Dockerfile), the WSGI
+`manage.py runserver` doesn't serve the WebSocket routes.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -17,4 +21,25 @@ load_dotenv()
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+# Sets up Django, so it must come before anything importing models
+django_asgi_application = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.security.websocket import OriginValidator
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+from chatbot.middleware import JWTAuthMiddleware
+from chatbot.routing import websocket_urlpatterns
+
+if settings.DEBUG:
+    # What runserver does in development: serve the admin's static files without collectstatic
+    django_asgi_application = ASGIStaticFilesHandler(django_asgi_application)
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_application,
+    'websocket': OriginValidator(
+        JWTAuthMiddleware(URLRouter(websocket_urlpatterns)),
+        settings.CORS_ALLOWED_ORIGINS
+    ),
+})
@@ -1,6 +1,7 @@
 
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 import django
 from django.conf import settings 
 from dotenv import load_dotenv
@@ -13,4 +14,11 @@ django.setup()
 
 app = Celery('core')
 app.config_from_object('django.conf:settings', namespace='CELERY')
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+
+@worker_process_init.connect
+def load_worker_models(**kwargs):
+    # Load the embedding model once per worker process instead of once per task
+    from chatbot.services.model_registry import preload_models
+    preload_models()
@@ -110,6 +110,12 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Chat sessions per page of GET /api/sessions/, newest first and cursor-paginated (the client can ask
+# for up to 200 with ?page_size=)
+CHAT_SESSION_PAGE_SIZE = 50
+# Messages per page of GET /api/sessions/<id>/messages/ (up to 200 with ?limit=)
+CHAT_MESSAGE_PAGE_SIZE = 50
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
@@ -176,4 +182,149 @@ CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
-CELERY_RESULT_SERIALIZER = 'json'
\ No newline at end of file
+CELERY_RESULT_SERIALIZER = 'json'
+# Answers generated in the background get their own queue, so a burst of chats doesn't wait behind
+# document ingestion and the LLM-bound workers can be scaled on their own:
+#   celery -A core worker -Q chat_answers --concurrency=16
+CELERY_TASK_ROUTES = {
+    'chatbot.tasks.generate_answer': {'queue': 'chat_answers'},
+}
+
+# Shared cache (per-user corpus versions etc.), must be visible to both web and celery processes
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+    }
+}
+
+# Channel layer the WebSocket consumers (chatbot/consumers.py) receive pushed events on: answer
+# tokens are sent directly, titles, answer jobs and ingestion progress come from the celery workers
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {'hosts': ['redis://localhost:6379/2']},
+    }
+}
+
+# Sentence-transformer used for every embedding (ingestion and queries), loaded once per process
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Runtime it runs on (see chatbot/services/embedding_runtime.py): 'torch', 'torch-int8' (dynamically
+# quantized Linear layers), 'onnx' or 'onnx-int8' (ONNX Runtime on the exports in EMBEDDING_ONNX_FILES).
+# EMBEDDING_THREADS caps intra-op threads per process (0 = library default; for celery, cores / concurrency).
+# EMBEDDING_BATCH_SIZE 0 uses the batch size picked by `python manage.py tune_embeddings`, which also
+# rejects a runtime whose vectors fall below EMBEDDING_PARITY_MIN_COSINE against torch.
+# Every document records the runtime its vectors were built with. After switching runtimes, web and
+# worker processes log a warning until `python manage.py reingest_documents` has rebuilt the others.
+EMBEDDING_RUNTIME = os.environ.get('EMBEDDING_RUNTIME', 'torch')
+EMBEDDING_THREADS = int(os.environ.get('EMBEDDING_THREADS', 0))
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 0))
+EMBEDDING_ONNX_FILES = {
+    'onnx': 'onnx/model.onnx',
+    'onnx-int8': 'onnx/model_quint8_avx2.onnx',
+}
+EMBEDDING_TUNING_PATH = os.path.join(BASE_DIR, 'embedding_cache', 'tuning.json')
+EMBEDDING_PARITY_MIN_COSINE = 0.99
+
+# Embedding cache (content-addressed, shared by every user's ingestion)
+EMBEDDING_CACHE_PATH = os.path.join(BASE_DIR, 'embedding_cache', 'embeddings.sqlite3')
+EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get('EMBEDDING_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Chunks embedded and written to the vector store per batch during ingestion (bounds worker memory)
+INGESTION_BATCH_SIZE = 64
+
+# Hybrid retrieval: per-user BM25 keyword indexes (SQLite FTS5), searched next to the vector
+# store and combined with reciprocal rank fusion (HYBRID_RRF_K is the usual rank constant)
+KEYWORD_INDEX_DIR = os.path.join(BASE_DIR, 'keyword_index')
+HYBRID_SEARCH_ENABLED = True
+HYBRID_RRF_K = 60
+
+# Context packing before each prompt: retrieved chunks are taken in MMR order (CONTEXT_MMR_LAMBDA:
+# 1 = relevance only, 0 = diversity only), near-duplicates above CONTEXT_DUPLICATE_SIMILARITY (cosine)
+# are dropped, overlapping chunks of a page are merged, and at most CONTEXT_ESTIMATED_TOKEN_BUDGET tokens
+# are kept. Tokens are estimated from the text length (~4 characters per token, see context_packing.py),
+# not counted with the answer model's tokenizer, so leave some headroom below the model's context window.
+CONTEXT_ESTIMATED_TOKEN_BUDGET = int(os.environ.get('CONTEXT_ESTIMATED_TOKEN_BUDGET', 1500))
+CONTEXT_DUPLICATE_SIMILARITY = 0.95
+CONTEXT_MMR_LAMBDA = 0.7
+
+# Vector store backend (see chatbot/services/vector_stores.py): 'chroma', 'numpy' (in-process brute
+# force over memory-mapped float32 vectors), or 'quantized' (same, storing QUANTIZED_VECTOR_DTYPE codes,
+# 'int8' / 'float16', the best k * QUANTIZED_RESCORE_FACTOR candidates are rescored exactly).
+# int8 is 4x smaller than float32 and scans as fast, float16 is 2x smaller but slower to scan on CPUs.
+# Compare recall with `python manage.py evaluate_vector_recall`, speed with `run_benchmarks vector_index`.
+VECTOR_STORE_BACKEND = os.environ.get('VECTOR_STORE_BACKEND', 'chroma')
+NUMPY_VECTOR_DIR = os.path.join(BASE_DIR, 'numpy_vectors')
+QUANTIZED_VECTOR_DIR = os.path.join(BASE_DIR, 'quantized_vectors')
+QUANTIZED_VECTOR_DTYPE = os.environ.get('QUANTIZED_VECTOR_DTYPE', 'int8')
+QUANTIZED_RESCORE_FACTOR = 4
+
+# Per-user vector store handles kept open by the ChatBot singleton
+VECTOR_STORE_POOL_SIZE = 128
+VECTOR_STORE_POOL_IDLE_SECONDS = 600
+# A handle is reused without re-reading its user's corpus version (a Redis round trip) for this long,
+# so newly ingested documents can take up to this many seconds to show up in answers
+VECTOR_STORE_POOL_VERSION_CHECK_SECONDS = 2
+
+# Chat pipeline mode: 'standard' (multi-query, router, condense and answer calls) or
+# 'fast' (routing + condensing in one call, retrieved documents reused for the answer)
+CHAT_PIPELINE_MODE = os.environ.get('CHAT_PIPELINE_MODE', 'standard')
+# Max LLM calls per question in 'fast' mode: 1 = answer only, 2 = + route/condense, 3 = + multi-query expansion
+CHAT_LLM_CALL_BUDGET = int(os.environ.get('CHAT_LLM_CALL_BUDGET', 2))
+
+# Where POST /api/sessions/<id>/send/ answers: 'sync' (in the request, the response is the answer) or
+# 'celery' (the question is saved, the answer is generated by the `generate_answer` task on the
+# chat_answers queue and the response is 202 with a job to poll at /api/jobs/<job_id>/).
+# Web capacity then follows the request rate instead of the LLM latency.
+CHAT_ANSWER_MODE = os.environ.get('CHAT_ANSWER_MODE', 'sync')
+# How long a finished (or abandoned) job can still be polled
+CHAT_ANSWER_JOB_TTL_SECONDS = 60 * 60
+# A generate_answer run still going after this long is stopped and its job marked FAILURE
+CHAT_ANSWER_SOFT_TIME_LIMIT_SECONDS = 120
+
+# Chat history sent to the LLM: the last N user/AI turns verbatim plus a rolling summary of everything
+# older, refreshed in celery once SUMMARY_BATCH messages have scrolled out of the window
+CHAT_HISTORY_WINDOW_TURNS = 6
+CHAT_HISTORY_SUMMARY_BATCH = 6
+# A queued summary run blocks new ones for its session until it ends, or this long if its worker died
+CHAT_HISTORY_SUMMARY_PENDING_SECONDS = 10 * 60
+
+# Semantic answer cache: an opening question (no earlier turns in its session) whose embedding is
+# this similar to an already answered one (same user, unchanged documents) gets the stored answer
+# without any LLM call. Follow-ups depend on their conversation and always go through the pipeline.
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95
+ANSWER_CACHE_TTL_SECONDS = 24 * 60 * 60
+# Entries per user, the oldest is replaced once they are all used
+ANSWER_CACHE_MAX_ENTRIES = 50
+
+# Chat request tracing (chatbot/services/tracing.py): every request is logged as one JSON line
+# (stage timings, LLM calls, tokens, retrieved documents, route) and added to the Prometheus
+# histograms served at /api/metrics/. The scraper must send METRICS_AUTH_TOKEN as a bearer token,
+# while it is unset the endpoint answers 403 to everyone.
+# Histograms live in the process that observed them. Answers generated by the celery worker
+# (CHAT_ANSWER_MODE = 'celery') are only reported if the web processes and the worker run with the
+# same PROMETHEUS_MULTIPROC_DIR environment variable: an empty directory on a volume they all
+# mount, wiped before they start (see chatbot/services/metrics.py). Without it /api/metrics/ only
+# shows requests answered in the web process that served the scrape.
+METRICS_AUTH_TOKEN = os.environ.get('METRICS_AUTH_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'chatbot.services.tracing': {
+            'handlers': ['console'],
+            'level': os.environ.get('CHAT_TRACE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'chatbot': {
+            'handlers': ['console'],
+            'level': os.environ.get('CHAT_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
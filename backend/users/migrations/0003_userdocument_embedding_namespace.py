@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_userdocument_ingestion_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdocument',
+            name='embedding_namespace',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
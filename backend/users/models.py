@@ -18,5 +18,16 @@ class UserDocument(models.Model):
         default='PENDING'
     )
 
+    # Ingestion progress, updated as each embedding batch is written to the vector store
+    total_pages = models.PositiveIntegerField(null=True, blank=True)
+
+    pages_processed = models.PositiveIntegerField(default=0)
+
+    chunks_ingested = models.PositiveIntegerField(default=0)
+
+    # Embedding model and runtime the document's vectors were built with (see embedding_namespace()),
+    # empty until its first successful ingestion
+    embedding_namespace = models.CharField(max_length=255, blank=True, default='')
+
     def __str__(self):
         return f"{self.original_filename} ({self.user.username})"
\ No newline at end of file
@@ -25,8 +25,8 @@ class UserDocumentSerializer(serializers.ModelSerializer):
 
         model = UserDocument
         
-        fields = ['id', 'file', 'original_filename', 'uploaded_at', 'ingestion_status']
+        fields = ['id', 'file', 'original_filename', 'uploaded_at', 'ingestion_status', 'total_pages', 'pages_processed', 'chunks_ingested']
         # fields: Defines all the fields that will be visible in the API response.
 
-        read_only_fields = ['id', 'original_filename', 'uploaded_at', 'ingestion_status']
+        read_only_fields = ['id', 'original_filename', 'uploaded_at', 'ingestion_status', 'total_pages', 'pages_processed', 'chunks_ingested']
         # read_only_fields: Defines a subset of those fields that the client is not allowed to write to.
@@ -1,19 +1,68 @@
 import React, { useState, useEffect, useRef } from 'react';
-import { sendMessage } from '../services/api';
+import { streamMessage, getSessionMessages, openSocket } from '../services/api';
 
 function ChatWindow({ activeSession, onNewMessage }) {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
+  // Cursor of the oldest loaded message, null once the start of the chat is loaded
+  const [olderCursor, setOlderCursor] = useState(null);
   const messagesEndRef = useRef(null);
+  // Set while prepending older messages so the list doesn't jump to the bottom
+  const keepScrollRef = useRef(false);
+  // The session's WebSocket, messages go through it while it is open (SSE otherwise)
+  const socketRef = useRef(null);
+  const onNewMessageRef = useRef(onNewMessage);
+  onNewMessageRef.current = onNewMessage;
 
+  // Only when another session is opened, a title update must not reset the messages
   useEffect(() => {
     setMessages(activeSession ? activeSession.messages : []);
-  }, [activeSession]);
+    setOlderCursor(activeSession && activeSession.hasOlderMessages ? activeSession.olderMessagesCursor : null);
+  }, [activeSession?.id]);
 
   useEffect(() => {
+    if (!activeSession) return;
+
+    const socket = openSocket(`sessions/${activeSession.id}/`);
+    socket.onmessage = (e) => {
+      const event = JSON.parse(e.data);
+      if (event.type === 'token') updateBotMessage(botMessage => ({ message: botMessage.message + event.data }));
+      else if (event.type === 'sources') updateBotMessage(() => ({ sources: event.data.sources }));
+      else if (event.type === 'error') updateBotMessage(() => ({ message: 'Sorry, I encountered an error.' }));
+      else if (event.type === 'title') onNewMessageRef.current(event.session_id, event.title);
+      // CHAT_ANSWER_MODE = 'celery': the whole answer arrives once the worker is done
+      else if (event.type === 'answer_job' && event.status === 'SUCCESS') updateBotMessage(() => ({ message: event.result.answer, sources: event.result.sources }));
+      else if (event.type === 'answer_job' && event.status === 'FAILURE') updateBotMessage(() => ({ message: 'Sorry, I encountered an error.' }));
+    };
+    socketRef.current = socket;
+
+    return () => socket.close();
+  }, [activeSession?.id]);
+
+  useEffect(() => {
+    if (keepScrollRef.current) {
+      keepScrollRef.current = false;
+      return;
+    }
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [messages]);
 
+  const handleLoadOlder = async () => {
+    try {
+      const response = await getSessionMessages(activeSession.id, { before: olderCursor });
+      keepScrollRef.current = true;
+      setMessages(prev => [...response.data.results, ...prev]);
+      setOlderCursor(response.data.has_more ? response.data.before : null);
+    } catch (error) {
+      console.error("Failed to load earlier messages:", error);
+    }
+  };
+
+  // Applies an update to the last message, the bot's answer being streamed
+  const updateBotMessage = (update) => {
+    setMessages(prev => [...prev.slice(0, -1), { ...prev[prev.length - 1], ...update(prev[prev.length - 1]) }]);
+  };
+
   const handleSend = async () => {
     if (!input.trim() || !activeSession) return;
 
@@ -25,22 +74,31 @@ function ChatWindow({ activeSession, onNewMessage }) {
     setMessages(prev => [...prev, userMessage]);
     setInput('');
 
-    try {
-      const response = await sendMessage(activeSession.id, input);
-      const botMessage = { is_from_ai: true, message: response.data.answer, sources: response.data.sources };
-      // Update the UI with the bot's response
-      setMessages(prev => [...prev, botMessage]);
+    // Placeholder for the bot's answer, filled in as tokens stream in
+    setMessages(prev => [...prev, { is_from_ai: true, message: '' }]);
 
-      // If it was the first message, trigger the title update
-      if (isFirstMessage) {
-        const newTitle = input.substring(0, 30) + (input.length > 30 ? '...' : '');
-        onNewMessage(activeSession.id, newTitle);
-      }
+    // Until the generated title arrives as a 'title' event
+    if (isFirstMessage) {
+      const newTitle = input.substring(0, 30) + (input.length > 30 ? '...' : '');
+      onNewMessage(activeSession.id, newTitle);
+    }
+
+    const socket = socketRef.current;
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      // Tokens, sources and the title come back through socket.onmessage
+      socket.send(JSON.stringify({ type: 'message', message: input }));
+      return;
+    }
+
+    try {
+      const result = await streamMessage(activeSession.id, input, (token) => {
+        updateBotMessage(botMessage => ({ message: botMessage.message + token }));
+      });
+      updateBotMessage(() => ({ sources: result ? result.sources : [] }));
 
     } catch (error) {
       console.error("Error sending message:", error);
-      const errorMessage = { is_from_ai: true, message: 'Sorry, I encountered an error.' };
-      setMessages(prev => [...prev, errorMessage]);
+      updateBotMessage(() => ({ message: 'Sorry, I encountered an error.' }));
     }
   };
 
@@ -51,6 +109,9 @@ function ChatWindow({ activeSession, onNewMessage }) {
   return (
     <div className="chat-window">
       <div className="message-list">
+        {olderCursor && (
+          <button className="load-more-btn" onClick={handleLoadOlder}>Load earlier messages</button>
+        )}
         {messages.map((msg, index) => (
           // Use the 'is_from_ai' field from our database model
           <div key={index} className={`message ${msg.is_from_ai ? 'ai' : 'user'}`}>
@@ -1,7 +1,7 @@
 import React from 'react';
 import { useAuth } from '../context/AuthContext';
 
-function Sidebar({ sessions, onSessionSelect, onCreateNew }) {
+function Sidebar({ sessions, onSessionSelect, onCreateNew, hasMore, onLoadMore }) {
     const { user } = useAuth();
 
   return (
@@ -19,6 +19,11 @@ function Sidebar({ sessions, onSessionSelect, onCreateNew }) {
             {session.title}
           </div>
         ))}
+        {hasMore && (
+          <button className="load-more-btn" onClick={onLoadMore}>
+            Load older chats
+          </button>
+        )}
       </div>
       <div className="user-profile">
         {user && <span>Welcome, {user.username}</span>}
@@ -8,18 +8,22 @@ import '../App.css';
 function ChatPage() {
   const [sessions, setSessions] = useState([]);
   const [activeSession, setActiveSession] = useState(null);
+  // Cursor of the next page of the session list, null once everything is loaded
+  const [nextCursor, setNextCursor] = useState(null);
   // --- FIX 1: DEFINE THE MISSING STATE ---
   const [isSidebarVisible, setIsSidebarVisible] = useState(true);
 
+  const loadSessions = async (cursor = null) => {
+    try {
+      const response = await getChatSessions(cursor);
+      setSessions(prevSessions => cursor === null ? response.data.results : [...prevSessions, ...response.data.results]);
+      setNextCursor(response.data.next ? new URL(response.data.next).searchParams.get('cursor') : null);
+    } catch (error) {
+      console.error("Failed to load sessions:", error);
+    }
+  };
+
   useEffect(() => {
-    const loadSessions = async () => {
-      try {
-        const response = await getChatSessions();
-        setSessions(response.data);
-      } catch (error) {
-        console.error("Failed to load sessions:", error);
-      }
-    };
     loadSessions();
   }, []);
 
@@ -37,7 +41,14 @@ function ChatPage() {
   const handleSessionSelect = async (sessionId) => {
     try {
       const response = await getSessionMessages(sessionId);
-      setActiveSession(response.data);
+      const session = sessions.find(s => s.id === sessionId);
+      // Only the latest messages, ChatWindow loads older pages from the 'before' cursor
+      setActiveSession({
+        ...session,
+        messages: response.data.results,
+        hasOlderMessages: response.data.has_more,
+        olderMessagesCursor: response.data.before,
+      });
     } catch (error) {
       console.error("Failed to load session messages:", error);
     }
@@ -66,6 +77,8 @@ function ChatPage() {
         sessions={sessions} 
         onSessionSelect={handleSessionSelect}
         onCreateNew={handleCreateNewSession}
+        hasMore={nextCursor !== null}
+        onLoadMore={() => loadSessions(nextCursor)}
       />
       <div className="main-content">
         <header className="app-header">
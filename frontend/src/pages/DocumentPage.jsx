@@ -2,7 +2,7 @@ import React, { useState, useEffect } from 'react';
 // --- FIX 1: Import useNavigate ---
 import { Link, useNavigate } from 'react-router-dom';
 // --- FIX 2: Remove the duplicate import ---
-import { getDocuments, uploadDocument } from '../services/api'; 
+import { getDocuments, uploadDocument, openSocket } from '../services/api'; 
 import '../App.css';
 
 function DocumentPage() {
@@ -25,6 +25,21 @@ function DocumentPage() {
       }
     };
     fetchDocuments();
+
+    // Ingestion progress is pushed as the worker processes each batch
+    const socket = openSocket('documents/');
+    socket.onmessage = (e) => {
+      const event = JSON.parse(e.data);
+      if (event.type !== 'document_status') return;
+      setDocuments(prev => prev.map(doc => doc.id === event.document_id ? {
+        ...doc,
+        ingestion_status: event.status,
+        total_pages: event.total_pages,
+        pages_processed: event.pages_processed,
+        chunks_ingested: event.chunks_ingested,
+      } : doc));
+    };
+    return () => socket.close();
   }, []);
 
   const handleFileChange = (e) => {
@@ -86,6 +101,7 @@ function DocumentPage() {
                   <span>&#128442; {doc.original_filename}</span>
                   <span className={`status status-${doc.ingestion_status.toLowerCase()}`}>
                     {doc.ingestion_status}
+                    {doc.ingestion_status === 'PROCESSING' && doc.total_pages ? ` ${doc.pages_processed}/${doc.total_pages} pages` : ''}
                   </span>
                 </li>
               ))}
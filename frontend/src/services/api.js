@@ -29,7 +29,56 @@ export const uploadDocument = (file) => {
 };
 
 // --- ADD THESE NEW CHAT FUNCTIONS ---
-export const getChatSessions = () => api.get('sessions/');
+// One page of sessions (newest first, without messages): { next, previous, results }.
+// Pass the cursor from a page's `next` link to get the page after it, null for the first page.
+export const getChatSessions = (cursor = null) => api.get('sessions/', { params: cursor ? { cursor } : {} });
 export const createChatSession = (title = "New Chat") => api.post('sessions/', { title });
-export const getSessionMessages = (sessionId) => api.get(`sessions/${sessionId}/`);
-export const sendMessage = (sessionId, message) => api.post(`sessions/${sessionId}/send/`, { message });
\ No newline at end of file
+// Latest page of a session's messages, or the page before / after a cursor from a previous page
+export const getSessionMessages = (sessionId, { before, after } = {}) => api.get(`sessions/${sessionId}/messages/`, { params: { before, after } });
+// documentIds (optional) limits the answer to those uploaded documents
+export const sendMessage = (sessionId, message, documentIds) => api.post(`sessions/${sessionId}/send/`, { message, document_ids: documentIds });
+// With CHAT_ANSWER_MODE = 'celery' sendMessage returns 202 and a job id, poll it until SUCCESS / FAILURE
+export const getAnswerJob = (jobId) => api.get(`jobs/${jobId}/`);
+// Pins a session to a set of documents, an empty list searches all of them again
+export const pinSessionDocuments = (sessionId, documentIds) => api.patch(`sessions/${sessionId}/`, { pinned_documents: documentIds });
+// WebSocket on the API host ('sessions/<id>/' or 'documents/'), authenticated once with the access token
+const WS_URL = API_URL.replace(/^http/, 'ws').replace(/api\/$/, 'ws/');
+export const openSocket = (path) => new WebSocket(`${WS_URL}${path}?token=${localStorage.getItem('accessToken')}`);
+// Streams the answer as server-sent events. onToken is called for every token,
+// resolves with { message_id, sources } once the answer is complete.
+export const streamMessage = async (sessionId, message, onToken, documentIds) => {
+  const response = await fetch(`${API_URL}sessions/${sessionId}/send/stream/`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Authorization: `Bearer ${localStorage.getItem('accessToken')}`,
+    },
+    body: JSON.stringify({ message, document_ids: documentIds }),
+  });
+  if (!response.ok) {
+    throw new Error(`Request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result = null;
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line, the last piece may still be incomplete
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const rawEvent of events) {
+      const event = rawEvent.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(rawEvent.match(/^data: (.*)$/m)?.[1] ?? 'null');
+      if (event === 'token') onToken(data);
+      else if (event === 'sources') result = data;
+      else if (event === 'error') throw new Error(data);
+    }
+  }
+  return result;
+};